@@ -43,7 +43,7 @@ points = list()
 fix_points = list()
 while not points:
     samples = random_uniform_sample(1000, SCREEN_RESOLUTION, t=DT/2, dt=DT)
-    fix_samples = np.array([fix_map2(sample) for sample in samples])
+    fix_samples = fix_map2(samples)
     for i, fix_sample in enumerate(fix_samples):
         if fix_sample*100 > 1.0:
             points.append(samples[i])
@@ -58,7 +58,7 @@ points2 = list()
 nss_points = list()
 while not points2:
     samples = random_uniform_sample(1000, SCREEN_RESOLUTION, t=DT/2, dt=DT)
-    nss_samples = np.array([nss_map(sample) for sample in samples])
+    nss_samples = nss_map(samples)
     for i, nss_sample in enumerate(nss_samples):
         if nss_sample*100 > 1.0:
             points2.append(samples[i])
@@ -114,7 +114,7 @@ def animate(i):
         fix_points = list()
         while not points:
             samples = random_uniform_sample(100, SCREEN_RESOLUTION, t=DT/2, dt=DT)
-            fix_samples = np.array([fix_map(sample) for sample in samples])
+            fix_samples = fix_map(samples)
             for i, fix_sample in enumerate(fix_samples):
                 if fix_sample*100 > 1.0:
                     points.append(samples[i])
@@ -25,13 +25,17 @@ In the end convert the outputvideo with:
 from __future__ import division
 
 #import os
+import sys
 import time
-import pickle
 
 import cv
 from scipy.misc import imsave
 import numpy as np
 
+sys.path.append("..")
+
+from synchronicity.simulate import load_simulation
+
 VIDEO_FILE = "../videos/ducks_boat.mpeg"
 DATA_PICKLE = "./ducks_boat_20.pickle"
 
@@ -73,8 +77,8 @@ class GazeTrack(object):
         cv.CreateTrackbar("speed", "video_window", self.wait, 500,
                           self.on_speed)
 
-        with open(DATA_PICKLE, "rb") as pfile:
-            subjects, population = pickle.load(pfile)
+        # pickle file or folder in the columnar format
+        subjects, population = load_simulation(DATA_PICKLE, population=False)
         self.datas = subjects
         self.subject_names = ["vp" + str(ii) for ii in range(len(subjects))]
         self.gaze_indexs = [0 for i in range(len(self.datas))]
@@ -11,13 +11,10 @@ echo "----------------------------------------------"
 echo "start"
 echo "----------------------------------------------"
 
-#python3 job.py 0 30&
-#python3 job.py 30 61&
-python3 job.py 0 250&
-python3 job.py 250 501&
-#python job.py 500 750&
-#python job.py 750 1000&
-wait
+# one process per core is started by run_simulation itself; keep the OpenMP
+# kernels single threaded to not oversubscribe the node
+export OMP_NUM_THREADS=1
+python3 job.py 0 501 4
 
 echo "----------------------------------------------"
 echo "done"
@@ -18,6 +18,8 @@ from synchronicity.simulate import run_simulation, init_simulation
 
 start = int(sys.argv[1])
 stop = int(sys.argv[2])
+# number of worker processes; use all cores if not given
+n_jobs = int(sys.argv[3]) if len(sys.argv) > 3 else None
 
 
 # r_param: 0.0002 .. 0.00001
@@ -38,7 +40,10 @@ run_simulation("ducks_boat_20.pickle",
                setup=((1280, 720), (0.00010, 0.8, 1/50*1000000),
                           1/50*1000000),
                           #2*1/20*1.1*1000000),
-               method_velocity="clip")
+               method_velocity="clip",
+               n_jobs=n_jobs,
+               # a resubmitted job skips the finished results
+               result_folder="results_velocity_ducks_boat_20")
 
 #init_simulation(pickle_file="ducks_boat_20.pickle",
 #                folder="./gaze_data_ducks_boat/",
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+# backends.py
+
+"""
+Registry of the compute backends of the kernel sums.
+
+A backend implements some of the kernels::
+
+    fixation_sum(vecs, vec_i_js, stds)
+        sum of the spatiotemporal Gaussian distributions around vec_i_js for
+        every vector in vecs (see dorr.gaussian_sum)
+    velocity_sum(vecs, vec_i_js, stds, method)
+        sum of the velocity kernels (see dorr.velocity_sum)
+
+The backends are loaded on first use. "numpy" is always available, "cython"
+needs the compiled extension dorr_c (see setup.py) and "numba" the optional
+package numba. A kernel is taken from the selected backend (see use and
+benchmark), the backend in the environment variable SYNCHRONICITY_BACKEND or
+the first available backend in PREFERENCE, which implements it. Therefore a
+missing backend or a backend without a kernel falls back to the next one and
+at last to numpy::
+
+    backends.benchmark()    # selects the fastest backend for every kernel
+    fix_map = dorr.generate_fixation_map_backend(vec_i_js, stds)
+
+"""
+
+from __future__ import division
+from __future__ import absolute_import
+
+import math
+import os
+import time
+
+import numpy as np
+
+KERNELS = ("fixation_sum", "velocity_sum")
+PREFERENCE = ("cython", "numba", "numpy")
+
+# name -> function returning a dict kernel -> function (or raising
+# ImportError)
+_LOADERS = dict()
+# name -> dict of kernels or None if the backend is not available
+_LOADED = dict()
+# kernel -> name of the selected backend
+_SELECTED = dict()
+
+# numba.prange after the numba backend is loaded (see _load_numba)
+prange = range
+
+
+def register(name, loader):
+    """
+    Registers a backend.
+
+    Parameters
+    ----------
+    name : string
+    loader : function
+        returns a dict with the implemented kernels or raises ImportError if
+        a dependency of the backend is missing.
+
+    """
+    _LOADERS[name] = loader
+    _LOADED.pop(name, None)
+
+
+def load(name):
+    """
+    Returns the kernels of backend name or None if it is not available.
+
+    """
+    if name not in _LOADERS:
+        raise ValueError("backend %s is not registered" % name)
+    if name not in _LOADED:
+        try:
+            _LOADED[name] = _LOADERS[name]()
+        except ImportError:
+            _LOADED[name] = None
+    return _LOADED[name]
+
+
+def available():
+    """
+    Returns the names of all available backends.
+
+    """
+    return [name for name in _LOADERS if load(name) is not None]
+
+
+def use(name=None, kernels=KERNELS):
+    """
+    Selects backend name for kernels. None resets the selection.
+
+    If the backend is not available or does not implement a kernel the kernel
+    falls back to the next backend in PREFERENCE.
+
+    """
+    for kernel_name in kernels:
+        if kernel_name not in KERNELS:
+            raise ValueError("unknown kernel %s" % kernel_name)
+        if name is None:
+            _SELECTED.pop(kernel_name, None)
+            continue
+        _SELECTED[kernel_name] = name
+        backend = load(name)
+        if backend is None or kernel_name not in backend:
+            print("WARNING: backend %s has no %s; using %s." %
+                  (name, kernel_name, backend_of(kernel_name)))
+
+
+def backend_of(kernel_name, name=None):
+    """
+    Returns the name of the backend, which implements kernel_name, if name
+    (or the selected backend) is requested.
+
+    """
+    if kernel_name not in KERNELS:
+        raise ValueError("unknown kernel %s" % kernel_name)
+    if name is None:
+        name = _SELECTED.get(kernel_name,
+                             os.environ.get("SYNCHRONICITY_BACKEND"))
+    candidates = list(PREFERENCE) + [other for other in _LOADERS if
+                                     other not in PREFERENCE]
+    if name is not None:
+        candidates.insert(0, name)
+    for candidate in candidates:
+        backend = load(candidate)
+        if backend is not None and kernel_name in backend:
+            return candidate
+    raise ValueError("no backend implements %s" % kernel_name)
+
+
+def kernel(kernel_name, name=None):
+    """
+    Returns the function of kernel_name (see backend_of).
+
+    """
+    return load(backend_of(kernel_name, name))[kernel_name]
+
+
+def benchmark(n_vecs=2000, n_refs=500, repeat=3, select=True):
+    """
+    Measures all available backends and selects the fastest for every
+    kernel.
+
+    Parameters
+    ----------
+    n_vecs : integer
+        number of query vectors
+    n_refs : integer
+        number of reference vectors
+    repeat : integer
+        the best of repeat runs is taken (after one run, which includes the
+        compilation of numba)
+    select : bool
+        if True the fastest backend is selected (see use)
+
+    Returns
+    -------
+    times : dict
+        for every kernel a dict with the seconds of every backend
+
+    """
+    random_state = np.random.RandomState(0)
+    vecs = random_state.uniform(0, 100, (n_vecs, 3))
+    vec_i_js = random_state.uniform(0, 100, (n_refs, 3))
+    arguments = dict(fixation_sum=(vecs, vec_i_js, (5.0, 5.0, 5.0)),
+                     velocity_sum=(vecs, vec_i_js, (5.0, 0.5, 5.0), "gamma"))
+    times = dict()
+    for kernel_name in KERNELS:
+        times[kernel_name] = dict()
+        for name in available():
+            function = load(name).get(kernel_name)
+            if function is None:
+                continue
+            function(*arguments[kernel_name])
+            best = np.inf
+            for _ in range(repeat):
+                start_time = time.time()
+                function(*arguments[kernel_name])
+                best = min(best, time.time() - start_time)
+            times[kernel_name][name] = best
+            print("%s/%s: %f sec" % (kernel_name, name, best))
+        if select:
+            use(min(times[kernel_name], key=times[kernel_name].get),
+                (kernel_name,))
+    return times
+
+
+def _load_numpy():
+    from . import dorr
+    return dict(fixation_sum=dorr.gaussian_sum,
+                velocity_sum=dorr.velocity_sum)
+
+
+def _load_cython():
+    from . import dorr_c
+    return dict(fixation_sum=dorr_c.fix_map_batch)
+
+
+def _load_numba():
+    import numba
+    global prange
+    # the loops are compiled with the value of prange at compile time
+    prange = numba.prange
+    fixation_loops = numba.njit(parallel=True)(_fixation_sum_loops)
+    velocity_loops = numba.njit(parallel=True)(_velocity_sum_loops)
+
+    def fixation_sum(vecs, vec_i_js, stds):
+        return fixation_loops(*_normalize(vecs, vec_i_js, stds))
+
+    def velocity_sum(vecs, vec_i_js, stds, method="gamma"):
+        return velocity_loops(*_velocity_arguments(vecs, vec_i_js, stds,
+                                                   method))
+    return dict(fixation_sum=fixation_sum, velocity_sum=velocity_sum)
+
+
+def _normalize(vecs, vec_i_js, stds):
+    """
+    Returns vecs and vec_i_js divided by stds as contiguous arrays.
+
+    """
+    stds = np.asarray(stds, dtype=float)
+    n_vecs = np.asarray(vecs, dtype=float).reshape((-1, len(stds))) / stds
+    n_vec_i_js = np.asarray(vec_i_js, dtype=float).reshape((-1, len(stds)))
+    return (np.ascontiguousarray(n_vecs),
+            np.ascontiguousarray(n_vec_i_js / stds))
+
+
+def _velocity_arguments(vecs, vec_i_js, stds, method):
+    """
+    Returns the arguments of _velocity_sum_loops.
+
+    """
+    from . import dorr
+    if method not in ("gamma", "heavyside"):
+        raise ValueError("method %s not defined" % method)
+    param_r, param_phi, param_t = (float(std) for std in stds)
+    vecs = np.ascontiguousarray(np.asarray(vecs, dtype=float).reshape((-1, 3)))
+    vec_i_js = np.ascontiguousarray(np.asarray(vec_i_js,
+                                               dtype=float).reshape((-1, 3)))
+    return (vecs, vec_i_js, param_r, param_phi, param_t, method == "gamma",
+            float(dorr.phi_normalization(param_phi)))
+
+
+def _fixation_sum_loops(n_vecs, n_vec_i_js):
+    """
+    Kernel sums of the normalized vectors in explicit loops (compiled by
+    numba, see dorr_c._kernel_sum).
+
+    """
+    sums = np.empty(n_vecs.shape[0])
+    for k in prange(n_vecs.shape[0]):
+        total = 0.0
+        for l in range(n_vec_i_js.shape[0]):
+            dist = 0.0
+            for d in range(n_vecs.shape[1]):
+                diff = n_vecs[k, d] - n_vec_i_js[l, d]
+                dist += diff * diff
+            total += math.exp(-0.5 * dist)
+        sums[k] = total
+    return sums
+
+
+def _velocity_sum_loops(vecs, vec_i_js, param_r, param_phi, param_t, gamma,
+                        phi_norm):
+    """
+    Velocity kernel sums in explicit loops (compiled by numba, see
+    dorr.kernel_velocity_matrix).
+
+    """
+    sums = np.empty(vecs.shape[0])
+    norm_phi = phi_norm / (math.sqrt(2 * math.pi) * param_phi)
+    norm_t = 1.0 / (math.sqrt(2 * math.pi) * param_t)
+    for k in prange(vecs.shape[0]):
+        rr = vecs[k, 0]
+        total = 0.0
+        if gamma or rr >= param_r:
+            x = rr / param_r
+            for l in range(vec_i_js.shape[0]):
+                ret_rr = 1.0
+                if gamma:
+                    # scipy.stats.gamma.pdf(x, a) * x / (0.1 + x)
+                    a = vec_i_js[l, 0] / param_r
+                    if not a > 0.0:
+                        pdf = np.nan
+                    elif x < 0.0:
+                        pdf = 0.0
+                    elif x == 0.0:
+                        if a < 1.0:
+                            pdf = np.inf
+                        elif a == 1.0:
+                            pdf = 1.0
+                        else:
+                            pdf = 0.0
+                    else:
+                        pdf = math.exp((a - 1.0) * math.log(x) - x -
+                                       math.lgamma(a))
+                    ret_rr = pdf * x / (0.1 + x)
+                diff_phi = vecs[k, 1] - vec_i_js[l, 1]
+                if diff_phi < -math.pi:
+                    diff_phi += 2 * math.pi
+                if diff_phi > math.pi:
+                    diff_phi -= 2 * math.pi
+                diff_phi /= param_phi
+                diff_t = (vecs[k, 2] - vec_i_js[l, 2]) / param_t
+                total += (ret_rr * norm_phi * math.exp(-0.5 * diff_phi ** 2) *
+                          norm_t * math.exp(-0.5 * diff_t ** 2))
+        sums[k] = total
+    return sums
+
+
+register("numpy", _load_numpy)
+register("cython", _load_cython)
+register("numba", _load_numba)
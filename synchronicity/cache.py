@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+# cache.py
+
+"""
+Persistent cache for parsed raw gaze data files.
+
+Every parsed file is stored in cache_dir as one npz file, which contains the
+gaze data, the messages and the key of the raw file. The key consists of the
+path, the modification time and the size of the raw file and optionally of
+the sha1 hash of its content. If the key of the raw file changes the file is
+parsed again, otherwise the npz file is loaded.
+
+"""
+
+from __future__ import division
+from __future__ import absolute_import
+
+import functools
+import hashlib
+import os
+
+import numpy as np
+
+from . import helper
+
+
+def parse_smi(files, cache_dir, verbose=False, n_jobs=1, content_hash=False):
+    """
+    Same as helper.parse_smi, but only files changed since the last call are
+    parsed.
+
+    Parameters
+    ----------
+    cache_dir : string
+        folder of the cache. It is created if it does not exist.
+    content_hash : bool
+        if True the key contains the sha1 hash of the file content instead of
+        the modification time, e. g. for copied files with new modification
+        times.
+
+    See helper.parse_smi for the other parameters.
+
+    """
+    parser = functools.partial(helper._parse_smi_file, verbose=verbose)
+    return cached_parse(files, parser, cache_dir, "smi", n_jobs, content_hash)
+
+
+def parse_coord(files, cache_dir, n_jobs=1, content_hash=False):
+    """
+    Same as helper.parse_coord, but only files changed since the last call are
+    parsed (see parse_smi).
+
+    """
+    subjects = cached_parse(files, helper._parse_coord_file, cache_dir,
+                            "coord", n_jobs, content_hash)
+    return [subject["data"] for subject in subjects]
+
+
+def cached_parse(files, parser, cache_dir, format, n_jobs=1,
+                 content_hash=False):
+    """
+    Returns the parsed files as list of dicts (see helper.parse_smi).
+
+    Parameters
+    ----------
+    files : sequence of str
+        file names
+    parser : function
+        parses one file and returns either a dict in the format of
+        helper.parse_smi or a np.array with the gaze data.
+    cache_dir : string
+        folder of the cache
+    format : string
+        name of the format, which is part of the cache file name
+    n_jobs : integer
+        number of processes parsing the changed files concurrently
+    content_hash : bool
+        if True the sha1 hash of the content is part of the key
+
+    """
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    subjects = [None] * len(files)
+    keys = [file_key(f, content_hash) for f in files]
+    missing = list()
+    for i, (f, key) in enumerate(zip(files, keys)):
+        subjects[i] = _load(cache_file(cache_dir, f, format), key)
+        if subjects[i] is None:
+            missing.append(i)
+        else:
+            subjects[i]["file_name"] = f
+    print("parse cache: %i hits, %i misses" % (len(files) - len(missing),
+                                               len(missing)))
+    parsed = helper._map_files(parser, [files[i] for i in missing], n_jobs)
+    for i, subject in zip(missing, parsed):
+        if not isinstance(subject, dict):
+            subject = {"data": subject, "msg": list(), "file_name": files[i]}
+        _save(cache_file(cache_dir, files[i], format), keys[i], subject)
+        subjects[i] = subject
+    return subjects
+
+
+def file_key(file_name, content_hash=False):
+    """
+    Returns (path, mtime in ns, size, sha1 hash) of file_name.
+
+    Without content_hash the hash is an empty string.
+
+    """
+    stat = os.stat(file_name)
+    sha1 = ""
+    if content_hash:
+        hasher = hashlib.sha1()
+        with open(file_name, "rb") as raw_file:
+            for block in iter(functools.partial(raw_file.read, 2**20), b""):
+                hasher.update(block)
+        sha1 = hasher.hexdigest()
+    return (os.path.abspath(file_name), stat.st_mtime_ns, stat.st_size, sha1)
+
+
+def cache_file(cache_dir, file_name, format):
+    """
+    Returns the name of the npz file caching file_name.
+
+    """
+    path_hash = hashlib.sha1(os.path.abspath(file_name).encode("utf-8"))
+    return os.path.join(cache_dir, "%s_%s.npz" % (format,
+                                                  path_hash.hexdigest()))
+
+
+def _is_hit(cached_key, key):
+    """
+    True if the cached key belongs to the current version of the file.
+
+    """
+    path, mtime, size, sha1 = key
+    cached_path, cached_mtime, cached_size, cached_sha1 = cached_key
+    if cached_path != path or cached_size != size:
+        return False
+    if sha1:
+        return cached_sha1 == sha1
+    return cached_mtime == mtime
+
+
+def _load(npz_file, key):
+    """
+    Returns the cached subject or None if the cache misses.
+
+    """
+    if not os.path.exists(npz_file):
+        return None
+    path = key[0]
+    with np.load(npz_file, allow_pickle=False) as cached:
+        cached_key = (str(cached["path"]), int(cached["mtime"]),
+                      int(cached["size"]), str(cached["sha1"]))
+        if not _is_hit(cached_key, key):
+            return None
+        msg = list(zip(cached["msg_times"].tolist(),
+                       cached["msg_texts"].tolist()))
+        return {"data": cached["data"], "msg": msg, "file_name": path}
+
+
+def _save(npz_file, key, subject):
+    """
+    Stores the parsed subject atomically in npz_file.
+
+    """
+    path, mtime, size, sha1 = key
+    msg = subject["msg"]
+    tmp_file = npz_file + ".tmp.npz"
+    np.savez(tmp_file, path=path, mtime=mtime, size=size, sha1=sha1,
+             data=np.asarray(subject["data"], dtype=np.float64),
+             msg_times=np.array([t for t, _ in msg], dtype=np.float64),
+             msg_texts=np.array([text for _, text in msg], dtype=np.str_))
+    os.replace(tmp_file, npz_file)
@@ -32,12 +32,16 @@ in order to calculate synchronicity.
 from __future__ import division
 from __future__ import absolute_import
 
-import functools
-
 import numpy as np
+import scipy.spatial
 import scipy.stats
 
-from . import dorr_c
+from . import backends
+
+# maximal number of elements in an intermediate (n x m) kernel array
+MAX_ELEMENTS = 2 ** 22
+# maximal number of phi bins of the index of generate_velocity_map_clip
+MAX_CLIP_BINS = 64
 
 
 def gaussian(vec, vec_mean, stds):
@@ -75,6 +79,254 @@ def gaussian(vec, vec_mean, stds):
     #return np.exp(-dist / (2 * np.sum(variances)))
 
 
+def gaussian_matrix(vecs, vec_i_js, stds):
+    """
+    Spatiotemporal Gaussian distribution between every vector in vecs and
+    every vector in vec_i_js.
+
+    The entry (k, l) of the result equals ``gaussian(vecs[k], vec_i_js[l],
+    stds)``.
+
+    Parameters
+    ----------
+    vecs : np.array with shape nx3
+        The first two columns define the location on the screen and the third
+        column defines the time. (x, y, t)
+    vec_i_js : np.array with shape mx3
+        Vectors of the observers.
+    stds : sequence
+        Sequence containing all standard deviations for the entries in
+        vec_mean, e. g. (SIGMA_X, SIGMA_Y, SIGMA_T)
+
+    Returns
+    -------
+    kernel : np.array with shape nxm
+
+    """
+    stds = np.asarray(stds, dtype=float)
+    n_vecs = np.asarray(vecs, dtype=float) / stds
+    n_vec_i_js = np.asarray(vec_i_js, dtype=float) / stds
+    dists = np.zeros((len(n_vecs), len(n_vec_i_js)))
+    for dim in range(len(stds)):
+        diff = np.subtract.outer(n_vecs[:, dim], n_vec_i_js[:, dim])
+        np.square(diff, out=diff)
+        dists += diff
+    del diff
+    dists *= -0.5
+    return np.exp(dists, out=dists)
+
+
+def gaussian_sum(vecs, vec_i_js, stds, max_elements=MAX_ELEMENTS):
+    """
+    Sum of spatiotemporal Gaussian distributions around vec_i_js for every
+    vector in vecs.
+
+    The kernel matrix is evaluated in chunks, so that no intermediate array
+    has more than max_elements entries.
+
+    Parameters
+    ----------
+    vecs : np.array with shape nx3
+    vec_i_js : np.array with shape mx3
+    stds : sequence
+
+    Returns
+    -------
+    sums : np.array with shape n
+
+    """
+    vecs = np.asarray(vecs, dtype=float)
+    sums = np.empty(len(vecs))
+    for chunk in chunk_slices(len(vecs), len(vec_i_js), max_elements):
+        sums[chunk] = np.sum(gaussian_matrix(vecs[chunk], vec_i_js, stds),
+                             axis=1)
+    return sums
+
+
+def gaussian_pairs(vecs, vec_i_js, stds, cutoff=4.0, tree=None):
+    """
+    Spatiotemporal Gaussian distributions between all pairs of vectors in
+    vecs and vec_i_js that are closer than cutoff.
+
+    The distance is measured in the normalized space (x/SIGMA_X, y/SIGMA_Y,
+    t/SIGMA_T). All other pairs are neglected; each of them contributes less
+    than exp(-cutoff**2 / 2). The pairs are found with a KD-tree, therefore
+    the costs depend on the number of close pairs and not on n * m.
+
+    Parameters
+    ----------
+    vecs : np.array with shape nx3
+    vec_i_js : np.array with shape mx3
+        finite vectors of the observers.
+    stds : sequence
+    cutoff : float
+        cutoff radius in units of the standard deviations.
+    tree : scipy.spatial.cKDTree
+        tree over vec_i_js (see kd_tree). Pass it in order to reuse it for
+        several calls.
+
+    Returns
+    -------
+    (rows, cols, kernel) : (np.array, np.array, np.array)
+        the kernel between vecs[rows[k]] and vec_i_js[cols[k]] is kernel[k].
+        Rows of vecs with NaN get one pair with a NaN kernel.
+
+    """
+    stds = np.asarray(stds, dtype=float)
+    if tree is None:
+        tree = kd_tree(vec_i_js, stds)
+    n_vecs = np.asarray(vecs, dtype=float).reshape((-1, len(stds))) / stds
+    finite = np.all(np.isfinite(n_vecs), axis=1)
+    idxs = np.nonzero(finite)[0]
+    pairs = scipy.spatial.cKDTree(n_vecs[idxs]).sparse_distance_matrix(
+        tree, cutoff, output_type="ndarray")
+    rows = idxs[pairs["i"]]
+    cols = pairs["j"]
+    kernel = np.exp(-pairs["v"] ** 2 / 2)
+    if not np.all(finite) and tree.n > 0:
+        nan_rows = np.nonzero(~finite)[0]
+        rows = np.concatenate((rows, nan_rows))
+        cols = np.concatenate((cols, np.zeros(len(nan_rows), dtype=cols.dtype)))
+        kernel = np.concatenate((kernel, np.repeat(np.nan, len(nan_rows))))
+    return (rows, cols, kernel)
+
+
+def rasterize_fixation_map(vec_i_js, stds, xs, ys, ts):
+    """
+    Spatiotemporal fixation map on the lattice spanned by xs, ys and ts.
+
+    The spatiotemporal Gaussian distribution is separable, i. e. on the
+    lattice the fixation map is sum_l gx[a, l] * gy[b, l] * gt[c, l] with one
+    dimensional Gaussian distributions per axis. Therefore only (n_x + n_y +
+    n_t) * m exponentials are evaluated (instead of n_x * n_y * n_t * m) and
+    the sum is one matrix product for every point in time of the lattice.
+
+    Parameters
+    ----------
+    vec_i_js : np.array with shape mx3
+        Vectors of the observers.
+    stds : sequence
+        (SIGMA_X, SIGMA_Y, SIGMA_T)
+    xs, ys, ts : np.array
+        axes of the lattice
+
+    Returns
+    -------
+    raster : np.array with shape n_x x n_y x n_t
+        raster[a, b, c] equals the fixation map at (xs[a], ys[b], ts[c]).
+
+    """
+    stds = np.asarray(stds, dtype=float)
+    vec_i_js = np.asarray(vec_i_js, dtype=float).reshape((-1, 3))
+    factors = list()
+    for dim, axis in enumerate((xs, ys, ts)):
+        diff = np.subtract.outer(np.asarray(axis, dtype=float) / stds[dim],
+                                 vec_i_js[:, dim] / stds[dim])
+        factors.append(np.exp(-diff * diff / 2))
+    gx, gy, gt = factors
+    raster = np.empty((len(xs), len(ys), len(ts)))
+    for c in range(len(ts)):
+        raster[:, :, c] = np.dot(gx * gt[c], gy.T)
+    return raster
+
+
+def fixation_map_moments(vec_i_js, stds, ts, mean_xy, std_xy, weights=None,
+                         max_elements=MAX_ELEMENTS):
+    """
+    Exact mean and variance of fixation maps over a Gaussian distribution of
+    random gaze data.
+
+    The random gaze data rho(x, y) is an independent normal distribution in x
+    and y at the fixed time t. As the kernel is Gaussian as well the integrals
+    of the NSS normalization (see docs/method.rst)
+
+        Mean_t(F) = int rho(x, y) F(x, y, t) dx dy
+        Var_t(F) = int rho(x, y) F^2(x, y, t) dx dy - Mean_t(F)^2
+
+    have closed forms. The variance needs all pairs of vectors and costs
+    O(m**2), which is evaluated in chunks of at most max_elements entries.
+
+    Parameters
+    ----------
+    vec_i_js : np.array with shape mx3
+        Vectors of the observers.
+    stds : sequence
+        (SIGMA_X, SIGMA_Y, SIGMA_T)
+    ts : float or sequence of k floats
+        point in time for every fixation map
+    mean_xy : sequence
+        (mean_x, mean_y) of the random gaze data
+    std_xy : sequence
+        (std_x, std_y) of the random gaze data
+    weights : np.array with shape kxm
+        weights of vec_i_js for k fixation maps. If None one fixation map with
+        all vectors is used.
+
+    Returns
+    -------
+    (means, variances) : (np.array, np.array)
+        with shape k
+
+    """
+    stds = np.asarray(stds, dtype=float)
+    vec_i_js = np.asarray(vec_i_js, dtype=float).reshape((-1, 3))
+    if weights is None:
+        weights = np.ones((1, len(vec_i_js)))
+    weights = np.asarray(weights, dtype=float)
+    ts = np.asarray(ts, dtype=float) * np.ones(len(weights))
+    # time dependent part is constant for every map
+    diff = np.subtract.outer(ts, vec_i_js[:, 2]) / stds[2]
+    weights = weights * np.exp(-diff * diff / 2)
+    del diff
+
+    # E[exp(-(x - p)**2 / (2 * sigma**2))] for x ~ N(mu, s**2)
+    expectations = np.ones(len(vec_i_js))
+    for dim in range(2):
+        var = stds[dim] ** 2 + std_xy[dim] ** 2
+        expectations *= (stds[dim] / np.sqrt(var) *
+                         np.exp(-(mean_xy[dim] - vec_i_js[:, dim]) ** 2 /
+                                (2 * var)))
+    means = np.dot(weights, expectations)
+
+    # E[exp(-((x - p)**2 + (x - q)**2) / (2 * sigma**2))] for x ~ N(mu, s**2)
+    second_moments = np.zeros(len(weights))
+    for chunk in chunk_slices(len(vec_i_js), len(vec_i_js), max_elements):
+        pairs = np.ones((chunk.stop - chunk.start, len(vec_i_js)))
+        for dim in range(2):
+            half_var = stds[dim] ** 2 / 2
+            var = half_var + std_xy[dim] ** 2
+            diff = np.subtract.outer(vec_i_js[chunk, dim], vec_i_js[:, dim])
+            middle = np.add.outer(vec_i_js[chunk, dim], vec_i_js[:, dim]) / 2
+            pairs *= (np.sqrt(half_var / var) *
+                      np.exp(-diff * diff / (4 * stds[dim] ** 2) -
+                             (mean_xy[dim] - middle) ** 2 / (2 * var)))
+        second_moments += np.sum(np.dot(weights[:, chunk], pairs) * weights,
+                                 axis=1)
+    return (means, np.maximum(second_moments - means ** 2, 0.0))
+
+
+def kd_tree(vec_i_js, stds):
+    """
+    KD-tree over vec_i_js in the normalized space (x/SIGMA_X, y/SIGMA_Y,
+    t/SIGMA_T).
+
+    """
+    stds = np.asarray(stds, dtype=float)
+    return scipy.spatial.cKDTree(np.asarray(vec_i_js, dtype=float)
+                                 .reshape((-1, len(stds))) / stds)
+
+
+def chunk_slices(n, m, max_elements=MAX_ELEMENTS):
+    """
+    Yields slices over n rows, so that a (rows x m) array of one slice has
+    at most max_elements entries (but at least one row).
+
+    """
+    step = max(1, max_elements // max(m, 1))
+    for start in range(0, n, step):
+        yield slice(start, min(start + step, n))
+
+
 def kernel_velocity(vec, vec_mean, stds, method="gamma"):
     r"""
     Three dimensional spatio temporal kernel distribution for polar
@@ -146,6 +398,97 @@ def kernel_velocity(vec, vec_mean, stds, method="gamma"):
     return ret_rr * ret_phi * ret_tt
 
 
+def kernel_velocity_matrix(vecs, vec_i_js, stds, method="gamma",
+                           phi_norm=None):
+    """
+    Velocity kernel (see kernel_velocity) between all vectors in vecs and all
+    vectors in vec_i_js.
+
+    Parameters
+    ----------
+    vecs : np.array with shape nx3
+        query vectors (r, phi, t)
+    vec_i_js : np.array with shape mx3
+        vectors of the observers (r, phi, t)
+    stds : sequence
+        (PARAM_R, PARAM_PHI, PARAM_T)
+    method : {"gamma", "heavyside"}
+        Method used for the r dependency.
+    phi_norm : *None* or float
+        renormalization of the clipped Gaussian distribution in phi (see
+        phi_normalization). None computes it.
+
+    Returns
+    -------
+    kernel : np.array with shape n x m
+        kernel[k, l] equals kernel_velocity(vecs[k], vec_i_js[l], stds,
+        method).
+
+    """
+    param_r, param_phi, param_t = stds
+    vecs = np.asarray(vecs, dtype=float).reshape((-1, 3))
+    vec_i_js = np.asarray(vec_i_js, dtype=float).reshape((-1, 3))
+    if phi_norm is None:
+        phi_norm = phi_normalization(param_phi)
+    rr = vecs[:, 0, np.newaxis]
+
+    if method == "gamma":
+        rr_rescaled = rr / param_r
+        ret_rr = (scipy.stats.gamma.pdf(rr_rescaled, vec_i_js[:, 0] / param_r)
+                  * rr_rescaled / (0.1 + rr_rescaled))
+    elif method == "heavyside":
+        ret_rr = 1.0
+    else:
+        raise ValueError("method %s not defined" % method)
+
+    diff_phi = vecs[:, 1, np.newaxis] - vec_i_js[:, 1]
+    diff_phi[diff_phi < -np.pi] += 2 * np.pi
+    diff_phi[diff_phi > np.pi] -= 2 * np.pi
+    ret_phi = scipy.stats.norm.pdf(diff_phi, scale=param_phi)
+    ret_phi *= phi_norm
+
+    ret_tt = scipy.stats.norm.pdf(vecs[:, 2, np.newaxis], loc=vec_i_js[:, 2],
+                                  scale=param_t)
+
+    kernel = ret_rr * ret_phi * ret_tt
+    if method == "heavyside":
+        kernel = np.where(rr >= param_r, kernel, 0.0)
+    return kernel
+
+
+def phi_normalization(param_phi):
+    """
+    Returns 1/(1 - 2 Phi(-pi / param_phi)), which renormalizes the Gaussian
+    distribution in phi clipped to [-pi, pi] to an area of one.
+
+    """
+    return 1 / (1 - 2 * scipy.stats.norm.cdf(- np.pi, scale=param_phi))
+
+
+def velocity_sum(vecs, vec_i_js, stds, method="gamma",
+                 max_elements=MAX_ELEMENTS):
+    """
+    Velocity map (sum of kernel_velocity over vec_i_js) for every vector in
+    vecs.
+
+    The kernel matrix is evaluated in chunks of at most max_elements
+    entries.
+
+    Returns
+    -------
+    saliencies : np.array with shape n
+
+    """
+    vecs = np.asarray(vecs, dtype=float).reshape((-1, 3))
+    vec_i_js = np.asarray(vec_i_js, dtype=float).reshape((-1, 3))
+    phi_norm = phi_normalization(stds[1])
+    saliencies = np.empty(len(vecs))
+    for chunk in chunk_slices(len(vecs), len(vec_i_js), max_elements):
+        saliencies[chunk] = np.sum(kernel_velocity_matrix(
+            vecs[chunk], vec_i_js, stds, method, phi_norm), axis=1)
+    return saliencies
+
+
 def velocity_map_clip(vec, vec_i_js, stds):
     """
     Very crude way without any interpolation. We give cutoffs and set
@@ -173,6 +516,171 @@ def velocity_map_clip(vec, vec_i_js, stds):
     return np.sum(result)
 
 
+def generate_velocity_map_clip(vec_i_js, stds):
+    """
+    Generate the velocity map of velocity_map_clip with an index over
+    vec_i_js.
+
+    The references are sorted into bins of width of about stds[1] / 2 in phi
+    and sorted along t in every bin. For a query vector the bins completely
+    within stds[1] (with wraparound at +-pi) contribute the number of
+    references in the time window, which are two binary searches. Only the
+    references of the bins at the border of the phi window and at the
+    borders of the time window are compared one by one. References and query
+    vectors with phi outside of [-pi, pi] or without time are compared one
+    by one as well, so that the counts equal velocity_map_clip.
+
+    Parameters
+    ----------
+    vec_i_js : np.array with shape mx3
+        vectors of the observers (r, phi, t)
+    stds : sequence
+        (r threshold, phi window, t window)
+
+    Returns
+    -------
+    velocity_map : function
+        function accepting one vector (r, phi, t) or an array with shape nx3
+
+    """
+    param_r, param_phi, param_t = stds
+    vec_i_js = np.asarray(vec_i_js, dtype=float).reshape((-1, 3))
+    # references below the r threshold never count (NaN counts)
+    refs = vec_i_js[np.logical_not(vec_i_js[:, 0] < param_r)]
+    regular = ((refs[:, 1] >= -np.pi) & (refs[:, 1] <= np.pi) &
+               np.logical_not(np.isnan(refs[:, 2])))
+    irregular_refs = refs[np.logical_not(regular)]
+    refs = refs[regular]
+
+    if param_phi > 0:
+        n_bins = int(min(max(1, np.ceil(4 * np.pi / param_phi)),
+                         MAX_CLIP_BINS))
+    else:
+        n_bins = 1
+    width = 2 * np.pi / n_bins
+    bins = np.clip(np.floor((refs[:, 1] + np.pi) / width).astype(int), 0,
+                   n_bins - 1)
+    order = np.lexsort((refs[:, 2], bins))
+    refs = refs[order]
+    offsets = np.searchsorted(bins[order], np.arange(n_bins + 1))
+    # tolerance for rounding errors in phi
+    eps_phi = 1e-9
+
+    def clip_pass(vecs, vec_i_js):
+        """
+        Elementwise phi and t condition of velocity_map_clip.
+
+        """
+        d_phis = abs(vecs[:, 1] - vec_i_js[:, 1])
+        d_phis[d_phis > np.pi] -= 2 * np.pi
+        d_phis = abs(d_phis)
+        d_ts = abs(vecs[:, 2] - vec_i_js[:, 2])
+        return np.logical_not(d_phis > param_phi) & np.logical_not(d_ts > param_t)
+
+    def count_ranges(vecs, refs_bin, starts, stops, owners, counts):
+        """
+        Adds the references refs_bin[starts[k]:stops[k]], which pass
+        clip_pass for vecs[owners[k]], to counts[owners[k]].
+
+        """
+        lengths = stops - starts
+        total = np.sum(lengths)
+        if total == 0:
+            return
+        ends = np.cumsum(lengths)
+        idx = np.arange(total) + np.repeat(starts - ends + lengths, lengths)
+        rows = np.repeat(owners, lengths)
+        passes = clip_pass(vecs[rows], refs_bin[idx])
+        counts += np.bincount(rows[passes], minlength=len(counts))
+
+    def count_regular(vecs):
+        """
+        Counts for query vectors with phi in [-pi, pi] and time.
+
+        """
+        counts = np.zeros(len(vecs), dtype=int)
+        if len(irregular_refs) > 0:
+            count_ranges(vecs, irregular_refs,
+                         np.zeros(len(vecs), dtype=int),
+                         np.full(len(vecs), len(irregular_refs)),
+                         np.arange(len(vecs)), counts)
+        phis, ts = vecs[:, 1], vecs[:, 2]
+        # tolerance for rounding errors in abs(t - t_ref)
+        margin = 4 * np.finfo(float).eps * (abs(ts) + abs(param_t))
+        owners = np.arange(len(vecs))
+        for j in range(n_bins):
+            refs_bin = refs[offsets[j]:offsets[j + 1]]
+            if len(refs_bin) == 0:
+                continue
+            d_min, d_max = _arc_distance_bounds(
+                phis, -np.pi + j * width - eps_phi,
+                -np.pi + (j + 1) * width + eps_phi)
+            full = d_max <= param_phi - eps_phi
+            outside = d_min > param_phi + eps_phi
+            times = refs_bin[:, 2]
+            lo_out = np.searchsorted(times, ts - param_t - margin, "left")
+            hi_out = np.searchsorted(times, ts + param_t + margin, "right")
+            lo_in = np.searchsorted(times, ts - param_t + margin, "left")
+            hi_in = np.searchsorted(times, ts + param_t - margin, "right")
+            # references between lo_in and hi_in pass certainly
+            inner = full & (hi_in > lo_in)
+            counts += np.where(inner, hi_in - lo_in, 0)
+            lo_in = np.where(inner, lo_in, hi_out)
+            hi_in = np.where(inner, hi_in, hi_out)
+            lo_out = np.where(outside, hi_out, lo_out)
+            lo_in = np.where(outside, hi_out, lo_in)
+            # all other references in the time window are compared
+            count_ranges(vecs, refs_bin, np.concatenate((lo_out, hi_in)),
+                         np.concatenate((lo_in, hi_out)),
+                         np.concatenate((owners, owners)), counts)
+        return counts
+
+    def velocity_map(vec):
+        """
+        Spatiotemporal velocity map (see velocity_map_clip).
+
+        Parameters
+        ----------
+        vec : np.array with shape 3 or nx3
+            (r, phi, t)
+
+        Returns
+        -------
+        count : integer or np.array with shape n
+
+        """
+        vecs = np.asarray(vec, dtype=float).reshape((-1, 3))
+        counts = np.zeros(len(vecs), dtype=int)
+        valid = np.logical_not(vecs[:, 0] < param_r)
+        regular = (valid & (vecs[:, 1] >= -np.pi) & (vecs[:, 1] <= np.pi) &
+                   np.logical_not(np.isnan(vecs[:, 2])))
+        counts[regular] = count_regular(vecs[regular])
+        for k in np.flatnonzero(valid & np.logical_not(regular)):
+            counts[k] = velocity_map_clip(vecs[k], vec_i_js, stds)
+        if np.ndim(vec) == 2:
+            return counts
+        return counts[0]
+    return velocity_map
+
+
+def _arc_distance_bounds(phis, lower, upper):
+    """
+    Minimal and maximal distance on the circle between every phi in phis and
+    the arc from lower to upper (upper - lower < 2 * pi + small tolerance).
+
+    """
+    def arc(diff):
+        diff = np.mod(np.abs(diff), 2 * np.pi)
+        return np.minimum(diff, 2 * np.pi - diff)
+    length = upper - lower
+    d_lower, d_upper = arc(phis - lower), arc(phis - upper)
+    inside = np.mod(phis - lower, 2 * np.pi) <= length
+    antipode_inside = np.mod(phis + np.pi - lower, 2 * np.pi) <= length
+    d_min = np.where(inside, 0.0, np.minimum(d_lower, d_upper))
+    d_max = np.where(antipode_inside, np.pi, np.maximum(d_lower, d_upper))
+    return (d_min, d_max)
+
+
 def generate_fixation_map(vec_i_js, stds):
     """
     Generate spatiotemporal fixation map.
@@ -193,7 +701,7 @@ def generate_fixation_map(vec_i_js, stds):
     Returns
     -------
     fixation_map : function
-        function accepting one vector (x, y, t)
+        function accepting one vector (x, y, t) or an array with shape nx3
 
     References
     ----------
@@ -206,16 +714,18 @@ def generate_fixation_map(vec_i_js, stds):
 
         Parameters
         ----------
-        vec : np.matrix
+        vec : np.matrix or np.array with shape nx3
             The first two values define the location on the screen and the
             third value defines the time. (x, y, t)
 
         Returns
         -------
-        saliency : float
+        saliency : float or np.array with shape n
             not normalized saliency for the point vec.
 
         """
+        if np.ndim(vec) == 2:
+            return gaussian_sum(vec, vec_i_js, stds)
         return np.sum([gaussian(vec, vec_i_j, stds) for vec_i_j in
                        vec_i_js])
     return fixation_map
@@ -242,7 +752,7 @@ def generate_velocity_map(vec_i_js, stds, method):
     Returns
     -------
     fixation_map : function
-        function accepting one vector (x, y, t)
+        function accepting one vector (r, phi, t) or an array with shape nx3
 
     References
     ----------
@@ -250,36 +760,116 @@ def generate_velocity_map(vec_i_js, stds, method):
 
     """
     if method == "clip":
-        velocity_map = functools.partial(velocity_map_clip, vec_i_js=vec_i_js, stds=stds)
-    else:
-        def velocity_map(vec):
-            """
-            Spatiotemporal velocity map.
-
-            Parameters
-            ----------
-            vec : np.matrix
-                The first two values define the velocity on the screen and the
-                third value defines the time. (r, phi, t)
-
-            Returns
-            -------
-            saliency : float
-                not normalized saliency for the point vec.
-
-            """
-            return np.sum([kernel_velocity(vec, vec_i_j, stds, method) for vec_i_j in
-                        vec_i_js])
+        return generate_velocity_map_clip(vec_i_js, stds)
+    vec_i_js = np.asarray(vec_i_js, dtype=float).reshape((-1, 3))
+    kernel_sum = backends.kernel("velocity_sum")
+    def velocity_map(vec):
+        """
+        Spatiotemporal velocity map.
+
+        Parameters
+        ----------
+        vec : np.matrix or np.array with shape nx3
+            The first two values define the velocity on the screen and the
+            third value defines the time. (r, phi, t)
+
+        Returns
+        -------
+        saliency : float or np.array with shape n
+            not normalized saliency for the point vec.
+
+        """
+        if np.ndim(vec) == 2:
+            return kernel_sum(vec, vec_i_js, stds, method)
+        return kernel_sum(vec, vec_i_js, stds, method)[0]
     return velocity_map
 
 
-def generate_fixation_map_cython(vec_i_js, stds):
+def generate_fixation_map_backend(vec_i_js, stds, backend=None):
+    """
+    Generate spatiotemporal fixation map with the kernel sum of a compute
+    backend.
+
+    Parameters
+    ----------
+    vec_i_js : np.array with shape mx3
+    stds : sequence
+    backend : *None* or string
+        name of the backend, e. g. "cython". None uses the selected backend.
+        A missing backend falls back to the next available one (see
+        backends.py).
+
+    Returns
+    -------
+    fixation_map : function
+        function accepting one vector (x, y, t) or an array with shape nx3
+
+    """
     stds = np.array(stds)
-    return functools.partial(dorr_c.fix_map, vec_i_js=vec_i_js, stds=stds)
+    kernel_sum = backends.kernel("fixation_sum", backend)
+    def fixation_map(vec):
+        """
+        Spatiotemporal fixation map (see generate_fixation_map).
+
+        """
+        if np.ndim(vec) == 2:
+            return kernel_sum(vec, vec_i_js, stds)
+        return float(kernel_sum(np.reshape(vec, (1, -1)), vec_i_js, stds)[0])
+    return fixation_map
+
+
+def generate_fixation_map_cython(vec_i_js, stds):
+    return generate_fixation_map_backend(vec_i_js, stds, "cython")
 generate_fixation_map_cython.__doc__ = generate_fixation_map.__doc__
 
 
-def generate_nss_map(fixation_map, norm_sample):
+def generate_fixation_map_truncated(vec_i_js, stds, cutoff=4.0):
+    """
+    Generate spatiotemporal fixation map that neglects far away observers.
+
+    Only the Gaussian distributions of vectors closer than cutoff standard
+    deviations (in the normalized space (x/SIGMA_X, y/SIGMA_Y, t/SIGMA_T)) are
+    summed. The vectors are stored in a KD-tree, therefore one query only
+    touches the nearby vectors.
+
+    Parameters
+    ----------
+    vec_i_js : np.array with shape mx3
+        Every row is a finite vector of one specific observer i and one
+        specific movie j.
+    stds : sequence
+        Sequence containing all standard deviations for the entries in
+        vec_mean, e. g. (SIGMA_X, SIGMA_Y, SIGMA_T)
+    cutoff : float
+        cutoff radius in units of the standard deviations.
+
+    Returns
+    -------
+    fixation_map : function
+        function accepting one vector (x, y, t) or an array with shape nx3.
+        The attribute max_error of the function is an upper bound of the
+        absolute truncation error, i. e. m * exp(-cutoff**2 / 2).
+
+    """
+    stds = np.asarray(stds, dtype=float)
+    tree = kd_tree(vec_i_js, stds)
+    def fixation_map(vec):
+        """
+        Truncated spatiotemporal fixation map (see generate_fixation_map).
+
+        """
+        rows, cols, kernel = gaussian_pairs(vec, None, stds, cutoff, tree)
+        saliencies = np.bincount(rows, weights=kernel,
+                                 minlength=len(np.atleast_2d(vec)))
+        if np.ndim(vec) == 2:
+            return saliencies
+        return saliencies[0]
+    fixation_map.max_error = tree.n * np.exp(-cutoff ** 2 / 2)
+    return fixation_map
+
+
+def generate_nss_map(fixation_map, norm_sample, tol=None, block_size=1000,
+                     vec=None):
     """
     Generate normalized scanpath saliency (NSS) map.
 
@@ -295,27 +885,59 @@ def generate_nss_map(fixation_map, norm_sample):
 
     Parameters
     ----------
-    fixation_map : function accepting one vector
+    fixation_map : function accepting one vector or an array with shape nx3
         fixation_map initialized with vec_i_js.
     norm_sample : np.array with shape nx3
         dependent on this vectors the fixation_map will be normalized to mean
         zero and standard deviation one. You should use at least 10000 samples.
+    tol : *None* or float
+        if not None the norm sample is evaluated in blocks of block_size
+        samples and the evaluation stops as soon as the standard error of the
+        nss value (see nss_standard_error) is below tol. The moments of the
+        saliencies are updated after every block (see merge_moments). The
+        blocks are taken from a random permutation of the norm sample,
+        because the stop rule needs every block to be a random sample of it
+        (the lattice of the grid methods is ordered along x).
+    block_size : integer
+        number of norm samples evaluated at once if tol is not None
+    vec : *None* or np.array with shape 3
+        the point, at which the NSS map will be evaluated. The standard error
+        is controlled for the nss value of vec, or for a nss value of one if
+        vec is None.
 
     Returns
     -------
     normalized_scanpath_saliency_map : function
         function that accepts one vector and returns the saliency for this
-        point.
+        point or that accepts an array with shape nx3 and returns the
+        saliencies for all n points. The attribute n_used is the number of
+        norm samples used for the normalization.
 
     References
     ----------
     See formula (3) in [1]_
 
     """
-    salience_norm_sample = [fixation_map(vec) for vec in norm_sample]
-    #salience_norm_sample = np.apply_along_axis(fixation_map, 1, norm_sample) #8x slower
-    mean = np.mean(salience_norm_sample)
-    sd = np.std(salience_norm_sample)
+    norm_sample = np.asarray(norm_sample)
+    if tol is None:
+        salience_norm_sample = fixation_map(norm_sample)
+        mean = np.mean(salience_norm_sample)
+        sd = np.std(salience_norm_sample)
+        n_used = len(norm_sample)
+    else:
+        saliency_vec = None if vec is None else fixation_map(np.asarray(vec))
+        moments = (0, 0.0, 0.0, 0.0, 0.0)
+        n_used, mean, sd = 0, np.nan, np.nan
+        permutation = np.random.permutation(len(norm_sample))
+        for start in range(0, len(norm_sample), block_size):
+            moments = merge_moments(moments, fixation_map(
+                norm_sample[permutation[start:start + block_size]]))
+            n_used, mean, m2 = moments[:3]
+            sd = np.sqrt(m2 / n_used)
+            if sd > 0.0:
+                nss_value = 1.0 if vec is None else (saliency_vec - mean) / sd
+                if np.all(nss_standard_error(moments, nss_value) < tol):
+                    break
     def nss_map(vec):
         """
         Normalized scanpath saliency (NSS) map.
@@ -332,16 +954,92 @@ def generate_nss_map(fixation_map, norm_sample):
 
         Parameters
         ----------
-        vec : np.matrix
+        vec : np.matrix or np.array with shape nx3
             The first two values define the location on the screen and the
             third value defines the time. (x, y, t)
 
         Returns
         -------
-        saliency : float
+        saliency : float or np.array with shape n
             normalized saliency at the point vec.
 
         """
         return (fixation_map(vec) - mean) / sd
+    nss_map.n_used = n_used
     return nss_map
 
+def merge_moments(moments, values):
+    """
+    Adds values to the running central moments of a sample.
+
+    The moments of the new values are merged with the pairwise update of
+    Welford's algorithm (Chan et al. for the second, Pebay for the third and
+    fourth moment), which is numerically stable for any number of blocks.
+
+    Parameters
+    ----------
+    moments : tuple
+        (n, mean, m2, m3, m4) with the sums of the 2nd to 4th powers of the
+        deviations from the mean. (0, 0.0, 0.0, 0.0, 0.0) for no values.
+    values : np.array
+
+    Returns
+    -------
+    moments : tuple
+        moments of the old and the new values
+
+    """
+    values = np.ravel(values)
+    n_b = len(values)
+    if n_b == 0:
+        return moments
+    mean_b = np.mean(values)
+    deviations = values - mean_b
+    m2_b = np.sum(deviations ** 2)
+    m3_b = np.sum(deviations ** 3)
+    m4_b = np.sum(deviations ** 4)
+    n_a, mean_a, m2_a, m3_a, m4_a = moments
+    if n_a == 0:
+        return (n_b, mean_b, m2_b, m3_b, m4_b)
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    mean = mean_a + delta * n_b / n
+    m2 = m2_a + m2_b + delta ** 2 * n_a * n_b / n
+    m3 = (m3_a + m3_b + delta ** 3 * n_a * n_b * (n_a - n_b) / n ** 2 +
+          3 * delta * (n_a * m2_b - n_b * m2_a) / n)
+    m4 = (m4_a + m4_b +
+          delta ** 4 * n_a * n_b * (n_a ** 2 - n_a * n_b + n_b ** 2) / n ** 3 +
+          6 * delta ** 2 * (n_a ** 2 * m2_b + n_b ** 2 * m2_a) / n ** 2 +
+          4 * delta * (n_a * m3_b - n_b * m3_a) / n)
+    return (n, mean, m2, m3, m4)
+
+def nss_standard_error(moments, nss_value):
+    """
+    Standard error of a nss value caused by the estimation of the mean and
+    the standard deviation from a norm sample.
+
+    For the nss value z = (s - mean) / sd the delta method gives the
+    variance (1 + z * skewness + z**2 * (kurtosis - 1) / 4) / n.
+
+    Parameters
+    ----------
+    moments : tuple
+        (n, mean, m2, m3, m4) of the saliencies of the norm sample (see
+        merge_moments)
+    nss_value : float or np.array
+
+    Returns
+    -------
+    standard_error : float or np.array
+        inf if the saliencies of the norm sample have no variance
+
+    """
+    n, _, m2, m3, m4 = moments
+    if n == 0 or m2 <= 0.0:
+        return np.inf
+    variance = m2 / n
+    skewness = m3 / n / variance ** 1.5
+    kurtosis = m4 / n / variance ** 2
+    return np.sqrt(np.maximum(1 + nss_value * skewness + nss_value ** 2 *
+                              (kurtosis - 1) / 4, 0.0) / n)
+
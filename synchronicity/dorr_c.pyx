@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 # -*- encoding: utf-8 -*-
+# cython: boundscheck=False, wraparound=False, cdivision=True
 # dorr_c.pyx
 
 """
@@ -8,17 +9,80 @@ Fast version to generate fixation map as in dorr.
 The solution in dorr.py is the reference and if there is a difference in the
 results the pure python version is right ;)
 
+The kernel sums run without the GIL and without temporary arrays. If the
+extension is compiled with OpenMP (see setup.py) fix_map_batch distributes the
+query vectors over all cores.
+
 """
 
 import numpy as np
 
-cimport numpy as np
-DTYPE = np.float
+from cython.parallel cimport prange
+from libc.math cimport exp
+
+DTYPE = np.float64
+
+
+cdef inline double _kernel_sum(const double[:, :] n_vecs, Py_ssize_t k,
+                               const double[:, :] n_vec_i_js) noexcept nogil:
+    """
+    Sum of exp(-dist**2 / 2) between the normalized vector n_vecs[k] and all
+    normalized vectors in n_vec_i_js.
+
+    """
+    cdef Py_ssize_t l, d
+    cdef double dist, diff
+    cdef double result = 0.0
+    for l in range(n_vec_i_js.shape[0]):
+        dist = 0.0
+        for d in range(n_vec_i_js.shape[1]):
+            diff = n_vecs[k, d] - n_vec_i_js[l, d]
+            dist = dist + diff * diff
+        result = result + exp(-dist * 0.5)
+    return result
+
+
+def fix_map_batch(vecs, vec_i_js, stds, bint parallel=True):
+    """
+    Spatiotemporal fixation map for every vector in vecs.
+
+    Parameters
+    ----------
+    vecs : np.array with shape nx3
+        (x, y, t) for every query vector
+    vec_i_js : np.array with shape mx3
+        vectors of the observers
+    stds : sequence
+        (SIGMA_X, SIGMA_Y, SIGMA_T)
+    parallel : bool
+        if True the query vectors are distributed over all OpenMP threads.
+
+    Returns
+    -------
+    saliencies : np.array with shape n
+
+    """
+    stds = np.asarray(stds, dtype=DTYPE)
+    cdef const double[:, :] n_vecs = np.ascontiguousarray(
+        np.asarray(vecs, dtype=DTYPE).reshape((-1, len(stds))) / stds)
+    cdef const double[:, :] n_vec_i_js = np.ascontiguousarray(
+        np.asarray(vec_i_js, dtype=DTYPE).reshape((-1, len(stds))) / stds)
+    saliencies = np.empty(n_vecs.shape[0], dtype=DTYPE)
+    cdef double[:] out = saliencies
+    cdef Py_ssize_t k
+    if parallel:
+        for k in prange(n_vecs.shape[0], nogil=True, schedule="guided"):
+            out[k] = _kernel_sum(n_vecs, k, n_vec_i_js)
+    else:
+        with nogil:
+            for k in range(n_vecs.shape[0]):
+                out[k] = _kernel_sum(n_vecs, k, n_vec_i_js)
+    return saliencies
+
 
-def fix_map(np.ndarray vec not None, np.ndarray vec_i_js not None, np.ndarray
-            stds not None):
-    cdef np.ndarray n_vec = vec / stds
-    cdef np.ndarray n_vec_means = vec_i_js / stds
-    cdef np.ndarray dists = np.sum((n_vec - n_vec_means)**2, axis=1)
-    return np.sum(np.exp(-dists*0.5))
+def fix_map(vec, vec_i_js, stds):
+    """
+    Spatiotemporal fixation map for the vector vec (x, y, t).
 
+    """
+    return float(fix_map_batch(vec, vec_i_js, stds, parallel=False)[0])
@@ -9,10 +9,14 @@ Helper and utility functions.
 
 from __future__ import division
 
+import concurrent.futures
+import functools
+import io
+
 import numpy as np
 
 
-def parse_smi(files):
+def parse_smi(files, verbose=False, n_jobs=1):
     """
     Return parsed files as list of dicts.
 
@@ -23,12 +27,17 @@ def parse_smi(files):
     ----------
     files : sequence of str
         file names. For every subject one tab separated file.
+    verbose : bool
+        if True the header and all messages are printed, otherwise one line
+        per file.
+    n_jobs : integer
+        number of processes parsing files concurrently. None uses all cores.
 
     Returns
     -------
     subjects : sequence of dicts
         every dict has a value for "data", "msg" and "file_name".
-        * A value in "data" contains of the x, y and time coordinate.
+        * "data" is a np.array with the x, y and time coordinate.
         * A value in "msg" contains of the time coordinate and a string.
         * "file_name" contains the file name
 
@@ -39,64 +48,155 @@ def parse_smi(files):
         parse_smi raises an IOError.
 
     """
-    subjects = list()
-    for f in files:
-        with open(f, "r") as data_file:
-            header_found = False
-            data = list()
-            msg = list()
-            for line in  data_file:
-                # skip all commentary
-                if line[0] == "#":
-                    continue
-                parts = line.split("\t")
-                if parts[0] == "Time":
-                    header_found = True
-                    print(line)
-                    # check header
-                    if (parts[3] != "L POR X [px]" or
-                        parts[4] != "L POR Y [px]"):
-                        raise IOError("Header of %s has wrong format." % f)
-                    continue
-                if parts[1] == "MSG":
-                    print(line)
-                    msg_point = (float(parts[0]), parts[3])
-                    msg.append(msg_point)
-                    continue
-                if parts[1] == "SMP":
-                    if not header_found:
-                        raise IOError("No header was found before the first line of data.")
-                    data_point = (float(parts[3]), # X left eye
-                                float(parts[4]), # Y left eye
-                                float(parts[0])) # time
-                    data.append(data_point)
-                    continue
-            subjects.append({"data": data, "msg": msg, "file_name": f})
-    return subjects
-
-
-def parse_coord(files):
+    return _map_files(functools.partial(_parse_smi_file, verbose=verbose),
+                      files, n_jobs)
+
+
+def _parse_smi_file(file_name, verbose=False, chunk_size=2**24):
+    """
+    Parses one SMI file (see parse_smi).
+
+    The lines in front of the header are read one by one. Afterwards the
+    file is read in chunks of about chunk_size bytes. The few message (MSG)
+    lines of a chunk are found with str.find and cut out. If all remaining
+    lines are samples (SMP), which is checked by counting, the chunk is
+    converted by one np.loadtxt call without touching single lines in
+    python. Otherwise the sample lines are selected in one pass over the
+    lines of the chunk and converted at once.
+
+    """
+    chunks = list()
+    msg = list()
+    with open(file_name, "r") as data_file:
+        for line in data_file:
+            if line[0] == "#":
+                continue
+            if line.split("\t", 1)[0] == "Time":
+                _check_smi_header(line, file_name, verbose)
+                break
+            if _smi_type(line) == "SMP":
+                raise IOError("No header was found before the first line of data.")
+        while True:
+            chunk = data_file.read(chunk_size)
+            if not chunk:
+                break
+            chunk += data_file.readline()
+            chunk = _cut_smi_messages(chunk, msg, verbose)
+            n_lines = chunk.count("\n") + (not chunk.endswith("\n"))
+            if chunk.count("\tSMP\t") != n_lines:
+                chunk = "".join(line for line in chunk.splitlines(True) if
+                                "\tSMP\t" in line and line[0] != "#")
+            if chunk:
+                # X left eye, Y left eye, time
+                chunks.append(np.loadtxt(io.StringIO(chunk), delimiter="\t",
+                                         usecols=(3, 4, 0), ndmin=2))
+    if chunks:
+        data = np.concatenate(chunks, axis=0)
+    else:
+        data = np.empty((0, 3))
+    print("%s: %i samples, %i messages" % (file_name, len(data), len(msg)))
+    return {"data": data, "msg": msg, "file_name": file_name}
+
+
+def _cut_smi_messages(chunk, msg, verbose=False):
+    """
+    Appends the messages (time, text) of chunk to msg and returns chunk
+    without the message lines.
+
+    """
+    pieces = list()
+    last = 0
+    pos = chunk.find("\tMSG\t")
+    while pos != -1:
+        start = chunk.rfind("\n", 0, pos) + 1
+        stop = chunk.find("\n", pos)
+        stop = len(chunk) if stop == -1 else stop + 1
+        line = chunk[start:stop]
+        if line[0] != "#" and _smi_type(line) == "MSG":
+            if verbose:
+                print(line)
+            parts = line.split("\t")
+            msg.append((float(parts[0]), parts[3]))
+        pieces.append(chunk[last:start])
+        last = stop
+        pos = chunk.find("\tMSG\t", stop)
+    if not pieces:
+        return chunk
+    pieces.append(chunk[last:])
+    return "".join(pieces)
+
+
+def _check_smi_header(line, file_name, verbose=False):
+    """
+    Raises an IOError if the header line has not the expected columns.
+
+    """
+    if verbose:
+        print(line)
+    parts = line.split("\t")
+    if (parts[3] != "L POR X [px]" or
+        parts[4] != "L POR Y [px]"):
+        raise IOError("Header of %s has wrong format." % file_name)
+
+
+def _smi_type(line):
+    """
+    Returns the second column of a SMI line (e. g. "SMP" or "MSG").
+
+    """
+    parts = line.split("\t", 2)
+    return parts[1] if len(parts) > 1 else None
+
+
+def _map_files(function, files, n_jobs=1):
+    """
+    Returns [function(f) for f in files] computed by n_jobs processes.
+
+    """
+    if n_jobs == 1:
+        return [function(f) for f in files]
+    with concurrent.futures.ProcessPoolExecutor(n_jobs) as executor:
+        return list(executor.map(function, files))
+
+
+def parse_coord(files, n_jobs=1):
     """
     Return parsed files as list of np.arrays.
 
     Parameters
     ----------
     files : sequence of str
-        file names. For every subject one tab separated file.
+        file names. For every subject one whitespace separated file.
+    n_jobs : integer
+        number of processes parsing files concurrently. None uses all cores.
 
     Returns
     -------
     Sequence of np.arrays. One array per subject. With (x, y, t)
 
+    Raises
+    ------
+    IOError : wrong format
+        If the rows of a file have different numbers of columns.
+
+    """
+    return _map_files(_parse_coord_file, files, n_jobs)
+
+
+def _parse_coord_file(file_name):
+    """
+    Parses one coord file (see parse_coord).
+
+    The columns are read directly in the order (x, y, t, valid) and the
+    valid rows (fourth column not 0) are copied once.
+
     """
-    subjects = list()
-    for f in files:
-        raw = np.loadtxt(f, skiprows=2)
-        clean = raw[raw[:, 3] != 0]
-        unordered = clean[:, :3] # remove last column
-        data = unordered[:, (1, 2, 0)] # (t, x, y) -> (x, y, t)
-        subjects.append(data)
-    return subjects
+    try:
+        raw = np.loadtxt(file_name, skiprows=2, usecols=(1, 2, 0, 3),
+                         ndmin=2)
+    except ValueError:
+        raise IOError("Rows of %s have different lengths." % file_name)
+    return raw[raw[:, 3] != 0, :3]
 
 
 def extract_video_data(subjects, video):
@@ -122,37 +222,95 @@ def extract_video_data(subjects, video):
     arrays correspond to the second subject etc.
 
     """
-    gaze_data = list()
+    return extract_videos(subjects, (video,))[video]
+
+
+def extract_videos(subjects, videos=None, shift_time=True):
+    """
+    extract eye samples for several videos at once (see extract_video_data).
+
+    The messages of every subject are indexed once (see message_index) and
+    the samples of every repetition are found by binary search on the time
+    sorted data.
+
+    Parameters
+    ----------
+    subjects : sequence
+        sequence of dicts including the data and the messages for each subject
+        (the format smi_parse returns)
+    videos : *None* or sequence of strings
+        names of the videos used in the message output. None extracts all
+        videos.
+    shift_time : bool
+        if True the time of every repetition starts at its message, which
+        needs one copy of the samples of the repetition. If False the
+        returned arrays are views into the data of the subjects.
+
+    Returns
+    -------
+    gaze_data : dict
+        for every video a list of np.arrays ordered like the result of
+        extract_video_data.
+
+    """
+    gaze_data = dict()
+    if videos is not None:
+        for video in videos:
+            gaze_data[video] = list()
     for subject in subjects:
-        data = np.array(subject["data"])
-        msgs = np.array(subject["msg"])
-        starts = list()
-        stops = list()
-        for i, msg in enumerate(msgs):
-            if msg[1].split(" ")[2].strip() == video:
-                starts.append(float(msg[0]))
-                try:
-                    stops.append(float(msgs[i+1][0]))
-                except IndexError:
-                    pass
-        for i, start in enumerate(starts):
-            try:
-                stop = stops[i]
-                # slice intervall
-                tmp = data[data[:,2] > start,:]
-                tmp = tmp[tmp[:,2] < stop,:]
-                # adjust time
-                tmp[:,2] -= start
-                gaze_data.append(tmp)
-            except IndexError:
-                # slice intervall
-                tmp = data[data[:,2] > start,:]
-                # adjust time
-                tmp[:,2] -= start
-                gaze_data.append(tmp)
+        data = sort_time(np.asarray(subject["data"],
+                                    dtype=np.float64).reshape((-1, 3)))
+        times = data[:, 2]
+        for video, intervals in message_index(subject["msg"]).items():
+            if videos is None:
+                gaze_data.setdefault(video, list())
+            elif video not in gaze_data:
+                continue
+            for start, stop in intervals:
+                # samples strictly between start and stop
+                idx_start = np.searchsorted(times, start, side="right")
+                idx_stop = np.searchsorted(times, stop, side="left")
+                tmp = data[idx_start:idx_stop]
+                if shift_time:
+                    tmp = tmp.copy()
+                    # adjust time
+                    tmp[:, 2] -= start
+                gaze_data[video].append(tmp)
     return gaze_data
 
 
+def message_index(msgs):
+    """
+    Returns the start and stop time of every video in the messages.
+
+    The name of the video is the third word of a message. A video stops with
+    the next message.
+
+    Parameters
+    ----------
+    msgs : sequence
+        (time, message) tuples sorted along time
+
+    Returns
+    -------
+    index : dict
+        for every video name a list of (start, stop) tuples. The stop of the
+        last message is infinity.
+
+    """
+    index = dict()
+    for i, (t, text) in enumerate(msgs):
+        words = text.split(" ")
+        if len(words) < 3:
+            continue
+        if i + 1 < len(msgs):
+            stop = float(msgs[i+1][0])
+        else:
+            stop = np.inf
+        index.setdefault(words[2].strip(), list()).append((float(t), stop))
+    return index
+
+
 def slice_time_window(gaze_data, t=112.5, dt=225):
     """
     Returns a sliced np.array.
@@ -185,6 +343,90 @@ def slice_time_window(gaze_data, t=112.5, dt=225):
     return slice_
 
 
+def sort_time(gaze_data):
+    """
+    Returns gaze_data sorted along time.
+
+    Samples with the same time keep their order. If gaze_data is already
+    sorted, gaze_data itself is returned.
+
+    Parameters
+    ----------
+    gaze_data : np.array
+        data with columns x, y, t
+
+    Returns
+    -------
+    sorted_gaze_data : np.array
+
+    """
+    times = gaze_data[:, 2]
+    if np.all(times[1:] >= times[:-1]):
+        return gaze_data
+    return gaze_data[np.argsort(times, kind="mergesort")]
+
+
+def slice_time_window_sorted(gaze_data, t=112.5, dt=225):
+    """
+    Returns a sliced view of time sorted gaze_data.
+
+    Same as slice_time_window, but gaze_data has to be sorted along time (see
+    sort_time). The borders of the slice are found by binary search,
+    therefore the costs do not grow with the length of gaze_data.
+
+    Parameters
+    ----------
+    gaze_data : np.array
+        data to be sliced with columns x, y, t sorted along t
+    t : float
+        center time of the slice
+    dt : float
+        width of the slice. The slice will extend dt/2 in both directions of t.
+
+    Returns
+    -------
+    slice : np.array
+        view into gaze_data
+
+    """
+    times = gaze_data[:, 2]
+    start = np.searchsorted(times, t - dt/2, side="left")
+    stop = np.searchsorted(times, t + dt/2, side="right")
+    slice_ = gaze_data[start:stop]
+    if len(slice_) == 0:
+        print("WARNING: empty slice")
+    return slice_
+
+
+def closest_sample_sorted(gaze_data, t):
+    """
+    Returns the index of the sample closest to t in time sorted gaze_data.
+
+    Gives the same index as ``np.argmin(np.abs(gaze_data[:, 2] - t))``, but
+    by binary search.
+
+    Parameters
+    ----------
+    gaze_data : np.array
+        data with columns x, y, t sorted along t
+    t : float
+        point in time
+
+    Returns
+    -------
+    idx : integer
+
+    """
+    times = gaze_data[:, 2]
+    idx = np.searchsorted(times, t, side="left")
+    if idx == 0:
+        return 0
+    if idx == len(times) or t - times[idx - 1] <= times[idx] - t:
+        # first sample with the same time as the left neighbour
+        return np.searchsorted(times, times[idx - 1], side="left")
+    return idx
+
+
 def random_uniform_sample(n, screen_res, t, dt):
     norm_sample_x = np.random.uniform(0, screen_res[0], n)
     norm_sample_y = np.random.uniform(0, screen_res[1], n)
@@ -212,32 +454,74 @@ def velocity(gaze_data, dt_max, euclidean=False):
         (v_x, v_y, v_t if euclidean=True)
 
     """
-    sorted_gaze_data = gaze_data[np.argsort(gaze_data[:, 2])]  # sort along time
-    dt = sorted_gaze_data[1:, 2] - sorted_gaze_data[:-1, 2]  # might produce zeros
-    dx = sorted_gaze_data[1:, 0] - sorted_gaze_data[:-1, 0]
-    dy = sorted_gaze_data[1:, 1] - sorted_gaze_data[:-1, 1]
+    return velocities([gaze_data], dt_max, euclidean)[0]
+
+
+def velocities(subjects, dt_max, euclidean=False):
+    """
+    Calculates the velocities of the gazes of several subjects at once (see
+    velocity).
+
+    All subjects are copied once into one array, subjects that are not
+    sorted along time are sorted (stable) on the way. The velocities of all
+    subjects are calculated in one pass; velocities between the last sample
+    of one subject and the first sample of the next subject are dropped.
+
+    Parameters
+    ----------
+    subjects : sequence of np.arrays
+        gaze data (x, y, t) of every subject
+    dt_max : float
+        maximal time difference between two samples of a velocity
+    euclidean : bool
+        if True the velocities are returned as v_x, v_y, v_t
+
+    Returns
+    -------
+    (values, offsets) : (np.array, np.array)
+        values contains the velocities of all subjects (see velocity),
+        the velocities of subject i are values[offsets[i]:offsets[i+1]]
+        (see split_ragged).
+
+    """
+    lengths = [len(gaze_data) for gaze_data in subjects]
+    offsets = np.concatenate(([0], np.cumsum(lengths))).astype(int)
+    data = np.empty((offsets[-1], 3))
+    for gaze_data, start, stop in zip(subjects, offsets[:-1], offsets[1:]):
+        data[start:stop] = sort_time(gaze_data)
+    dt = data[1:, 2] - data[:-1, 2]  # might produce zeros
+    dx = data[1:, 0] - data[:-1, 0]
+    dy = data[1:, 1] - data[:-1, 1]
 
     # keep only velocities where dt is strictly greater than zero and less or
-    # equal to dt_max
+    # equal to dt_max and within one subject
     mask = (0 < dt) & (dt <= dt_max)
+    boundaries = offsets[1:-1] - 1
+    mask[boundaries[(boundaries >= 0) & (boundaries < len(mask))]] = False
+    n_kept = np.concatenate(([0], np.cumsum(mask)))
+    velocity_offsets = n_kept[np.minimum(offsets, len(n_kept) - 1)]
 
     dt = dt[mask]
     v_x = dx[mask] / dt
     v_y = dy[mask] / dt
-    v_t = sorted_gaze_data[:-1, 2][mask] + dt / 2
-    del mask
-
+    values = np.empty((len(dt), 3))
+    values[:, 2] = data[:-1, 2][mask] + dt / 2
     if euclidean:
-        return np.array((v_x, v_y, v_t)).transpose()
+        values[:, 0] = v_x
+        values[:, 1] = v_y
+        return (values, velocity_offsets)
 
     # else use polar coordinates
     v_r = np.sqrt(v_x ** 2 + v_y ** 2)
-    v_phi = np.empty_like(v_r)
+    values[:, 0] = v_r
+    values[:, 1] = np.where(v_r != 0, np.arctan2(v_y, v_x), np.NaN)
+    return (values, velocity_offsets)
 
-    mask = v_r != 0
-    notmask = v_r == 0
-    v_phi[mask] = np.arctan2(v_y[mask], v_x[mask])
-    v_phi[notmask] = np.NaN
 
-    return np.array((v_r, v_phi, v_t)).transpose()
+def split_ragged(values, offsets):
+    """
+    Returns the views values[offsets[i]:offsets[i+1]] for every i.
 
+    """
+    return [values[start:stop] for start, stop in zip(offsets[:-1],
+                                                      offsets[1:])]
@@ -12,13 +12,17 @@ from __future__ import absolute_import
 import time
 
 import numpy as np
+import scipy.stats
+import scipy.stats.qmc
 
 from . import dorr
 from . import helper
 
 def nss(subjects, t, dt, stds, dt_max, n_reference,
         method="xy-population", n_norm=10000, population=None,
-        screen_res=(1600, 1200), velocity=False, method_velocity="gamma"):
+        screen_res=(1600, 1200), velocity=False, method_velocity="gamma",
+        engine="loop", time_sorted=False, cutoff=None, norm_tol=None,
+        sampling="iid"):
     """
     calculates the normalized scanpath value for a given time t.
 
@@ -52,6 +56,32 @@ def nss(subjects, t, dt, stds, dt_max, n_reference,
     velocity : bool
         if velocity is True functions for velocity_map will be used in stead of
         fixation_map
+    engine : {"loop", "shared", "grid", "analytic"}
+        "loop" builds a fixation map and a NSS map for every subject one after
+        the other. "shared" draws one norm sample at t for all subjects and
+        derives the normalization of every leave-one-out map from per
+        subject partial sums (see nss_shared).
+        "grid" works like "shared" for the methods "xy-grid" and "xyt-grid",
+        but rasterizes the fixation maps on the lattice (see nss_grid).
+        "analytic" computes the exact normalization for the method
+        "xy-estimation" without any norm sample (see nss_analytic).
+    time_sorted : bool
+        if True the samples of every subject have to be sorted along time
+        (see helper.sort_time) and the time window is found by binary search
+        instead of masking the whole recording.
+    cutoff : *None* or float
+        if not None the Gaussian distributions of reference points further
+        away than cutoff standard deviations are neglected (see
+        dorr.generate_fixation_map_truncated). 4.0 keeps the truncation error
+        of every reference point below 0.00034. Not used for velocity maps.
+    norm_tol : *None* or float
+        if not None the norm sample of every subject is evaluated in blocks
+        until the standard error of its nss value is below norm_tol (see
+        dorr.generate_nss_map). n_norm is the maximal number of norm samples.
+        Only for the engine "loop".
+    sampling : {"iid", "sobol", "halton", "stratified"}
+        how the random norm samples are drawn (see generate_norm_sample).
+        Not used for the grid methods.
 
     Returns
     -------
@@ -59,54 +89,744 @@ def nss(subjects, t, dt, stds, dt_max, n_reference,
         individual nss_values and quality values for all subjects
     quality_value : integer
         gives the number of data points used of one subject
+    n_used : list
+        only returned as third value if norm_tol is not None. The number of
+        norm samples used for every subject (0 without a valid sample).
 
     """
+    points_subject, slices = slice_subjects(subjects, t, dt, dt_max,
+                                            time_sorted)
+    if population is not None:
+        population = remove_invalid(population)
+    return nss_slices(points_subject, slices, t, dt, stds, n_reference,
+                      method, n_norm, population, screen_res, velocity,
+                      method_velocity, engine, cutoff, norm_tol, sampling,
+                      population_order(population, method, sampling))
+
+def nss_series(subjects, ts, dt, stds, dt_max, n_reference,
+               method="xy-population", n_norm=10000, population=None,
+               screen_res=(1600, 1200), velocity=False,
+               method_velocity="gamma", engine="loop", cutoff=None,
+               norm_tol=None, sampling="iid"):
+    """
+    calculates the normalized scanpath values for all points in time in ts.
+
+    The subjects are sorted along time and the population is cleaned only
+    once. For every t the time windows and the samples closest to t are found
+    by binary search. Therefore a whole time axis costs O(N + T * window)
+    instead of O(T * N) for T points in time and N samples.
+
+    Parameters
+    ----------
+    ts : sequence of floats
+        points in time
+    engine : {"loop", "shared", "grid", "analytic", "sliding"}
+        "sliding" works like "grid", but uses one lattice (drawn at ts[0])
+        for all points in time. The spatial factors of every sample are
+        computed only when it enters the time window (see SlidingGrid),
+        which pays off when the time windows of consecutive points in time
+        overlap. Only for the methods "xy-grid" and "xyt-grid".
+
+    See nss for the other parameters.
+
+    Yields
+    ------
+    (t, nss_values, quality_values) : (float, sequence, sequence)
+        for every t in ts the same values as nss(subjects, t, ...) returns.
+        If norm_tol is not None n_used is yielded as fourth value.
+
+    """
+    subjects = [helper.sort_time(subject) for subject in subjects]
+    if population is not None:
+        population = remove_invalid(population)
+    order = population_order(population, method, sampling)
+    if engine == "sliding":
+        if velocity:
+            raise ValueError("engine sliding does not support velocity maps")
+        if norm_tol is not None:
+            raise ValueError("engine sliding does not support norm_tol")
+        if len(ts) == 0:
+            return
+        # one lattice for all points in time
+        xs, ys, _ = grid_axes(ts[0], dt, method, n_norm, screen_res)
+        sliding_grid = SlidingGrid(subjects, stds, xs, ys)
+    for t in ts:
+        points_subject, slices = slice_subjects(subjects, t, dt, dt_max,
+                                                time_sorted=True)
+        if engine == "sliding":
+            _, _, ts_lattice = grid_times(t, dt, method, n_norm)
+            nss_values = nss_rasters(points_subject, slices, stds,
+                                     n_reference,
+                                     sliding_grid.rasters(t, dt, ts_lattice))
+            values = (nss_values, [len(slice_) for slice_ in slices])
+        else:
+            values = nss_slices(points_subject, slices, t, dt, stds,
+                                n_reference, method, n_norm, population,
+                                screen_res, velocity, method_velocity, engine,
+                                cutoff, norm_tol, sampling, order)
+        yield (t,) + tuple(values)
+
+def nss_convergence(subjects, t, dt, stds, dt_max, n_reference, n_norms,
+                    n_repetitions=50, method="xy-population", n_pool=None,
+                    population=None, screen_res=(1600, 1200),
+                    time_sorted=False, cutoff=None, sampling="iid"):
+    """
+    calculates the distribution of the nss values at t for several sizes of
+    the norm sample.
+
+    The leave-one-out fixation maps of all subjects are evaluated once on a
+    pool of n_pool norm samples drawn at t. Every repetition draws n_norm
+    indices into the pool with replacement and normalizes with the mean and
+    the standard deviation of the selected saliencies, which emulates a
+    fresh norm sample of size n_norm without evaluating the fixation maps
+    again. Repeating nss with n_norms=(100, 1000, 10000)*50 instead costs one
+    evaluation of all fixation maps per repetition.
+
+    .. note::
+        Like in nss_shared the norm samples are located at t and not at the
+        time of the sample of each subject closest to t. The spread of the
+        nss values is underestimated for n_norm close to n_pool.
+
+    Parameters
+    ----------
+    n_norms : sequence of integers
+        sizes of the norm sample
+    n_repetitions : integer
+        number of resampled norm samples for every n_norm
+    method : {"xy-population", "xy-estimation"}
+        the grid methods have no random norm sample and are not supported.
+    n_pool : *None* or integer
+        number of norm samples the fixation maps are evaluated on. None uses
+        ten times the largest n_norm.
+
+    See nss for the other parameters.
+
+    Returns
+    -------
+    nss_values : dict
+        for every n_norm an np.array with shape n_repetitions x n_subjects.
+        NaN for all subjects without a sample within dt_max.
+
+    """
+    if method not in ("xy-population", "xy-estimation"):
+        raise ValueError("{method} is not supported.".format(method=method))
+    points_subject, slices = slice_subjects(subjects, t, dt, dt_max,
+                                            time_sorted)
+    if population is not None:
+        population = remove_invalid(population)
+    n_subjects = len(slices)
+    nss_values = dict((n_norm, np.full((n_repetitions, n_subjects), np.nan))
+                      for n_norm in n_norms)
+    valid = [i for i, point_subject in enumerate(points_subject) if
+             point_subject is not None]
+    if not valid:
+        return nss_values
+    if n_pool is None:
+        n_pool = 10 * max(n_norms)
+    references = reference_matrix(n_subjects, n_reference)[valid]
+    joint_slices = np.concatenate(slices, axis=0)
+    owners = np.repeat(np.arange(n_subjects), [len(slice_) for slice_ in slices])
+
+    pool = generate_norm_sample(t, dt, method, population, n_pool, screen_res,
+                                sampling, population_order(population, method,
+                                                           sampling))
+    # saliency_pool[k, v] is the leave-one-out map of valid[v] at pool[k]
+    saliency_pool = np.dot(subject_saliencies(pool, joint_slices, owners,
+                                              n_subjects, stds, cutoff),
+                           references.T)
+    vecs = np.array([points_subject[i] for i in valid])
+    saliency_subjects = np.sum(subject_saliencies(vecs, joint_slices, owners,
+                                                  n_subjects, stds, cutoff) *
+                               references, axis=1)
+    for n_norm in n_norms:
+        for repetition in range(n_repetitions):
+            saliency_norm = saliency_pool[np.random.randint(0, n_pool, n_norm)]
+            nss_values[n_norm][repetition, valid] = (
+                (saliency_subjects - np.mean(saliency_norm, axis=0)) /
+                np.std(saliency_norm, axis=0))
+    return nss_values
+
+def slice_subjects(subjects, t, dt, dt_max, time_sorted=False):
+    """
+    Returns the sample closest to t and the valid gaze data in the time
+    window around t for every subject.
+
+    Parameters
+    ----------
+    time_sorted : bool
+        if True the samples of every subject have to be sorted along time and
+        binary search is used.
+
+    See nss for the other parameters.
+
+    Returns
+    -------
+    (points_subject, slices) : (list, list)
+        points_subject contains the sample closest to t for every subject or
+        None if this sample is further away than dt_max. slices contains the
+        gaze data without NaNs within t - dt/2 and t + dt/2.
+
+    """
+    points_subject = list()
     slices = list()
     for gaze in subjects:
-        slice_ = helper.slice_time_window(gaze, t, dt)
+        if time_sorted:
+            slice_ = helper.slice_time_window_sorted(gaze, t, dt)
+            idx = helper.closest_sample_sorted(gaze, t)
+        else:
+            slice_ = helper.slice_time_window(gaze, t, dt)
+            idx = np.argmin(np.abs(gaze[:, 2] - t))
         # remove invalid gaze data (marked with NaN)
-        if len(slice_) > 0:
-            slice_ = slice_[np.logical_not(np.isnan(slice_[:,0])),:]
-        if len(slice_) > 0:
-            slice_ = slice_[np.logical_not(np.isnan(slice_[:,1])),:]
-        slices.append(slice_)
-    del slice_
-    # remove invalid gaze data (marked with NaN)
-    if len(population) > 0:
-        population = population[np.logical_not(np.isnan(population[:, 0])),:]
-    if len(population) > 0:
-        population = population[np.logical_not(np.isnan(population[:, 1])),:]
+        slices.append(remove_invalid(slice_))
+        if np.abs(gaze[idx, 2] - t) > dt_max:
+            points_subject.append(None)
+        else:
+            points_subject.append(gaze[idx])
+    return (points_subject, slices)
+
+def remove_invalid(gaze_data):
+    """
+    Removes invalid gaze data (marked with NaN in x or y).
+
+    """
+    if len(gaze_data) > 0:
+        gaze_data = gaze_data[np.logical_not(np.isnan(gaze_data[:, 0])),:]
+    if len(gaze_data) > 0:
+        gaze_data = gaze_data[np.logical_not(np.isnan(gaze_data[:, 1])),:]
+    return gaze_data
+
+def nss_slices(points_subject, slices, t, dt, stds, n_reference,
+               method="xy-population", n_norm=10000, population=None,
+               screen_res=(1600, 1200), velocity=False,
+               method_velocity="gamma", engine="loop", cutoff=None,
+               norm_tol=None, sampling="iid", order=None):
+    """
+    calculates the normalized scanpath values from already sliced gaze data.
+
+    Parameters
+    ----------
+    points_subject : sequence
+        for every subject the sample closest to t or None (see
+        slice_subjects)
+    slices : sequence of np.arrays
+        for every subject the valid gaze data in the time window around t.
+    population : np.array
+        population without invalid gaze data
+    order : *None* or np.array
+        spatial order of the population (see population_order)
+
+    See nss for the other parameters.
+
+    Returns
+    -------
+    (nss_values, quality_values) : (sequence, sequence)
+        and n_used as third value if norm_tol is not None (see nss)
+
+    """
     quality_values = [len(slice_) for slice_ in slices]
+    if norm_tol is not None:
+        if engine != "loop":
+            raise ValueError("norm_tol is only supported by engine loop")
+        nss_values, n_used = nss_loop(points_subject, slices, t, dt, stds,
+                                      n_reference, method, n_norm, population,
+                                      screen_res, velocity, method_velocity,
+                                      cutoff, norm_tol, sampling, order)
+        return (nss_values, quality_values, n_used)
+    if engine == "loop":
+        nss_values = nss_loop(points_subject, slices, t, dt, stds,
+                              n_reference, method, n_norm, population,
+                              screen_res, velocity, method_velocity, cutoff,
+                              sampling=sampling, order=order)
+    elif engine == "shared":
+        if velocity:
+            raise ValueError("engine shared does not support velocity maps")
+        nss_values = nss_shared(points_subject, slices, t, dt, stds,
+                                n_reference, method, n_norm, population,
+                                screen_res, cutoff, sampling, order)
+    elif engine == "grid":
+        if velocity:
+            raise ValueError("engine grid does not support velocity maps")
+        nss_values = nss_grid(points_subject, slices, t, dt, stds,
+                              n_reference, method, n_norm, screen_res)
+    elif engine == "analytic":
+        if velocity:
+            raise ValueError("engine analytic does not support velocity maps")
+        nss_values = nss_analytic(points_subject, slices, stds, n_reference,
+                                  method, population)
+    elif engine == "sliding":
+        raise ValueError("engine sliding is only supported by nss_series")
+    else:
+        raise ValueError("engine {engine} is not supported.".format(engine=engine))
+    return (nss_values, quality_values)
+
+def nss_loop(points_subject, slices, t, dt, stds, n_reference,
+             method="xy-population", n_norm=10000, population=None,
+             screen_res=(1600, 1200), velocity=False,
+             method_velocity="gamma", cutoff=None, norm_tol=None,
+             sampling="iid", order=None):
+    """
+    calculates the nss values for all subjects one after the other.
+
+    For every subject the reference slices are concatenated, a fixation map
+    and a NSS map is generated and evaluated at the point of the subject
+    closest to t.
+
+    Parameters
+    ----------
+    points_subject : sequence
+        for every subject the sample closest to t or None (see
+        slice_subjects)
+    slices : sequence of np.arrays
+        for every subject the valid gaze data in the time window around t.
+
+    See nss for the other parameters.
+
+    Returns
+    -------
+    nss_values : list
+        NaN for all subjects without a sample within dt_max. If norm_tol is
+        not None (nss_values, n_used) is returned (see nss).
+
+    """
     nss_values = list()
-    for i, subject in enumerate(subjects):
+    n_used = list()
+    for i, point_subject in enumerate(points_subject):
         start_time = time.time()
-        if np.min(np.abs(subject[:, 2] - t)) > dt_max:
+        if point_subject is None:
             nss_values.append(np.NAN)
+            n_used.append(0)
             continue
-        point_subject = subject[np.argmin(np.abs(subject[:, 2] - t))]
         x_subject, y_subject, t_subject = point_subject
         idx_right = i + n_reference + 1
-        if idx_right > len(subjects):
+        if idx_right > len(slices):
             reference_slices = (slices[i+1:] +
-                                slices[:idx_right-len(subjects)])
+                                slices[:idx_right-len(slices)])
         else:
             reference_slices = slices[i+1:idx_right]
         joint_slices = np.concatenate(reference_slices, axis=0)
         if velocity:
             fix_map = dorr.generate_velocity_map(joint_slices, stds,
                                                  method=method_velocity)
+        elif cutoff is not None:
+            fix_map = dorr.generate_fixation_map_truncated(joint_slices, stds,
+                                                           cutoff)
         else:
-            fix_map = dorr.generate_fixation_map_cython(joint_slices, stds)
-            #fix_map = dorr.generate_fixation_map(joint_slices, stds)
+            fix_map = dorr.generate_fixation_map_backend(joint_slices, stds)
         norm_sample = generate_norm_sample(t_subject, dt, method, population,
-                                           n_norm, screen_res)
-        nss_map = dorr.generate_nss_map(fix_map, norm_sample)
-        nss_values.append(nss_map(np.array([x_subject, y_subject, t_subject])))
+                                           n_norm, screen_res, sampling,
+                                           order)
+        vec = np.array([x_subject, y_subject, t_subject])
+        nss_map = dorr.generate_nss_map(fix_map, norm_sample, norm_tol,
+                                        vec=vec)
+        nss_values.append(nss_map(vec))
+        n_used.append(nss_map.n_used)
         #print("Iteration for nss value need: %f sec" % (time.time() - start_time))
-    return (nss_values, quality_values)
+    if norm_tol is not None:
+        return (nss_values, n_used)
+    return nss_values
+
+def nss_shared(points_subject, slices, t, dt, stds, n_reference,
+               method="xy-population", n_norm=10000, population=None,
+               screen_res=(1600, 1200), cutoff=None, sampling="iid",
+               order=None):
+    """
+    calculates the nss values for all subjects with one shared norm sample.
+
+    Every leave-one-out fixation map is a weighted sum of the fixation maps
+    of the single subjects. One norm sample at t is drawn and the fixation
+    maps of all single subjects are evaluated on it as one matrix product.
+    The mean and the standard deviation of every leave-one-out map follow
+    from the means and the covariances of these partial sums (see
+    leave_one_out_moments) without evaluating the norm sample again.
+
+    .. note::
+        In contrast to nss_loop the norm sample is located at t and not at
+        the time of the sample of each subject closest to t.
+
+    Parameters
+    ----------
+    points_subject : sequence
+        for every subject the sample closest to t or None (see
+        slice_subjects)
+    slices : sequence of np.arrays
+        for every subject the valid gaze data in the time window around t.
+
+    See nss for the other parameters.
+
+    Returns
+    -------
+    nss_values : list
+        NaN for all subjects without a sample within dt_max.
+
+    """
+    n_subjects = len(slices)
+    references = reference_matrix(n_subjects, n_reference)
+    joint_slices = np.concatenate(slices, axis=0)
+    owners = np.repeat(np.arange(n_subjects), [len(slice_) for slice_ in slices])
+
+    valid = [i for i, point_subject in enumerate(points_subject) if
+             point_subject is not None]
+    nss_values = [np.nan] * n_subjects
+    if not valid:
+        return nss_values
+
+    norm_sample = generate_norm_sample(t, dt, method, population, n_norm,
+                                       screen_res, sampling, order)
+    saliency_norm = subject_saliencies(norm_sample, joint_slices, owners,
+                                       n_subjects, stds, cutoff)
+    means_subject = np.mean(saliency_norm, axis=0)
+    saliency_norm -= means_subject
+    covariances = np.dot(saliency_norm.T, saliency_norm) / len(saliency_norm)
+    means, sds = leave_one_out_moments(means_subject, covariances,
+                                       references[valid])
+
+    vecs = np.array([points_subject[i] for i in valid])
+    saliency_subjects = np.sum(subject_saliencies(vecs, joint_slices, owners,
+                                                  n_subjects, stds, cutoff) *
+                               references[valid], axis=1)
+    for i, value in zip(valid, (saliency_subjects - means) / sds):
+        nss_values[i] = value
+    return nss_values
+
+def nss_grid(points_subject, slices, t, dt, stds, n_reference,
+             method="xy-grid", n_norm="120X72", screen_res=(1600, 1200)):
+    """
+    calculates the nss values for all subjects with one shared lattice.
+
+    Same as nss_shared for the grid methods, but the fixation map of every
+    single subject is rasterized on the whole lattice at once with
+    dorr.rasterize_fixation_map, which uses that the Gaussian distribution
+    is separable.
+
+    Parameters
+    ----------
+    points_subject : sequence
+        for every subject the sample closest to t or None (see
+        slice_subjects)
+    slices : sequence of np.arrays
+        for every subject the valid gaze data in the time window around t.
+    method : {"xy-grid", "xyt-grid"}
+
+    See nss for the other parameters.
+
+    Returns
+    -------
+    nss_values : list
+        NaN for all subjects without a sample within dt_max.
+
+    """
+    if all(point_subject is None for point_subject in points_subject):
+        return [np.nan] * len(slices)
+
+    xs, ys, ts = grid_axes(t, dt, method, n_norm, screen_res)
+
+    rasters = np.array([dorr.rasterize_fixation_map(slice_, stds, xs, ys,
+                                                    ts).ravel()
+                        for slice_ in slices])
+    return nss_rasters(points_subject, slices, stds, n_reference, rasters)
+
+def nss_rasters(points_subject, slices, stds, n_reference, rasters):
+    """
+    calculates the nss values from the fixation maps of every single subject
+    rasterized on the lattice (see nss_grid).
+
+    Parameters
+    ----------
+    rasters : np.array with shape n_subjects x n_lattice
+        fixation map of every single subject at all points of the lattice.
+        rasters is modified.
+
+    See nss_grid for the other parameters.
+
+    Returns
+    -------
+    nss_values : list
+
+    """
+    n_subjects = len(slices)
+    references = reference_matrix(n_subjects, n_reference)
+    valid = [i for i, point_subject in enumerate(points_subject) if
+             point_subject is not None]
+    nss_values = [np.nan] * n_subjects
+    if not valid:
+        return nss_values
+    means_subject = np.mean(rasters, axis=1)
+    rasters -= means_subject[:, np.newaxis]
+    covariances = np.dot(rasters, rasters.T) / rasters.shape[1]
+    del rasters
+    means, sds = leave_one_out_moments(means_subject, covariances,
+                                       references[valid])
+
+    joint_slices = np.concatenate(slices, axis=0)
+    owners = np.repeat(np.arange(n_subjects), [len(slice_) for slice_ in slices])
+    vecs = np.array([points_subject[i] for i in valid])
+    saliency_subjects = np.sum(subject_saliencies(vecs, joint_slices, owners,
+                                                  n_subjects, stds) *
+                               references[valid], axis=1)
+    for i, value in zip(valid, (saliency_subjects - means) / sds):
+        nss_values[i] = value
+    return nss_values
+
+class SlidingGrid(object):
+    """
+    Fixation maps of the sliding time windows of all subjects on one fixed
+    lattice.
+
+    On the lattice the fixation map is sum_l gx[a, l] * gy[b, l] * gt[c, l]
+    (see dorr.rasterize_fixation_map). The spatial factors gx and gy of a
+    sample do not depend on t, therefore they are computed once when the
+    sample enters the time window and are dropped when it leaves. The
+    temporal factors gt change with every t and are computed for the whole
+    window, which costs one exponential per sample instead of n_x + n_y.
+
+    Parameters
+    ----------
+    subjects : sequence of np.arrays
+        for every subject the gaze data sorted along time
+    stds : sequence of floats
+        standard deviations for x, y and t
+    xs, ys : np.array
+        fixed axes of the lattice (see grid_axes)
+
+    """
+
+    def __init__(self, subjects, stds, xs, ys):
+        self.subjects = subjects
+        self.stds = np.asarray(stds, dtype=float)
+        self.xs = np.asarray(xs, dtype=float)
+        self.ys = np.asarray(ys, dtype=float)
+        self.ranges = [(0, 0)] * len(subjects)
+        self.factors = [(np.empty((len(xs), 0)), np.empty((len(ys), 0)))
+                        for _ in subjects]
+        # number of samples, which spatial factors were computed
+        self.n_computed = 0
+
+    def spatial_factors(self, gaze_data):
+        """
+        Returns gx and gy for gaze_data. Invalid samples get zero factors.
+
+        """
+        self.n_computed += len(gaze_data)
+        invalid = np.isnan(gaze_data[:, 0]) | np.isnan(gaze_data[:, 1])
+        factors = list()
+        for dim, axis in enumerate((self.xs, self.ys)):
+            diff = np.subtract.outer(axis / self.stds[dim],
+                                     gaze_data[:, dim] / self.stds[dim])
+            factor = np.exp(-diff * diff / 2)
+            factor[:, invalid] = 0.0
+            factors.append(factor)
+        return factors
+
+    def update(self, i, start, stop):
+        """
+        Moves the cached window of subject i to the rows start to stop.
+
+        """
+        lo, hi = self.ranges[i]
+        gx, gy = self.factors[i]
+        if not lo <= start <= hi <= stop:
+            gx, gy = self.spatial_factors(self.subjects[i][start:stop])
+        else:
+            new_gx, new_gy = self.spatial_factors(self.subjects[i][hi:stop])
+            gx = np.concatenate((gx[:, start-lo:], new_gx), axis=1)
+            gy = np.concatenate((gy[:, start-lo:], new_gy), axis=1)
+        self.ranges[i] = (start, stop)
+        self.factors[i] = (gx, gy)
+
+    def rasters(self, t, dt, ts):
+        """
+        Returns the fixation map of every single subject on the lattice
+        spanned by xs, ys and ts.
+
+        Parameters
+        ----------
+        t : float
+            center of the time window
+        dt : float
+            width of the time window
+        ts : np.array
+            time axis of the lattice (see grid_times)
+
+        Returns
+        -------
+        rasters : np.array with shape n_subjects x (n_x * n_y * n_t)
+            same as dorr.rasterize_fixation_map for the slice of every
+            subject (see helper.slice_time_window_sorted)
+
+        """
+        rasters = np.empty((len(self.subjects), len(self.xs), len(self.ys),
+                            len(ts)))
+        for i, gaze_data in enumerate(self.subjects):
+            times = gaze_data[:, 2]
+            start = np.searchsorted(times, t - dt/2, side="left")
+            stop = np.searchsorted(times, t + dt/2, side="right")
+            self.update(i, start, stop)
+            gx, gy = self.factors[i]
+            diff = np.subtract.outer(np.asarray(ts) / self.stds[2],
+                                     times[start:stop] / self.stds[2])
+            gt = np.exp(-diff * diff / 2)
+            for c in range(len(ts)):
+                rasters[i, :, :, c] = np.dot(gx * gt[c], gy.T)
+        return rasters.reshape((len(self.subjects), -1))
+
+def nss_analytic(points_subject, slices, stds, n_reference,
+                 method="xy-estimation", population=None):
+    """
+    calculates the nss values for all subjects with exact normalization.
+
+    The method "xy-estimation" estimates the random gaze data with a normal
+    distribution in x and y. The mean and the variance of a fixation map over
+    this distribution have closed forms (see dorr.fixation_map_moments),
+    therefore no norm sample is drawn and the result is free of sampling
+    noise. Like in nss_loop the fixation map of each subject is normalized at
+    the time of the sample of this subject closest to t.
+
+    Parameters
+    ----------
+    points_subject : sequence
+        for every subject the sample closest to t or None (see
+        slice_subjects)
+    slices : sequence of np.arrays
+        for every subject the valid gaze data in the time window around t.
+    method : {"xy-estimation"}
+
+    See nss for the other parameters.
+
+    Returns
+    -------
+    nss_values : list
+        NaN for all subjects without a sample within dt_max.
+
+    """
+    if method != "xy-estimation":
+        raise ValueError("engine analytic only supports method xy-estimation")
+    n_subjects = len(slices)
+    references = reference_matrix(n_subjects, n_reference)
+    joint_slices = np.concatenate(slices, axis=0)
+    owners = np.repeat(np.arange(n_subjects), [len(slice_) for slice_ in slices])
+
+    valid = [i for i, point_subject in enumerate(points_subject) if
+             point_subject is not None]
+    nss_values = [np.nan] * n_subjects
+    if not valid:
+        return nss_values
+
+    vecs = np.array([points_subject[i] for i in valid])
+    std_xy = np.std(population[:, :2], axis=0)
+    mean_xy = np.mean(population[:, :2], axis=0)
+    means, variances = dorr.fixation_map_moments(joint_slices, stds,
+                                                 vecs[:, 2], mean_xy, std_xy,
+                                                 references[valid][:, owners])
+    saliency_subjects = np.sum(subject_saliencies(vecs, joint_slices, owners,
+                                                  n_subjects, stds) *
+                               references[valid], axis=1)
+    for i, value in zip(valid, (saliency_subjects - means) /
+                        np.sqrt(variances)):
+        nss_values[i] = value
+    return nss_values
+
+def subject_saliencies(vecs, joint_slices, owners, n_subjects, stds,
+                       cutoff=None):
+    """
+    Evaluates the fixation map of every single subject at vecs.
+
+    Parameters
+    ----------
+    vecs : np.array with shape nx3
+    joint_slices : np.array with shape mx3
+        concatenated gaze data of all subjects
+    owners : np.array with shape m
+        index of the subject for every row in joint_slices
+    n_subjects : integer
+    stds : sequence of floats
+    cutoff : *None* or float
+        if not None reference points further away than cutoff standard
+        deviations are neglected (see dorr.gaussian_pairs).
+
+    Returns
+    -------
+    saliencies : np.array with shape n x n_subjects
+        saliencies[k, j] is the fixation map of subject j at vecs[k].
+
+    """
+    indicator = np.zeros((len(joint_slices), n_subjects))
+    indicator[np.arange(len(joint_slices)), owners] = 1.0
+    saliencies = np.empty((len(vecs), n_subjects))
+    tree = None if cutoff is None else dorr.kd_tree(joint_slices, stds)
+    for chunk in dorr.chunk_slices(len(vecs), len(joint_slices)):
+        if tree is None:
+            kernel = dorr.gaussian_matrix(vecs[chunk], joint_slices, stds)
+            saliencies[chunk] = np.dot(kernel, indicator)
+        else:
+            rows, cols, kernel = dorr.gaussian_pairs(vecs[chunk], joint_slices,
+                                                     stds, cutoff, tree)
+            n_rows = chunk.stop - chunk.start
+            saliencies[chunk] = np.bincount(
+                rows * n_subjects + owners[cols], weights=kernel,
+                minlength=n_rows * n_subjects).reshape((n_rows, n_subjects))
+    return saliencies
+
+def leave_one_out_moments(means_subject, covariances, references):
+    """
+    Returns mean and standard deviation of weighted sums of subject maps.
+
+    If F_j are the fixation maps of the single subjects, the leave-one-out
+    map of subject i is sum_j references[i, j] * F_j. Its mean and variance
+    over the norm sample follow from the means and the covariance matrix of
+    the F_j.
+
+    Parameters
+    ----------
+    means_subject : np.array with shape n_subjects
+        mean of F_j over the norm sample
+    covariances : np.array with shape n_subjects x n_subjects
+        covariances of F_j and F_k over the norm sample
+    references : np.array with shape n x n_subjects
+        rows of reference_matrix
+
+    Returns
+    -------
+    (means, sds) : (np.array, np.array)
+
+    """
+    means = np.dot(references, means_subject)
+    variances = np.sum(np.dot(references, covariances) * references, axis=1)
+    return (means, np.sqrt(np.maximum(variances, 0.0)))
+
+def reference_matrix(n_subjects, n_reference):
+    """
+    Returns the reference subjects for every subject as a matrix.
+
+    Every subject uses the next n_reference subjects (wrapping around at the
+    end of the subjects) as reference.
+
+    Parameters
+    ----------
+    n_subjects : integer
+    n_reference : integer
+
+    Returns
+    -------
+    references : np.array with shape n_subjects x n_subjects
+        references[i, j] is the number of times subject j is a reference of
+        subject i.
+
+    """
+    references = np.zeros((n_subjects, n_subjects), dtype=int)
+    for i in range(n_subjects):
+        idx_right = i + n_reference + 1
+        if idx_right > n_subjects:
+            reference_idxs = (list(range(i+1, n_subjects)) +
+                              list(range(min(idx_right - n_subjects,
+                                             n_subjects))))
+        else:
+            reference_idxs = list(range(i+1, idx_right))
+        np.add.at(references[i], reference_idxs, 1)
+    return references
 
 def generate_norm_sample(t, dt, method="xy-population", population=None,
-                         n=10000, screen_res=(1600, 1200)):
+                         n=10000, screen_res=(1600, 1200), sampling="iid",
+                         order=None):
     """
     Generate a random norm sample out of population.
 
@@ -132,61 +852,219 @@ def generate_norm_sample(t, dt, method="xy-population", population=None,
         (x_res, y_res) the horizontal and vertical resolution of the screen
         used to collect the gaze data. This values are only used in grid
         normalization.
+    sampling : {"iid", "sobol", "halton", "stratified"}
+        "iid" draws independent samples. The other variants transform a
+        sample of the unit square (see unit_sample), which covers the unit
+        square more evenly, with the inverse distribution function of the
+        normal distribution ("xy-estimation") or by scaling to the screen
+        ("xy-plane"). For "xy-population" the population is ordered by
+        spatial bins (see spatial_order) and a one dimensional unit sample
+        selects the indices, so that every region of the screen contributes
+        according to its share of the population. Not used for the grid
+        methods.
+    order : *None* or np.array
+        spatial order of the population (see population_order). Pass it
+        when drawing several norm samples from the same population, None
+        computes it on every call.
 
     """
+    if sampling not in ("iid", "sobol", "halton", "stratified"):
+        raise ValueError("sampling {sampling} is not supported.".format(
+            sampling=sampling))
     if method == "xy-estimation":
         std_x, std_y = np.std(population[:, :2], axis=0)
         mean_x, mean_y = np.mean(population[:, :2], axis=0)
-        x = np.random.normal(mean_x, std_x, (n, 1))
-        y = np.random.normal(mean_y, std_y, (n, 1))
+        if sampling == "iid":
+            x = np.random.normal(mean_x, std_x, (n, 1))
+            y = np.random.normal(mean_y, std_y, (n, 1))
+        else:
+            # keep the unit sample away from 0 and 1 (infinite quantiles)
+            unit = np.clip(unit_sample(n, 2, sampling), 1e-10, 1 - 1e-10)
+            normal = scipy.stats.norm.ppf(unit)
+            x = mean_x + std_x * normal[:, :1]
+            y = mean_y + std_y * normal[:, 1:]
         times = t * np.ones((n, 1))
         norm_sample = np.concatenate((x, y, times), axis=1)
         return norm_sample
     elif method == "xy-population":
-        idx = np.random.random_integers(0, len(population)-1, n)
+        if sampling == "iid":
+            idx = np.random.random_integers(0, len(population)-1, n)
+        else:
+            if order is None:
+                order = spatial_order(population)
+            idx = order[np.minimum(
+                (unit_sample(n, 1, sampling)[:, 0] *
+                 len(population)).astype(int), len(population) - 1)]
         times = t * np.ones((n, 1))
         norm_sample = np.concatenate((population[idx, :2], times), axis=1)
         return norm_sample
-    elif method == "xyt-grid":
-        try:
-             n_x, n_y, n_time = [int(nn) for nn in n.split("X")]
-        except ValueError:
-            raise ValueError("method xyt-grid assumes n='n_xXn_yXn_time', e. g. '120X72X10' as a string literal")
-        offset_x = np.random.uniform(0.0, screen_res[0]/n_x)
-        offset_y = np.random.uniform(0.0, screen_res[1]/n_y)
-        x = np.tile(np.repeat(np.linspace(0, screen_res[0], n_x), n_y), n_time)
+    elif method in ("xyt-grid", "xy-grid"):
+        xs, ys, ts = grid_axes(t, dt, method, n, screen_res)
+        n_x, n_y, n_time = len(xs), len(ys), len(ts)
+        x = np.tile(np.repeat(xs, n_y), n_time)
         x.shape = (n_x*n_y*n_time, 1)
-        x += offset_x
-        y = np.tile(np.tile(np.linspace(0, screen_res[1], n_y), n_x), n_time)
+        y = np.tile(np.tile(ys, n_x), n_time)
         y.shape = (n_x*n_y*n_time, 1)
-        y += offset_y
-        times = np.repeat(np.linspace(t - dt/2., t + dt/2., n_time), n_x*n_y)
+        times = np.repeat(ts, n_x*n_y)
         times.shape = (n_x*n_y*n_time, 1)
         norm_sample = np.concatenate((x, y, times), axis=1)
         return norm_sample
-    elif method == "xy-grid":
-        try:
-             n_x, n_y = [int(nn) for nn in n.split("X")]
-        except ValueError:
-            raise ValueError("method xy-grid assumes n='n_xXn_y', e. g. '120X72' as a string literal")
-        offset_x = np.random.uniform(0.0, screen_res[0]/n_x)
-        offset_y = np.random.uniform(0.0, screen_res[1]/n_y)
-        x = np.repeat(np.linspace(0, screen_res[0], n_x), n_y)
-        x.shape = (n_x*n_y, 1)
-        x += offset_x
-        y = np.tile(np.linspace(0, screen_res[1], n_y), n_x)
-        y.shape = (n_x*n_y, 1)
-        y += offset_y
-        times = np.repeat(t, n_x*n_y)
-        times.shape = (n_x*n_y, 1)
-        norm_sample = np.concatenate((x, y, times), axis=1)
-        return norm_sample
     elif method == "xy-plane":
-        x = np.random.uniform(0, screen_res[0], n)
-        y = np.random.uniform(0, screen_res[1], n)
-        times = t * np.ones(n)
+        if sampling == "iid":
+            x = np.random.uniform(0, screen_res[0], (n, 1))
+            y = np.random.uniform(0, screen_res[1], (n, 1))
+        else:
+            unit = unit_sample(n, 2, sampling)
+            x = unit[:, :1] * screen_res[0]
+            y = unit[:, 1:] * screen_res[1]
+        times = t * np.ones((n, 1))
         norm_sample = np.concatenate((x, y, times), axis=1)
         return norm_sample
     else:
         raise ValueError("{method} is not supported.".format(method=method))
 
+def unit_sample(n, d, sampling="sobol"):
+    """
+    Returns n points in the d dimensional unit cube.
+
+    The quasi random sequences are scrambled with a seed drawn from the
+    numpy random state, therefore np.random.seed makes them reproducible.
+
+    Parameters
+    ----------
+    n : integer
+    d : integer
+    sampling : {"iid", "sobol", "halton", "stratified"}
+        "sobol" and "halton" are scrambled low discrepancy sequences.
+        "stratified" divides the unit cube into k**d cells with the largest
+        k**d <= n and draws one point uniformly in every cell. The remaining
+        n - k**d points are drawn independently. The points are shuffled, so
+        that every block of them covers the whole cube (see
+        dorr.generate_nss_map).
+
+    Returns
+    -------
+    unit : np.array with shape n x d
+
+    """
+    if sampling == "iid":
+        return np.random.random((n, d))
+    elif sampling == "stratified":
+        k = int(np.floor(n ** (1 / d) + 1e-9))
+        cells = np.indices((k,) * d).reshape((d, -1)).transpose()
+        unit = np.concatenate(((cells + np.random.random(cells.shape)) / k,
+                               np.random.random((n - len(cells), d))), axis=0)
+        return unit[np.random.permutation(n)]
+    seed = np.random.randint(2**31)
+    if sampling == "sobol":
+        # the first n points of the next power of two avoid the warning
+        # about the balance properties of the Sobol sequence
+        sampler = scipy.stats.qmc.Sobol(d, scramble=True, seed=seed)
+        return sampler.random_base2(int(np.ceil(np.log2(max(n, 1)))))[:n]
+    elif sampling == "halton":
+        sampler = scipy.stats.qmc.Halton(d, scramble=True, seed=seed)
+    else:
+        raise ValueError("sampling {sampling} is not supported.".format(
+            sampling=sampling))
+    return sampler.random(n)
+
+def population_order(population, method, sampling):
+    """
+    Returns the spatial order of the population if generate_norm_sample
+    needs it for method and sampling, otherwise None.
+
+    """
+    if population is None or method != "xy-population" or sampling == "iid":
+        return None
+    return spatial_order(population)
+
+def spatial_order(gaze_data, n_bins=16):
+    """
+    Returns the indices of gaze_data ordered by spatial bins.
+
+    The range of x and y is divided into n_bins x n_bins bins, which are
+    traversed column by column in alternating direction, so that consecutive
+    bins are neighbours on the screen.
+
+    Parameters
+    ----------
+    gaze_data : np.array with shape nx2 or nx3
+    n_bins : integer
+        number of bins in x and y (at most 16)
+
+    Returns
+    -------
+    order : np.array of integers
+
+    """
+    bins = list()
+    for column in (0, 1):
+        values = gaze_data[:, column]
+        low, high = np.min(values), np.max(values)
+        width = (high - low) / n_bins if high > low else 1.0
+        bins.append(np.clip(((values - low) / width).astype(int), 0,
+                            n_bins - 1))
+    bin_x, bin_y = bins
+    bin_y = np.where(bin_x % 2 == 0, bin_y, n_bins - 1 - bin_y)
+    # small integer keys are sorted in linear time (radix sort)
+    keys = (bin_x * n_bins + bin_y).astype(np.uint8)
+    return np.argsort(keys, kind="stable")
+
+def grid_axes(t, dt, method="xy-grid", n="120X72", screen_res=(1600, 1200)):
+    """
+    Returns the axes of the lattice used in grid normalization.
+
+    The lattice is shifted by a random offset in x and y. The norm sample of
+    the grid methods contains all points of the lattice, ordered by time,
+    then x and then y.
+
+    Parameters
+    ----------
+    t : float
+        point in time
+    dt : float
+        width of time window
+    method : {"xy-grid", "xyt-grid"}
+    n : string {"n_xXn_y", "n_xXn_yXn_time"}
+        number of lattice points in each direction
+    screen_res : tuple
+        (x_res, y_res) the horizontal and vertical resolution of the screen
+
+    Returns
+    -------
+    (xs, ys, ts) : (np.array, np.array, np.array)
+        ts only contains t for "xy-grid".
+
+    """
+    n_x, n_y, ts = grid_times(t, dt, method, n)
+    offset_x = np.random.uniform(0.0, screen_res[0]/n_x)
+    offset_y = np.random.uniform(0.0, screen_res[1]/n_y)
+    xs = np.linspace(0, screen_res[0], n_x) + offset_x
+    ys = np.linspace(0, screen_res[1], n_y) + offset_y
+    return (xs, ys, ts)
+
+def grid_times(t, dt, method="xy-grid", n="120X72"):
+    """
+    Returns the size of the lattice in x and y and the time axis of the
+    lattice (see grid_axes).
+
+    Returns
+    -------
+    (n_x, n_y, ts) : (integer, integer, np.array)
+
+    """
+    if method == "xyt-grid":
+        try:
+             n_x, n_y, n_time = [int(nn) for nn in n.split("X")]
+        except ValueError:
+            raise ValueError("method xyt-grid assumes n='n_xXn_yXn_time', e. g. '120X72X10' as a string literal")
+        ts = np.linspace(t - dt/2., t + dt/2., n_time)
+    elif method == "xy-grid":
+        try:
+             n_x, n_y = [int(nn) for nn in n.split("X")]
+        except ValueError:
+            raise ValueError("method xy-grid assumes n='n_xXn_y', e. g. '120X72' as a string literal")
+        ts = np.array([t], dtype=float)
+    else:
+        raise ValueError("{method} is not a grid method.".format(method=method))
+    return (n_x, n_y, ts)
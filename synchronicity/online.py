@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+# online.py
+
+"""
+Calculating the coherence values while the gaze data arrives.
+
+OnlineNSS receives the gaze samples of every subject as they arrive (e. g.
+from the eye tracker during the experiment) and keeps only the recent samples
+of every subject in a WindowBuffer. The nss values are calculated at the
+points in time t_start, t_start + step, ... as soon as all samples that
+influence them have arrived. Past values are never recomputed, therefore the
+work per point in time depends only on the size of the time window.
+
+ReplaySource feeds recorded gaze data in the order of time, optionally at
+real-time speed, and can be used to test a setup without an eye tracker::
+
+    online_nss = OnlineNSS(len(subjects), dt, stds, dt_max, n_reference,
+                           "xy-grid", "32X18", screen_res=(1280, 720))
+    for t, nss_values, quality_values in online_nss.stream(
+            ReplaySource(subjects)):
+        print(t, np.nanmean(nss_values))
+
+"""
+
+from __future__ import division
+from __future__ import absolute_import
+
+import time
+
+import numpy as np
+
+from . import nss
+
+
+class WindowBuffer(object):
+    """
+    Recent gaze samples (x, y, t) of one subject.
+
+    New samples are appended at the end, old samples are dropped at the
+    front. The live samples are always one contiguous block of the internal
+    array, so that the data property is a view. When the end of the array is
+    reached the live samples are moved to the front (or into an array of
+    twice the size), which costs amortized O(1) per sample.
+
+    Parameters
+    ----------
+    capacity : integer
+        initial number of samples
+
+    """
+
+    def __init__(self, capacity=1024):
+        self._data = np.empty((capacity, 3), dtype=np.float64)
+        self._head = 0
+        self._tail = 0
+
+    def __len__(self):
+        return self._tail - self._head
+
+    @property
+    def data(self):
+        """
+        View of the live samples sorted along time.
+
+        """
+        return self._data[self._head:self._tail]
+
+    @property
+    def latest(self):
+        """
+        Time of the newest sample or -inf if the buffer is empty.
+
+        """
+        if self._tail == self._head:
+            return -np.inf
+        return self._data[self._tail - 1, 2]
+
+    def append(self, samples):
+        """
+        Appends samples (np.array with shape kx3 or 3), which have to be newer
+        than all samples in the buffer.
+
+        """
+        samples = np.asarray(samples, dtype=np.float64).reshape((-1, 3))
+        n_samples = len(samples)
+        if self._tail + n_samples > len(self._data):
+            n_live = len(self)
+            capacity = len(self._data)
+            while n_live + n_samples > capacity // 2:
+                capacity *= 2
+            if capacity != len(self._data):
+                data = np.empty((capacity, 3), dtype=np.float64)
+            else:
+                data = self._data
+            data[:n_live] = self._data[self._head:self._tail]
+            self._data = data
+            self._head, self._tail = 0, n_live
+        self._data[self._tail:self._tail + n_samples] = samples
+        self._tail += n_samples
+
+    def drop_before(self, t):
+        """
+        Drops all samples older than t.
+
+        """
+        self._head += np.searchsorted(self.data[:, 2], t, side="left")
+
+
+class OnlineNSS(object):
+    """
+    Incremental nss values for live gaze data.
+
+    Parameters
+    ----------
+    n_subjects : integer
+        number of subjects
+    t_start : float
+        first point in time of the nss values
+    step : float
+        distance between the points in time of the nss values
+    latency : *None* or float
+        if None a point in time t is evaluated after a sample later than
+        t + max(dt/2, dt_max) arrived from every subject, which gives the
+        same values as nss.nss_series. Otherwise t is evaluated at the
+        latest when a sample later than t + max(dt/2, dt_max) + latency
+        arrived from any subject, so that a subject without samples (e. g.
+        lost tracking) delays the values by at most latency.
+
+    See nss.nss for the other parameters. The default method "xy-grid" needs
+    no population and the default engine "grid" rasterizes the fixation maps
+    on one lattice per point in time (see nss.nss_grid). Like "shared" it
+    normalizes at t and not at the time of the sample of each subject
+    closest to t; use engine "loop" for the latter and for the random
+    methods.
+
+    """
+
+    def __init__(self, n_subjects, dt, stds, dt_max, n_reference,
+                 method="xy-grid", n_norm="32X18", population=None,
+                 screen_res=(1600, 1200), engine="grid", cutoff=None,
+                 t_start=0.0, step=40000.0, latency=None):
+        self.buffers = [WindowBuffer() for _ in range(n_subjects)]
+        self.dt = dt
+        self.stds = stds
+        self.dt_max = dt_max
+        self.n_reference = n_reference
+        self.method = method
+        self.n_norm = n_norm
+        if population is not None:
+            population = nss.remove_invalid(population)
+        self.population = population
+        self.screen_res = screen_res
+        self.engine = engine
+        self.cutoff = cutoff
+        self.t_next = t_start
+        self.step = step
+        self.latency = latency
+        # samples later than t + horizon do not influence the value at t
+        self.horizon = max(dt / 2, dt_max)
+
+    def push(self, subject, samples):
+        """
+        Adds new samples of subject and returns the newly available values.
+
+        Parameters
+        ----------
+        subject : integer
+            index of the subject
+        samples : np.array with shape kx3 or 3
+            samples (x, y, t) newer than all previous samples of subject
+
+        Returns
+        -------
+        values : list of tuples
+            (t, nss_values, quality_values) for every point in time, which
+            became available (see nss.nss_series)
+
+        """
+        self.buffers[subject].append(samples)
+        values = list()
+        while self.is_ready(self.t_next):
+            values.append(self.evaluate(self.t_next))
+        return values
+
+    def is_ready(self, t):
+        """
+        True if all samples that influence the value at t arrived.
+
+        """
+        latest = [buffer.latest for buffer in self.buffers]
+        if min(latest) > t + self.horizon:
+            return True
+        if self.latency is not None:
+            return max(latest) > t + self.horizon + self.latency
+        return False
+
+    def evaluate(self, t):
+        """
+        Calculates the nss values at t, which has to be the next point in
+        time, and drops the samples no longer needed.
+
+        """
+        points_subject = list()
+        slices = list()
+        for buffer in self.buffers:
+            if len(buffer) == 0:
+                points_subject.append(None)
+                slices.append(buffer.data)
+                continue
+            point_subject, slice_ = nss.slice_subjects(
+                [buffer.data], t, self.dt, self.dt_max, time_sorted=True)
+            points_subject.extend(point_subject)
+            slices.extend(slice_)
+        nss_values, quality_values = nss.nss_slices(
+            points_subject, slices, t, self.dt, self.stds, self.n_reference,
+            self.method, self.n_norm, self.population, self.screen_res,
+            engine=self.engine, cutoff=self.cutoff)
+        self.t_next = t + self.step
+        for buffer in self.buffers:
+            buffer.drop_before(self.t_next - self.horizon)
+        return (t, nss_values, quality_values)
+
+    def flush(self, t_stop=None):
+        """
+        Returns the values of all remaining points in time up to t_stop
+        without waiting for further samples.
+
+        Parameters
+        ----------
+        t_stop : *None* or float
+            last point in time. None uses the time of the newest sample.
+
+        """
+        if t_stop is None:
+            t_stop = max(buffer.latest for buffer in self.buffers)
+        values = list()
+        while self.t_next <= t_stop:
+            values.append(self.evaluate(self.t_next))
+        return values
+
+    def stream(self, source, t_stop=None):
+        """
+        Yields the values while the samples of source arrive.
+
+        Parameters
+        ----------
+        source : iterable
+            yields (subject, samples) tuples (see ReplaySource)
+        t_stop : *None* or float
+            after source is exhausted the remaining values up to t_stop are
+            yielded (see flush).
+
+        """
+        for subject, samples in source:
+            for value in self.push(subject, samples):
+                yield value
+        for value in self.flush(t_stop):
+            yield value
+
+
+class ReplaySource(object):
+    """
+    Replays recorded gaze data of several subjects in the order of time.
+
+    Parameters
+    ----------
+    subjects : sequence of np.arrays
+        for every subject one np.array with columns x, y, t
+    speed : *None* or float
+        1.0 replays in real time (t in microseconds), 2.0 twice as fast.
+        None replays without waiting.
+
+    Yields
+    ------
+    (subject, sample) : (integer, np.array)
+        the index of the subject and one sample (x, y, t)
+
+    """
+
+    def __init__(self, subjects, speed=1.0):
+        self.subjects = subjects
+        self.speed = speed
+
+    def __iter__(self):
+        gaze_data = np.concatenate(self.subjects, axis=0)
+        owners = np.repeat(np.arange(len(self.subjects)),
+                           [len(subject) for subject in self.subjects])
+        order = np.argsort(gaze_data[:, 2], kind="mergesort")
+        if len(order) == 0:
+            return
+        t_first = gaze_data[order[0], 2]
+        start_time = time.time()
+        for idx in order:
+            if self.speed is not None:
+                wait = ((gaze_data[idx, 2] - t_first) / 1000000 / self.speed -
+                        (time.time() - start_time))
+                if wait > 0:
+                    time.sleep(wait)
+            yield (owners[idx], gaze_data[idx])
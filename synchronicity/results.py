@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+# results.py
+
+"""
+Append-only storage of the results of run_simulation.
+
+Every result (one point in time of one parameter combination) is a record
+with typed columns. The records are collected by a background thread and
+written in segments, i. e. npz files with one array per column, into the
+result folder. Segments are written atomically and never changed, therefore
+several jobs can write into the same folder and a killed job loses at most
+the records of the last flush interval.
+
+Every record has a key, which is the sha1 hash of the digest of the gaze
+data and all parameters (see result_key). A simulation with an existing
+result folder skips all records, which are already stored.
+
+"""
+
+from __future__ import division
+from __future__ import absolute_import
+
+import glob
+import hashlib
+import os
+import queue
+import threading
+import time
+import uuid
+
+import numpy as np
+
+# scalar columns of a record and their dtype
+COLUMNS = (("key", np.str_), ("gaze_file", np.str_), ("t", np.float64),
+           ("dt", np.float64), ("n_reference", np.int64),
+           ("method", np.str_), ("n_norm", np.str_), ("sigma_x", np.float64),
+           ("sigma_y", np.float64), ("sigma_t", np.float64),
+           ("dt_max", np.float64), ("dt_max_velocity", np.float64),
+           ("total_time", np.float64))
+
+
+def dataset_digest(subjects, population=None):
+    """
+    Returns the sha1 hash of the gaze data of all subjects and the
+    population.
+
+    """
+    hasher = hashlib.sha1()
+    for gaze_data in list(subjects) + [population]:
+        if gaze_data is None:
+            hasher.update(b"None")
+            continue
+        gaze_data = np.ascontiguousarray(gaze_data, dtype=np.float64)
+        hasher.update(str(gaze_data.shape).encode("ascii"))
+        hasher.update(gaze_data.tobytes())
+    return hasher.hexdigest()
+
+
+def result_key(digest, *parameters):
+    """
+    Returns the key of a record from the dataset digest and all parameters,
+    which influence the result.
+
+    """
+    return hashlib.sha1(repr((digest,) + parameters).encode("utf-8")).hexdigest()
+
+
+class ResultStore(object):
+    """
+    Result folder of one or several simulations.
+
+    Parameters
+    ----------
+    folder : string
+        folder is created if it does not exist
+    flush_every : integer
+        a segment is written when this many records are waiting
+    flush_interval : float
+        a segment is written at the latest after this many seconds
+
+    """
+
+    def __init__(self, folder, flush_every=100, flush_interval=30.0):
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        self.folder = folder
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.keys = set()
+        for segment in self.segments():
+            with np.load(segment, allow_pickle=False) as data:
+                self.keys.update(data["key"].tolist())
+        self._queue = queue.Queue()
+        self._error = None
+        self._writer = threading.Thread(target=self._write_loop)
+        self._writer.daemon = True
+        self._writer.start()
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    def segments(self):
+        """
+        Returns the file names of all segments.
+
+        """
+        return sorted(glob.glob(os.path.join(self.folder, "segment_*.npz")))
+
+    def add(self, record):
+        """
+        Adds a record (dict with all COLUMNS, "nss_values",
+        "quality_values" and optionally "n_used") to the store. The record is
+        written later by the background thread.
+
+        """
+        if self._error is not None:
+            raise self._error
+        self.keys.add(record["key"])
+        self._queue.put(record)
+
+    def flush(self):
+        """
+        Writes all waiting records and returns afterwards.
+
+        """
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        """
+        Writes all waiting records and stops the background thread.
+
+        """
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        if self._error is not None:
+            raise self._error
+
+    def records(self):
+        """
+        Returns all stored records as dict of columns.
+
+        nss_values, quality_values and n_used are arrays with one row per
+        record. n_used is -1 for the records without n_used.
+
+        """
+        columns = dict((name, list()) for name, _ in COLUMNS)
+        columns["nss_values"] = list()
+        columns["quality_values"] = list()
+        columns["n_used"] = list()
+        for segment in self.segments():
+            with np.load(segment, allow_pickle=False) as data:
+                for name in columns:
+                    if name == "n_used" and name not in data:
+                        # segments written before n_used was stored
+                        columns[name].append(np.full(
+                            data["quality_values"].shape, -1, dtype=np.int64))
+                        continue
+                    columns[name].append(data[name])
+        for name, dtype in COLUMNS:
+            columns[name] = np.concatenate(columns[name] or
+                                           [np.empty(0, dtype=dtype)])
+        for name in ("nss_values", "quality_values", "n_used"):
+            if len(set(values.shape[1] for values in columns[name])) > 1:
+                raise ValueError("records with different numbers of subjects")
+            columns[name] = np.concatenate(columns[name] or
+                                           [np.empty((0, 0))])
+        return columns
+
+    def _write_loop(self):
+        """
+        Collects the records and writes segments (background thread).
+
+        """
+        pending = list()
+        last_write = time.time()
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.time() - last_write))
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+            if isinstance(item, dict):
+                pending.append(item)
+                if len(pending) < self.flush_every:
+                    continue
+            if pending:
+                try:
+                    self._write_segment(pending)
+                except Exception as error:
+                    self._error = error
+                pending = list()
+            last_write = time.time()
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                return
+
+    def _write_segment(self, records):
+        """
+        Writes records atomically into a new segment.
+
+        """
+        data = dict()
+        for name, dtype in COLUMNS:
+            data[name] = np.array([record[name] for record in records],
+                                  dtype=dtype)
+        data["nss_values"] = np.array([record["nss_values"] for record in
+                                       records], dtype=np.float64)
+        data["quality_values"] = np.array([record["quality_values"] for
+                                           record in records], dtype=np.int64)
+        data["n_used"] = np.array([np.full(len(record["quality_values"]), -1)
+                                   if record.get("n_used") is None else
+                                   record["n_used"] for record in records],
+                                  dtype=np.int64)
+        name = "segment_%s_%s" % (time.strftime("%Y%m%d_%H%M%S"),
+                                  uuid.uuid4().hex)
+        tmp_file = os.path.join(self.folder, "." + name + ".tmp.npz")
+        np.savez(tmp_file, **data)
+        os.replace(tmp_file, os.path.join(self.folder, name + ".npz"))
@@ -5,20 +5,30 @@
 """
 Compile cython files.
 
+The fixation map kernel is compiled with OpenMP. Set the environment variable
+SYNCHRONICITY_OPENMP=0 to compile without OpenMP (e. g. with compilers that do
+not support it); the kernel then runs on one core.
+
 """
 
+import os
+
 from distutils.core import setup
 from distutils.extension import Extension
 from Cython.Distutils import build_ext
-import numpy as np
+
+if os.environ.get("SYNCHRONICITY_OPENMP", "1") == "1":
+    openmp_args = ["-fopenmp"]
+else:
+    openmp_args = []
 
 ext_modules = [Extension("dorr_c",
                          ["dorr_c.pyx"],
-                         include_dirs=[np.get_include()])]
+                         extra_compile_args=["-O3"] + openmp_args,
+                         extra_link_args=openmp_args)]
 
 setup(
   name = 'fast fixation map',
   cmdclass = {'build_ext': build_ext},
   ext_modules = ext_modules
 )
-
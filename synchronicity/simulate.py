@@ -13,41 +13,77 @@ A simulation which calculates coherence values for different parameter sets.
 from __future__ import division
 from __future__ import absolute_import
 
+import concurrent.futures
 import os
 import pickle
 import time
 
 import numpy as np
-from scipy import stats
 
+from . import cache
 from . import nss
 from . import helper
+from . import results
+from . import store as subject_store
 
-def init_simulation(pickle_file, folder, video, format="smi"):
+def init_simulation(pickle_file, folder, video, format="smi",
+                    out_format="pickle", metadata=None, n_jobs=1,
+                    cache_dir=None):
     """
     Construct all constant stuff and pickle it.
 
     Parameters
     ----------
     pickle_file: string
-        pickle file storing the gaze data
+        pickle file storing the gaze data or folder for the columnar format
     folder : string
         folder with the eye tracking raw data
     video : string
         video string used in smi message (msg)
     format : {"smi", "coord"}
         defines how the video should be parsed
+    out_format : {"pickle", "columns"}
+        "columns" stores the gaze data column wise with memory mapped columns
+        (see store.save_columns), which run_simulation opens without reading
+        the whole data.
+    metadata : *None* or dict
+        additional metadata for the columnar format, e. g. the screen
+        resolution. The video name, the input format and the sampling rate
+        are added automatically.
+    n_jobs : integer
+        number of processes parsing the raw data files concurrently
+    cache_dir : *None* or string
+        if not None the parsed raw data files are cached in cache_dir and
+        only parsed again if they change (see cache.py). Use the same
+        cache_dir for all videos of a folder.
 
     """
     if format == "smi":
         files = [folder + "/" + x for x in os.listdir(folder)]
-        subjects = helper.parse_smi(files)
+        if cache_dir is None:
+            subjects = helper.parse_smi(files, n_jobs=n_jobs)
+        else:
+            subjects = cache.parse_smi(files, cache_dir, n_jobs=n_jobs)
         gaze_data = helper.extract_video_data(subjects, video)
     elif format == "coord":
         files = [folder + "/" + f for f in os.listdir(folder)]
-        gaze_data = helper.parse_coord(files)
+        if cache_dir is None:
+            gaze_data = helper.parse_coord(files, n_jobs=n_jobs)
+        else:
+            gaze_data = cache.parse_coord(files, cache_dir, n_jobs=n_jobs)
 
     print("n_subjects: %i" % len(gaze_data))
+    if out_format == "columns":
+        sample_time = np.median(np.concatenate(
+            [np.diff(np.sort(gaze[:, 2])) for gaze in gaze_data]))
+        meta = dict(video=video, format=format,
+                    sampling_rate=1000000 / sample_time)
+        if metadata is not None:
+            meta.update(metadata)
+        subject_store.save_columns(pickle_file, gaze_data, meta)
+        return
+    elif out_format != "pickle":
+        raise ValueError("unknown out_format %s" % out_format)
     population = np.concatenate(gaze_data, axis=0)
     with open(pickle_file, "wb") as pfile:
         obj = (gaze_data, population)
@@ -56,19 +92,26 @@ def init_simulation(pickle_file, folder, video, format="smi"):
 
 def run_simulation(pickle_file, data_file, ts, dts, n_refs, methods, n_norms,
                    setup=((1280, 720), (50, 50, 1/60/2*1000000),
-                          1/60*1.1*1000000), dt_max_velocity=None, method_velocity="clip"):
+                          1/60*1.1*1000000), dt_max_velocity=None,
+                   method_velocity="clip", n_jobs=1, chunk_size=None,
+                   seed=None, engine="loop", result_folder=None,
+                   sampling="iid", norm_tol=None):
     """
     Unpickle init values and run simulation.
 
     Parameters
     ----------
     pickle_file: string
-        pickle file storing the gaze data
-    data_file : string
-        data file to store the results
+        pickle file storing the gaze data or folder in the columnar format.
+        Of the columnar format only the time range around ts is loaded and
+        the population only if a method needs it.
+    data_file : *None* or string
+        tab separated text file the results are appended to. None writes no
+        text file (use result_folder).
     ts : sequence of floats
         points in time where the coherence value should be
-        evaluated.
+        evaluated. For every parameter combination the whole time axis is
+        streamed with nss.nss_series.
     dts : sequence of floats
         width of time windows
     n_refs : sequence of integers
@@ -84,70 +127,428 @@ def run_simulation(pickle_file, data_file, ts, dts, n_refs, methods, n_norms,
         sets the maximal time difference that is included into the velocity
         array. When dt_max_velocity is None locations are used.
     method_velocity : {"clip", "heavyside", "gamma"}
+    n_jobs : integer
+        number of worker processes. If n_jobs is not 1 the parameter grid is
+        split into tasks of chunk_size consecutive points in time, which are
+        distributed dynamically over a process pool. None uses all cores.
+        The gaze data is put once into shared memory (see store.SubjectStore)
+        and all workers read it without a copy. The results are written in
+        the same order as with n_jobs=1.
+    chunk_size : *None* or integer
+        number of points in time per task. None gives about four tasks per
+        worker and parameter combination.
+    seed : *None* or integer
+        if not None the random state is seeded for every task with seed plus
+        the index of the task in the whole parameter grid. For a given
+        chunk_size the results are then independent of n_jobs and of
+        resuming a simulation from result_folder. If None every worker
+        process starts with a fresh random state.
+    engine : string
+        engine of nss.nss_series, e. g. "sliding" for the grid methods with
+        overlapping time windows.
+    result_folder : *None* or string
+        if not None every result is also stored in result_folder (see
+        results.ResultStore). Results already stored there for the same
+        gaze data and parameters are skipped, so that a killed simulation
+        continues where it stopped. Use export_results to convert the folder
+        into the text format.
+    sampling : {"iid", "sobol", "halton", "stratified"}
+        how the random norm samples are drawn (see
+        nss.generate_norm_sample).
+    norm_tol : *None* or float
+        if not None the norm samples are used only until the standard error
+        of the nss value is below norm_tol (see nss.nss). The number of used
+        norm samples of every subject is written into the columns n_used%i
+        next to the columns qf%i.
 
     """
     screen_res, stds, dt_max = setup
     SIGMA_X, SIGMA_Y, SIGMA_T = stds
 
     print("load parameters...")
-    with open(pickle_file, "rb") as pfile:
-        subjects, population = pickle.load(pfile)
+    if dt_max_velocity is None:
+        margin = max(max(dts) / 2, dt_max)
+        t_range = (min(ts) - margin, max(ts) + margin)
+        load_population = any(method in ("xy-population", "xy-estimation")
+                              for method in methods)
+    else:
+        # velocities and their population need the whole recording
+        t_range = None
+        load_population = True
+    subjects, population = load_simulation(pickle_file, t_range,
+                                           load_population)
     n_subjects = len(subjects)
     print("screen_res: %i, %i" % screen_res)
     print("standard deviations: %f, %f, %f" % stds)
     print("dt_max: %f" % dt_max)
     print("n_subjects: %i" % n_subjects)
-    velocity = False
-    if dt_max_velocity is not None:
-        velocity = True
-        print("\ncalculate velocities...")
-        velocity_subjects = list()
-        for gaze_data in subjects:
-            velocity_subjects.append(helper.velocity(gaze_data,
-                                                     dt_max_velocity))
-        velocity_population = np.concatenate(velocity_subjects, axis=0)
-        print("WARNING: cannot use given population; " +
-              "recreated population out of subjects.")
-        subjects = velocity_subjects
-        population = velocity_population
-        if method_velocity == "heavyside":
-            subjects = [subject[subject[:, 0] >= stds[0], :] for subject in subjects]
-            population = population[population[:, 0] >= stds[0], :]
-        print("...done")
+    subjects, population, velocity = prepare_subjects(subjects, population,
+                                                      stds, dt_max_velocity,
+                                                      method_velocity)
+    if n_jobs is None:
+        n_jobs = os.cpu_count()
+    if chunk_size is None:
+        chunk_size = max(1, int(np.ceil(len(ts) / (4 * n_jobs))))
+    if result_folder is not None:
+        result_store = results.ResultStore(result_folder)
+        digest = results.dataset_digest(subjects, population)
+    # results without norm_tol keep the keys of older result folders
+    key_tol = () if norm_tol is None else (norm_tol,)
+    def key(t, dt, n_reference, method, n_norm):
+        return results.result_key(digest, t, dt, n_reference, method,
+                                  str(n_norm), stds, dt_max, dt_max_velocity,
+                                  method_velocity, screen_res, engine, seed,
+                                  sampling, *key_tol)
+    # the index of a task (and its seed) is its position in the whole
+    # parameter grid, so that a resumed simulation draws the same random
+    # numbers. Chunks with some stored results are calculated again, but
+    # only the new results are written.
+    tasks = list()
+    stored = set()
+    n_chunks = 0
+    for dt in dts:
+        for n_reference in n_refs:
+            for method in methods:
+                for n_norm in n_norms:
+                    for start in range(0, len(ts), chunk_size):
+                        ts_chunk = ts[start:start+chunk_size]
+                        n_chunks += 1
+                        if result_folder is not None:
+                            keys = set(key(t, dt, n_reference, method, n_norm)
+                                       for t in ts_chunk)
+                            keys = set(k for k in keys if k in result_store)
+                            stored.update(keys)
+                            if len(keys) == len(ts_chunk):
+                                continue
+                        tasks.append((n_chunks - 1, ts_chunk, dt,
+                                      n_reference, method, n_norm))
+    n_skipped = len(stored)
+    if n_skipped:
+        print("skip %i results already stored in %s" % (n_skipped,
+                                                        result_folder))
+    parameters = dict(stds=stds, dt_max=dt_max, screen_res=screen_res,
+                      velocity=velocity, method_velocity=method_velocity,
+                      seed=seed, engine=engine, sampling=sampling,
+                      norm_tol=norm_tol)
     print("\nstart simulation...")
-    with open(data_file, "a") as dfile:
-        quality_header = "qf%i\t"*n_subjects % tuple(range(n_subjects))
-        nss_header = "nss%i\t"*n_subjects % tuple(range(n_subjects))
-        dfile.write("gaze_file\tt\tnss_mean\tnss_nanmean\tn_nan\tn_subjects\tn_reference\tmethod\tdt\tn_norm\tSIGMA_X\tSIGMA_Y\tSIGMA_T\tdt_max\tdt_max_velocity\t%s%stotal_time\n" % (quality_header, nss_header))
-        for t in ts:
-          for dt in dts:
+    dfile = None
+    shared_store = None
+    executor = None
+    try:
+        dfile = open(os.devnull if data_file is None else data_file, "a")
+        dfile.write(format_header(n_subjects, norm_tol is not None))
+        if n_jobs == 1:
+            _init_worker(subjects, population, parameters)
+            # the rows are written as soon as they are calculated
+            rows_tasks = map(_iter_task, tasks)
+        else:
+            # sorted subjects stay views in the workers (nss_series sorts)
+            shared_store = subject_store.SubjectStore.create(
+                [helper.sort_time(subject) for subject in subjects],
+                population)
+            executor = concurrent.futures.ProcessPoolExecutor(
+                n_jobs, initializer=_attach_worker,
+                initargs=(shared_store.descriptor(), parameters))
+            rows_tasks = executor.map(_run_task, tasks)
+        for task, rows in zip(tasks, rows_tasks):
+            _, _, dt, n_reference, method, n_norm = task
+            for t, nss_values, quality_values, n_used, total_time in rows:
+                if (result_folder is not None and
+                        key(t, dt, n_reference, method, n_norm) in stored):
+                    continue
+                print("t/dt/n_reference/method/n_norm")
+                print("%f/%f/%i/%s/%s" % (t, dt, n_reference, method,
+                                          str(n_norm)))
+                print("time needed in sec: %f and in min: %i" %
+                      (total_time, int(total_time/60)))
+                result = format_result(pickle_file, t, dt, n_reference,
+                                       method, n_norm, stds, dt_max,
+                                       dt_max_velocity, nss_values,
+                                       quality_values, total_time, n_used)
+                print(result)
+                dfile.write(result)
+                if result_folder is not None:
+                    result_store.add(dict(
+                        key=key(t, dt, n_reference, method, n_norm),
+                        gaze_file=pickle_file, t=t, dt=dt,
+                        n_reference=n_reference, method=method,
+                        n_norm=str(n_norm), sigma_x=SIGMA_X,
+                        sigma_y=SIGMA_Y, sigma_t=SIGMA_T, dt_max=dt_max,
+                        dt_max_velocity=(np.nan if dt_max_velocity is None
+                                         else dt_max_velocity),
+                        total_time=total_time, nss_values=nss_values,
+                        quality_values=quality_values, n_used=n_used))
+            dfile.flush()
+    finally:
+        if dfile is not None:
+            dfile.close()
+        if result_folder is not None:
+            result_store.close()
+        if n_jobs == 1:
+            _init_worker(None, None, None)
+        if executor is not None:
+            # on errors the queued tasks are cancelled instead of awaited
+            executor.shutdown(cancel_futures=True)
+        if shared_store is not None:
+            shared_store.close()
+            shared_store.unlink()
+
+
+def run_convergence(pickle_file, data_file, ts, dts, n_refs, methods,
+                    n_norms, n_repetitions=50, n_pool=None,
+                    setup=((1280, 720), (50, 50, 1/60/2*1000000),
+                           1/60*1.1*1000000), seed=None, sampling="iid"):
+    """
+    Unpickle init values and simulate the dependency of the nss values on
+    the size of the norm sample (see nss.nss_convergence).
+
+    The data file contains n_repetitions lines for every n_norm in the same
+    format as run_simulation, therefore
+
+        run_convergence(..., n_norms=(100, 1000, 10000), n_repetitions=50)
+
+    replaces run_simulation(..., n_norms=(100, 1000, 10000)*50), but
+    evaluates the fixation maps only once per point in time. total_time is
+    the time needed for one point in time divided by the number of lines.
+
+    Parameters
+    ----------
+    n_norms : sequence of integers
+        sizes of the norm sample
+    n_repetitions : integer
+        number of lines for every n_norm
+    n_pool : *None* or integer
+        number of norm samples the fixation maps are evaluated on.
+    seed : *None* or integer
+        if not None the random state is seeded once before the simulation.
+
+    See run_simulation for the other parameters.
+
+    """
+    screen_res, stds, dt_max = setup
+    margin = max(max(dts) / 2, dt_max)
+    subjects, population = load_simulation(
+        pickle_file, (min(ts) - margin, max(ts) + margin))
+    n_subjects = len(subjects)
+    subjects = [helper.sort_time(subject) for subject in subjects]
+    if seed is not None:
+        np.random.seed(seed)
+    print("\nstart convergence simulation...")
+    with open(os.devnull if data_file is None else data_file, "a") as dfile:
+        dfile.write(format_header(n_subjects))
+        for dt in dts:
             for n_reference in n_refs:
-              for method in methods:
-                for n_norm in n_norms:
-                    print("t/dt/n_reference/method/n_norm")
-                    print("%f/%f/%i/%s/%s" % (t, dt, n_reference, method,
-                                              str(n_norm)))
-                    start_time = time.time()
-                    nss_values, quality_values  = nss.nss(subjects, t, dt,
-                                         stds, dt_max,
-                                         n_reference, method, n_norm,
-                                         population, screen_res,
-                                         velocity, method_velocity)
-                    end_time = time.time()
-                    total_time = end_time - start_time
-                    print("time needed in sec: %f and in min: %i" %
-                          (total_time, int(total_time/60)))
-                    quality = "%i\t"*n_subjects % tuple(quality_values)
-                    nss_subjects = "%e\t"*n_subjects % tuple(nss_values)
-                    result = "%s\t%e\t%e\t%e\t%i\t%i\t%i\t%s\t%e\t%s\t%f\t%f\t%f\t%i\t%s\t%s%s%f\n" %\
-                                (pickle_file, t, np.mean(nss_values),
-                                stats.nanmean(nss_values),
-                                np.sum(np.isnan(nss_values)), n_subjects,
-                                n_reference, method, dt, str(n_norm), SIGMA_X, SIGMA_Y,
-                                SIGMA_T, dt_max, str(dt_max_velocity), quality,
-                                nss_subjects, total_time)
-                    print(result)
-                    dfile.write(result)
+                for method in methods:
+                    for t in ts:
+                        start_time = time.time()
+                        nss_values = nss.nss_convergence(
+                            subjects, t, dt, stds, dt_max, n_reference,
+                            n_norms, n_repetitions, method, n_pool,
+                            population, screen_res, time_sorted=True,
+                            sampling=sampling)
+                        points_subject, slices = nss.slice_subjects(
+                            subjects, t, dt, dt_max, time_sorted=True)
+                        quality_values = [len(slice_) for slice_ in slices]
+                        total_time = ((time.time() - start_time) /
+                                      (len(n_norms) * n_repetitions))
+                        print("t/dt/n_reference/method: %f/%f/%i/%s" %
+                              (t, dt, n_reference, method))
+                        for n_norm in n_norms:
+                            for values in nss_values[n_norm]:
+                                dfile.write(format_result(
+                                    pickle_file, t, dt, n_reference, method,
+                                    n_norm, stds, dt_max, None, values,
+                                    quality_values, total_time))
+                        dfile.flush()
+
+
+def export_results(result_folder, data_file):
+    """
+    Writes all results of result_folder into the tab separated text format
+    of run_simulation (e. g. for scripts/analysis.R).
+
+    The rows are sorted by gaze file, dt, n_reference, method, n_norm and t.
+    The columns n_used%i are written if any record has them (-1 for the
+    records without norm_tol).
+
+    """
+    result_store = results.ResultStore(result_folder)
+    result_store.close()
+    records = result_store.records()
+    order = np.lexsort((records["t"], records["n_norm"], records["method"],
+                        records["n_reference"], records["dt"],
+                        records["gaze_file"]))
+    with_n_used = np.any(records["n_used"] >= 0)
+    with open(data_file, "w") as dfile:
+        dfile.write(format_header(records["nss_values"].shape[1],
+                                  with_n_used))
+        for i in order:
+            dt_max_velocity = records["dt_max_velocity"][i]
+            dfile.write(format_result(
+                records["gaze_file"][i], records["t"][i], records["dt"][i],
+                records["n_reference"][i], records["method"][i],
+                records["n_norm"][i], (records["sigma_x"][i],
+                                       records["sigma_y"][i],
+                                       records["sigma_t"][i]),
+                records["dt_max"][i],
+                None if np.isnan(dt_max_velocity) else dt_max_velocity,
+                records["nss_values"][i], records["quality_values"][i],
+                records["total_time"][i],
+                records["n_used"][i] if with_n_used else None))
+
+
+def load_simulation(pickle_file, t_range=None, population=True):
+    """
+    Returns (subjects, population) stored by init_simulation.
+
+    Parameters
+    ----------
+    pickle_file : string
+        pickle file or folder in the columnar format
+    t_range : *None* or tuple
+        (t_start, t_stop) restricts the subjects of the columnar format to
+        this time range (plus the closest sample outside of it).
+    population : bool
+        if False the population of the columnar format is not loaded and
+        None is returned instead.
+
+    """
+    if os.path.isdir(pickle_file):
+        columns = subject_store.ColumnStore(pickle_file)
+        if t_range is None:
+            t_range = (None, None)
+        subjects = columns.subjects(*t_range)
+        return (subjects, columns.population() if population else None)
+    with open(pickle_file, "rb") as pfile:
+        subjects, population = pickle.load(pfile)
+    return (subjects, population)
+
+
+def prepare_subjects(subjects, population, stds, dt_max_velocity=None,
+                     method_velocity="clip"):
+    """
+    Converts the subjects to velocities if dt_max_velocity is not None.
+
+    Returns
+    -------
+    (subjects, population, velocity) : (list, np.array, bool)
+
+    """
+    if dt_max_velocity is None:
+        return (subjects, population, False)
+    print("\ncalculate velocities...")
+    values, offsets = helper.velocities(subjects, dt_max_velocity)
+    print("WARNING: cannot use given population; " +
+          "recreated population out of subjects.")
+    if method_velocity == "heavyside":
+        keep = values[:, 0] >= stds[0]
+        offsets = np.concatenate(([0], np.cumsum(keep)))[offsets]
+        values = values[keep]
+    # the population is the concatenation of all subjects
+    subjects = helper.split_ragged(values, offsets)
+    population = values
+    print("...done")
+    return (subjects, population, True)
+
+
+def format_header(n_subjects, n_used=False):
+    """
+    Returns the header line of the data file of run_simulation. If n_used is
+    True the columns n_used%i follow the columns qf%i.
+
+    """
+    quality_header = "qf%i\t"*n_subjects % tuple(range(n_subjects))
+    if n_used:
+        quality_header += "n_used%i\t"*n_subjects % tuple(range(n_subjects))
+    nss_header = "nss%i\t"*n_subjects % tuple(range(n_subjects))
+    return ("gaze_file\tt\tnss_mean\tnss_nanmean\tn_nan\tn_subjects\tn_reference\tmethod\tdt\tn_norm\tSIGMA_X\tSIGMA_Y\tSIGMA_T\tdt_max\tdt_max_velocity\t%s%stotal_time\n" % (quality_header, nss_header))
+
+
+def format_result(pickle_file, t, dt, n_reference, method, n_norm, stds,
+                  dt_max, dt_max_velocity, nss_values, quality_values,
+                  total_time, n_used=None):
+    """
+    Returns one line of the data file of run_simulation. n_used is written
+    after quality_values if it is not None.
+
+    """
+    SIGMA_X, SIGMA_Y, SIGMA_T = stds
+    n_subjects = len(nss_values)
+    quality = "%i\t"*n_subjects % tuple(quality_values)
+    if n_used is not None:
+        quality += "%i\t"*n_subjects % tuple(n_used)
+    nss_subjects = "%e\t"*n_subjects % tuple(nss_values)
+    return ("%s\t%e\t%e\t%e\t%i\t%i\t%i\t%s\t%e\t%s\t%f\t%f\t%f\t%i\t%s\t%s%s%f\n" %
+            (pickle_file, t, np.mean(nss_values),
+             np.nanmean(nss_values),
+             np.sum(np.isnan(nss_values)), n_subjects,
+             n_reference, method, dt, str(n_norm), SIGMA_X, SIGMA_Y,
+             SIGMA_T, dt_max, str(dt_max_velocity), quality,
+             nss_subjects, total_time))
+
+
+# state of a worker process of run_simulation
+_WORKER = dict()
+
+def _init_worker(subjects, population, parameters):
+    """
+    Stores the (prepared) gaze data in the worker process.
+
+    """
+    _WORKER["subjects"] = subjects
+    _WORKER["population"] = population
+    _WORKER["parameters"] = parameters
+
+
+def _attach_worker(descriptor, parameters):
+    """
+    Attaches the worker process to the gaze data in shared memory.
+
+    """
+    # forked workers inherit the random state of the parent process; tasks
+    # without seed would draw the same norm samples in every worker
+    np.random.seed()
+    store = subject_store.SubjectStore.attach(descriptor)
+    _WORKER["store"] = store
+    _init_worker(store.subjects, store.population, parameters)
+
+
+def _run_task(task):
+    """
+    Calculates the nss values for one chunk of points in time.
+
+    Returns
+    -------
+    rows : list of tuples
+        (t, nss_values, quality_values, n_used, total_time) for every t.
+        n_used is None if norm_tol is None.
+
+    """
+    return list(_iter_task(task))
+
+
+def _iter_task(task):
+    """
+    Yields the rows of _run_task one after the other.
+
+    """
+    idx, ts, dt, n_reference, method, n_norm = task
+    parameters = _WORKER["parameters"]
+    if parameters["seed"] is not None:
+        np.random.seed((parameters["seed"] + idx) % 2**32)
+    start_time = time.time()
+    for values in nss.nss_series(
+            _WORKER["subjects"], ts, dt, parameters["stds"],
+            parameters["dt_max"], n_reference, method, n_norm,
+            _WORKER["population"], parameters["screen_res"],
+            parameters["velocity"], parameters["method_velocity"],
+            parameters["engine"], norm_tol=parameters["norm_tol"],
+            sampling=parameters["sampling"]):
+        if parameters["norm_tol"] is None:
+            values += (None,)
+        total_time = time.time() - start_time
+        yield values + (total_time,)
+        start_time = time.time()
 
 
 if __name__ == "__main__":
@@ -162,5 +563,13 @@ if __name__ == "__main__":
 #                   n_refs=(19,),
 #                   methods=("xy-population",),
 #                   n_norms=(100, 1000, 10000, 100000)*50)
+#    run_convergence("sim_para_bbt_21.pickle",
+#                    "data_convergence_%s.txt" % time.strftime("%Y%m%d_%H%M%S"),
+#                    ts=(5*60*1000000,),
+#                    dts=(67000,),
+#                    n_refs=(19,),
+#                    methods=("xy-population",),
+#                    n_norms=(100, 1000, 10000, 100000),
+#                    n_repetitions=50)
 
 
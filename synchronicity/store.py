@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+# store.py
+
+"""
+Storage of the gaze data of all subjects in one contiguous block.
+
+The rows of all subjects are stored one after the other in one (N, 3) array.
+The offsets give the first row of every subject, therefore every subject and
+the population (all subjects concatenated) are views into the same block and
+no data is copied. The block can live in shared memory, so that several
+worker processes can use the same gaze data without unpickling their own
+copy.
+
+On disk the gaze data can be stored column wise in a folder (see
+save_columns and ColumnStore)::
+
+    meta.json     format version, dtype, number of subjects and metadata
+    offsets.npy   first row of every subject and the number of rows
+    x.npy         x coordinates of all subjects, every subject sorted along t
+    y.npy         y coordinates
+    t.npy         time stamps
+
+The columns are opened as memory maps, therefore opening the folder is
+independent of the size of the data and only the rows of the requested time
+ranges are read from disk.
+
+"""
+
+from __future__ import division
+from __future__ import absolute_import
+
+import json
+import os
+
+import numpy as np
+
+from . import helper
+
+FORMAT_VERSION = 1
+COLUMNS = ("x", "y", "t")
+
+
+class SubjectStore(object):
+    """
+    Gaze data of all subjects in one contiguous (N, 3) array.
+
+    Use SubjectStore.create to copy the subjects into a new store and
+    SubjectStore.attach to open a store in shared memory, which was created
+    in another process.
+
+    Parameters
+    ----------
+    data : np.array with shape Nx3
+        rows of all subjects (and optionally of the population)
+    offsets : sequence of integers
+        first row of every subject and the end of the last subject, i. e.
+        n_subjects + 1 values.
+    population_rows : *None* or tuple
+        (start, stop) rows of the population in data. None means the
+        population consists of all subjects.
+    shared_memory : *None* or multiprocessing.shared_memory.SharedMemory
+        shared memory backing data
+
+    """
+
+    def __init__(self, data, offsets, population_rows=None,
+                 shared_memory=None):
+        self.data = data
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        if population_rows is None:
+            population_rows = (0, int(self.offsets[-1]))
+        self.population_rows = tuple(int(row) for row in population_rows)
+        self.shared_memory = shared_memory
+
+    @classmethod
+    def create(cls, subjects, population=None, shared=True):
+        """
+        Copies subjects (and population) into a new store.
+
+        Parameters
+        ----------
+        subjects : sequence of np.arrays
+            for every subject one np.array with columns x, y, t
+        population : *None* or np.array
+            if population is not the concatenation of all subjects it is
+            stored after the subjects.
+        shared : bool
+            if True the store is allocated in shared memory
+
+        """
+        lengths = [len(subject) for subject in subjects]
+        offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+        n_rows = int(offsets[-1])
+        population_rows = None
+        if population is not None and not _is_concatenation(population,
+                                                            subjects):
+            population_rows = (n_rows, n_rows + len(population))
+            n_rows += len(population)
+        if shared:
+            from multiprocessing import shared_memory
+            shm = shared_memory.SharedMemory(create=True,
+                                             size=max(1, n_rows * 3 * 8))
+            data = np.ndarray((n_rows, 3), dtype=np.float64, buffer=shm.buf)
+        else:
+            shm = None
+            data = np.empty((n_rows, 3), dtype=np.float64)
+        for subject, start, stop in zip(subjects, offsets[:-1], offsets[1:]):
+            data[start:stop] = subject
+        if population_rows is not None:
+            data[population_rows[0]:population_rows[1]] = population
+        return cls(data, offsets, population_rows, shm)
+
+    @classmethod
+    def attach(cls, descriptor):
+        """
+        Opens the store in shared memory described by descriptor.
+
+        Parameters
+        ----------
+        descriptor : tuple
+            returned by the method descriptor of the store.
+
+        """
+        from multiprocessing import shared_memory
+        name, n_rows, offsets, population_rows = descriptor
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # before python 3.13 attaching registers the block again at the
+            # resource tracker, which worker processes share with the
+            # creating process; unlink removes the registration
+            shm = shared_memory.SharedMemory(name=name)
+        data = np.ndarray((n_rows, 3), dtype=np.float64, buffer=shm.buf)
+        return cls(data, offsets, population_rows, shm)
+
+    def descriptor(self):
+        """
+        Returns a small picklable description of a store in shared memory.
+
+        """
+        if self.shared_memory is None:
+            raise ValueError("store is not in shared memory")
+        return (self.shared_memory.name, len(self.data), list(self.offsets),
+                self.population_rows)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        return self.data[self.offsets[idx]:self.offsets[idx + 1]]
+
+    @property
+    def subjects(self):
+        """
+        List of views into the store, one for every subject.
+
+        """
+        return [self[idx] for idx in range(len(self))]
+
+    @property
+    def population(self):
+        """
+        View of the population.
+
+        """
+        return self.data[self.population_rows[0]:self.population_rows[1]]
+
+    def close(self):
+        """
+        Releases the store. All views into the store become invalid.
+
+        """
+        self.data = None
+        if self.shared_memory is not None:
+            self.shared_memory.close()
+
+    def unlink(self):
+        """
+        Removes the shared memory block. Call it once in the process that
+        created the store.
+
+        """
+        if self.shared_memory is not None:
+            self.shared_memory.unlink()
+
+
+def _is_concatenation(population, subjects):
+    """
+    True if population equals all subjects concatenated.
+
+    """
+    if len(population) != sum(len(subject) for subject in subjects):
+        return False
+    start = 0
+    for subject in subjects:
+        stop = start + len(subject)
+        if not np.array_equal(population[start:stop], subject,
+                              equal_nan=True):
+            return False
+        start = stop
+    return True
+
+
+def save_columns(folder, subjects, metadata=None, dtype=np.float64):
+    """
+    Saves the subjects in the columnar format into folder.
+
+    Parameters
+    ----------
+    folder : string
+        folder is created if it does not exist
+    subjects : sequence of np.arrays
+        for every subject one np.array with columns x, y, t
+    metadata : *None* or dict
+        json serializable metadata, e. g. video name, screen resolution and
+        sampling rate
+    dtype : {np.float64, np.float32}
+        dtype of the x and y columns. The time stamps are always stored with
+        np.float64 as microseconds do not fit into np.float32.
+
+    """
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    subjects = [helper.sort_time(np.asarray(subject)) for subject in subjects]
+    lengths = [len(subject) for subject in subjects]
+    offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+    np.save(os.path.join(folder, "offsets.npy"), offsets)
+    for column, name in enumerate(COLUMNS):
+        column_dtype = np.float64 if name == "t" else dtype
+        values = np.empty(offsets[-1], dtype=column_dtype)
+        for subject, start, stop in zip(subjects, offsets[:-1], offsets[1:]):
+            values[start:stop] = subject[:, column]
+        np.save(os.path.join(folder, name + ".npy"), values)
+    meta = dict(version=FORMAT_VERSION, n_subjects=len(subjects),
+                dtype=np.dtype(dtype).name, columns=list(COLUMNS),
+                metadata=dict() if metadata is None else metadata)
+    with open(os.path.join(folder, "meta.json"), "w") as mfile:
+        json.dump(meta, mfile, indent=2, sort_keys=True)
+
+
+class ColumnStore(object):
+    """
+    Gaze data of all subjects stored by save_columns in folder.
+
+    The columns are memory mapped and only read if subjects or the population
+    are requested.
+
+    Parameters
+    ----------
+    folder : string
+        folder written by save_columns
+
+    """
+
+    def __init__(self, folder):
+        with open(os.path.join(folder, "meta.json")) as mfile:
+            meta = json.load(mfile)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError("unsupported format version %s in %s" %
+                             (meta.get("version"), folder))
+        self.folder = folder
+        self.metadata = meta["metadata"]
+        self.offsets = np.load(os.path.join(folder, "offsets.npy"))
+        self.columns = [np.load(os.path.join(folder, name + ".npy"),
+                                mmap_mode="r") for name in COLUMNS]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def rows(self, idx, t_start=None, t_stop=None):
+        """
+        Returns (start, stop) rows of subject idx between t_start and t_stop.
+
+        One sample before t_start and one after t_stop are included, so that
+        the sample closest to any t in the range is part of the rows.
+
+        """
+        start, stop = int(self.offsets[idx]), int(self.offsets[idx + 1])
+        times = self.columns[2][start:stop]
+        first, last = 0, stop - start
+        if t_start is not None:
+            first = max(0, np.searchsorted(times, t_start, side="left") - 1)
+        if t_stop is not None:
+            last = min(stop - start,
+                       np.searchsorted(times, t_stop, side="right") + 1)
+        return (start + first, start + max(first, last))
+
+    def read(self, start, stop):
+        """
+        Returns the rows start to stop as np.array with columns x, y, t.
+
+        """
+        data = np.empty((stop - start, 3), dtype=np.float64)
+        for column, values in enumerate(self.columns):
+            data[:, column] = values[start:stop]
+        return data
+
+    def subject(self, idx, t_start=None, t_stop=None):
+        """
+        Returns the gaze data of subject idx between t_start and t_stop (see
+        rows).
+
+        """
+        return self.read(*self.rows(idx, t_start, t_stop))
+
+    def subjects(self, t_start=None, t_stop=None):
+        """
+        Returns the gaze data of all subjects between t_start and t_stop.
+
+        """
+        return [self.subject(idx, t_start, t_stop) for idx in range(len(self))]
+
+    def population(self):
+        """
+        Returns the gaze data of all subjects concatenated.
+
+        """
+        return self.read(0, int(self.offsets[-1]))
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# test_cache.py
+
+"""
+Test if the parse cache hits for unchanged files and misses for changed ones.
+
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from .. import cache
+from .. import helper
+from .test_helper import write_smi
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.folder, "cache")
+        self.files = [os.path.join(self.folder, "vp%i.txt" % i)
+                      for i in range(3)]
+        for i, f in enumerate(self.files):
+            write_smi(f, seed=i)
+        self.parsed = list()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def parser(self, file_name):
+        self.parsed.append(file_name)
+        return helper._parse_smi_file(file_name)
+
+    def assert_subjects_equal(self, subjects, expected):
+        self.assertEqual(len(subjects), len(expected))
+        for subject, expected_subject in zip(subjects, expected):
+            self.assertEqual(subject["file_name"],
+                             expected_subject["file_name"])
+            np.testing.assert_array_equal(subject["data"],
+                                          expected_subject["data"])
+            self.assertEqual(subject["msg"], expected_subject["msg"])
+
+    def test_hit(self):
+        expected = helper.parse_smi(self.files)
+        self.assert_subjects_equal(
+            cache.parse_smi(self.files, self.cache_dir), expected)
+        self.assert_subjects_equal(
+            cache.parse_smi(self.files, self.cache_dir), expected)
+        cache.cached_parse(self.files, self.parser, self.cache_dir, "smi")
+        self.assertEqual(self.parsed, [])
+
+    def test_changed_file(self):
+        cache.cached_parse(self.files, self.parser, self.cache_dir, "smi")
+        self.assertEqual(self.parsed, self.files)
+        self.parsed = list()
+        write_smi(self.files[1], n_samples=60)
+        subjects = cache.cached_parse(self.files, self.parser,
+                                      self.cache_dir, "smi")
+        self.assertEqual(self.parsed, [self.files[1]])
+        self.assertEqual(len(subjects[1]["data"]), 60)
+
+    def test_content_hash(self):
+        cache.cached_parse(self.files, self.parser, self.cache_dir, "smi",
+                           content_hash=True)
+        self.parsed = list()
+        # same content, new modification time
+        stat = os.stat(self.files[0])
+        os.utime(self.files[0], ns=(stat.st_atime_ns,
+                                    stat.st_mtime_ns + 10**9))
+        cache.cached_parse(self.files, self.parser, self.cache_dir, "smi",
+                           content_hash=True)
+        self.assertEqual(self.parsed, [])
+        cache.cached_parse(self.files, self.parser, self.cache_dir, "smi")
+        self.assertEqual(self.parsed, [self.files[0]])
+
+    def test_coord(self):
+        coord_file = os.path.join(self.folder, "vp.coord")
+        with open(coord_file, "w") as cfile:
+            cfile.write("header\n1000 2\n")
+            cfile.write("0 10.5 20.5 1\n4000 11.0 21.0 0\n8000 12 22 1\n")
+        expected = helper.parse_coord([coord_file])
+        for _ in range(2):
+            subjects = cache.parse_coord([coord_file], self.cache_dir)
+            np.testing.assert_array_equal(subjects[0], expected[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,6 +11,7 @@ import unittest
 
 import numpy as np
 
+from .. import backends
 from .. import dorr
 
 class TestFixMap(unittest.TestCase):
@@ -44,6 +45,285 @@ class TestFixMap(unittest.TestCase):
         for vec in vecs:
             self.assertAlmostEqual(self.fix_map(vec), self.dorr_fix_map(vec))
 
+    def test_vectorized(self):
+        nn = 7
+        vecs = np.random.random((nn, 3)) * 10
+        expected = [self.dorr_fix_map(vec) for vec in vecs]
+        for fix_map in (self.fix_map, self.dorr_fix_map):
+            saliencies = fix_map(vecs)
+            self.assertEqual(saliencies.shape, (nn,))
+            for saliency, expected_saliency in zip(saliencies, expected):
+                self.assertAlmostEqual(saliency, expected_saliency)
+
+    def test_vectorized_chunks(self):
+        vec_i_js = np.random.random((50, 3)) * 10
+        vecs = np.random.random((30, 3)) * 10
+        sums = dorr.gaussian_sum(vecs, vec_i_js, self.stds, max_elements=120)
+        expected = dorr.gaussian_sum(vecs, vec_i_js, self.stds)
+        for value, expected_value in zip(sums, expected):
+            self.assertAlmostEqual(value, expected_value)
+
+    @unittest.skipIf(backends.load("cython") is None,
+                     "dorr_c is not compiled")
+    def test_cython_parallel(self):
+        fix_map_batch = backends.load("cython")["fixation_sum"]
+        vec_i_js = np.random.random((40, 3)) * 10
+        vecs = np.random.random((300, 3)) * 10
+        parallel = fix_map_batch(vecs, vec_i_js, self.stds)
+        serial = fix_map_batch(vecs, vec_i_js, self.stds, parallel=False)
+        expected = dorr.gaussian_sum(vecs, vec_i_js, self.stds)
+        for value, serial_value, expected_value in zip(parallel, serial,
+                                                       expected):
+            self.assertEqual(value, serial_value)
+            self.assertAlmostEqual(value, expected_value)
+
+    def test_truncated(self):
+        vec_i_js = np.random.random((200, 3)) * 40
+        vecs = np.random.random((50, 3)) * 40
+        expected = dorr.gaussian_sum(vecs, vec_i_js, self.stds)
+        for cutoff in (2.0, 4.0, 100.0):
+            fix_map = dorr.generate_fixation_map_truncated(vec_i_js, self.stds,
+                                                           cutoff)
+            saliencies = fix_map(vecs)
+            self.assertTrue(np.all(saliencies <= expected + 1e-12))
+            self.assertTrue(np.all(expected - saliencies <=
+                                   fix_map.max_error + 1e-12))
+            self.assertAlmostEqual(fix_map(vecs[3]), saliencies[3])
+        for saliency, expected_saliency in zip(saliencies, expected):
+            self.assertAlmostEqual(saliency, expected_saliency)
+        vecs[0, 1] = np.nan
+        self.assertTrue(np.isnan(fix_map(vecs)[0]))
+
+    def test_rasterize(self):
+        vec_i_js = np.random.random((20, 3)) * 10
+        xs, ys, ts = np.linspace(0, 10, 4), np.linspace(0, 10, 3), (4.0, 6.0)
+        raster = dorr.rasterize_fixation_map(vec_i_js, self.stds, xs, ys, ts)
+        for a, x in enumerate(xs):
+            for b, y in enumerate(ys):
+                for c, t in enumerate(ts):
+                    self.assertAlmostEqual(raster[a, b, c], dorr.gaussian_sum(
+                        [(x, y, t)], vec_i_js, self.stds)[0])
+
+    def test_moments(self):
+        vec_i_js = np.random.random((6, 3)) * 10
+        mean_xy, std_xy = (4.0, 6.0), (3.0, 5.0)
+        # Gauss-Hermite quadrature over the normal distribution
+        nodes, node_weights = np.polynomial.hermite_e.hermegauss(60)
+        node_weights /= np.sum(node_weights)
+        xx, yy = np.meshgrid(mean_xy[0] + std_xy[0] * nodes,
+                             mean_xy[1] + std_xy[1] * nodes, indexing="ij")
+        ww = np.outer(node_weights, node_weights).ravel()
+        for t in (2.0, 5.0):
+            vecs = np.array((xx.ravel(), yy.ravel(),
+                             np.repeat(t, xx.size))).transpose()
+            saliencies = dorr.gaussian_sum(vecs, vec_i_js, self.stds)
+            mean = np.sum(ww * saliencies)
+            variance = np.sum(ww * saliencies ** 2) - mean ** 2
+            means, variances = dorr.fixation_map_moments(
+                vec_i_js, self.stds, t, mean_xy, std_xy, max_elements=10)
+            self.assertAlmostEqual(means[0], mean)
+            self.assertAlmostEqual(variances[0], variance)
+
+    def test_nss_map_vectorized(self):
+        norm_sample = np.random.random((100, 3)) * 10
+        nss_map = dorr.generate_nss_map(self.fix_map, norm_sample)
+        vecs = np.random.random((5, 3)) * 10
+        saliencies = nss_map(vecs)
+        for vec, saliency in zip(vecs, saliencies):
+            self.assertAlmostEqual(saliency, nss_map(vec))
+
+    def test_merge_moments(self):
+        values = np.random.standard_gamma(2.0, 1000)
+        moments = (0, 0.0, 0.0, 0.0, 0.0)
+        for start in range(0, len(values), 300):
+            moments = dorr.merge_moments(moments, values[start:start + 300])
+        deviations = values - np.mean(values)
+        np.testing.assert_allclose(moments, (len(values), np.mean(values),
+                                             np.sum(deviations ** 2),
+                                             np.sum(deviations ** 3),
+                                             np.sum(deviations ** 4)))
+
+    def test_nss_map_adaptive(self):
+        norm_sample = np.random.random((5000, 3)) * 10
+        vec = np.array((4.0, 5.0, 6.0))
+        nss_map = dorr.generate_nss_map(self.fix_map, norm_sample)
+        self.assertEqual(nss_map.n_used, 5000)
+        # without a tolerance all blocks are used
+        exhaustive = dorr.generate_nss_map(self.fix_map, norm_sample, 0.0,
+                                           block_size=700, vec=vec)
+        self.assertEqual(exhaustive.n_used, 5000)
+        self.assertAlmostEqual(exhaustive(vec), nss_map(vec))
+        adaptive = dorr.generate_nss_map(self.fix_map, norm_sample, 0.1,
+                                         block_size=100, vec=vec)
+        self.assertLess(adaptive.n_used, 5000)
+        self.assertEqual(adaptive.n_used % 100, 0)
+        self.assertAlmostEqual(adaptive(vec), nss_map(vec), delta=0.5)
+
+
+class TestVelocityMap(unittest.TestCase):
+
+    def setUp(self):
+        random_state = np.random.RandomState(2)
+        self.stds = (10.0, 0.5, 20000.0)
+        self.vec_i_js = np.array((random_state.uniform(0, 60, 40),
+                                  random_state.uniform(-np.pi, np.pi, 40),
+                                  random_state.uniform(0, 100000, 40))).T
+        self.vecs = np.array((random_state.uniform(0, 60, 30),
+                              random_state.uniform(-np.pi, np.pi, 30),
+                              random_state.uniform(0, 100000, 30))).T
+
+    def test_kernel_matrix_equal_to_scalar(self):
+        for method in ("gamma", "heavyside"):
+            kernel = dorr.kernel_velocity_matrix(self.vecs, self.vec_i_js,
+                                                 self.stds, method)
+            for k, vec in enumerate(self.vecs):
+                for l, vec_i_j in enumerate(self.vec_i_js):
+                    self.assertEqual(kernel[k, l], dorr.kernel_velocity(
+                        vec, vec_i_j, self.stds, method))
+
+    def test_velocity_map_equal_to_scalar(self):
+        for method in ("gamma", "heavyside"):
+            velocity_map = dorr.generate_velocity_map(self.vec_i_js,
+                                                      self.stds, method)
+            saliencies = velocity_map(self.vecs)
+            chunked = dorr.velocity_sum(self.vecs, self.vec_i_js, self.stds,
+                                        method, max_elements=100)
+            for vec, saliency, saliency_chunked in zip(self.vecs, saliencies,
+                                                       chunked):
+                expected = np.sum([dorr.kernel_velocity(vec, vec_i_j,
+                                                        self.stds, method)
+                                   for vec_i_j in self.vec_i_js])
+                self.assertEqual(saliency, expected)
+                self.assertEqual(saliency_chunked, saliency)
+                self.assertEqual(velocity_map(vec), saliency)
+
+    def test_clip_index_equal_to_clip(self):
+        random_state = np.random.RandomState(4)
+        vec_i_js = np.array((random_state.uniform(0, 30, 500),
+                             random_state.uniform(-np.pi, np.pi, 500),
+                             random_state.uniform(0, 100000, 500).round(-3))).T
+        vecs = np.array((random_state.uniform(0, 30, 400),
+                         random_state.uniform(-np.pi, np.pi, 400),
+                         random_state.uniform(0, 100000, 400).round(-3))).T
+        # borders of the windows, wraparound and invalid values
+        vecs[:20, 1] = vec_i_js[:20, 1] + 0.5
+        vecs[20:40, 2] = vec_i_js[20:40, 2] + 20000
+        vecs[40:45, 1] = (np.pi, -np.pi, 3.1, -3.1, 0.0)
+        vecs[45, :] = (np.nan, 1.0, 5000)
+        vecs[46, :] = (20, np.nan, 5000)
+        vecs[47, :] = (20, 1.0, np.nan)
+        vecs[48, :] = (20, 4.0, 5000)
+        vec_i_js[:5, 1] = (np.pi, -np.pi, np.nan, 4.0, -3.1)
+        vec_i_js[5, 2] = np.nan
+        vec_i_js[6, 0] = np.nan
+        for stds in ((10.0, 0.5, 20000.0), (10.0, 0.01, 1000.0),
+                     (10.0, 3.5, 20000.0), (0.0, 0.3, 0.0)):
+            velocity_map = dorr.generate_velocity_map(vec_i_js, stds, "clip")
+            counts = velocity_map(vecs)
+            for vec, count in zip(vecs, counts):
+                self.assertEqual(count, dorr.velocity_map_clip(vec, vec_i_js,
+                                                               stds))
+            self.assertEqual(velocity_map(vecs[0]), counts[0])
+
+
+class TestBackends(unittest.TestCase):
+    """
+    Every available backend has to yield the results of the numpy backend.
+
+    """
+
+    def setUp(self):
+        random_state = np.random.RandomState(3)
+        self.vec_i_js = random_state.uniform(0, 60, (40, 3))
+        self.vecs = random_state.uniform(0, 60, (25, 3))
+        self.stds = (5.0, 8.0, 10.0)
+        self.velocity_vec_i_js = np.array((
+            random_state.uniform(0, 60, 40),
+            random_state.uniform(-np.pi, np.pi, 40),
+            random_state.uniform(0, 100000, 40))).T
+        self.velocity_vecs = np.array((
+            random_state.uniform(0, 60, 25),
+            random_state.uniform(-np.pi, np.pi, 25),
+            random_state.uniform(0, 100000, 25))).T
+        self.velocity_stds = (10.0, 0.5, 20000.0)
+
+    def tearDown(self):
+        backends.use(None)
+
+    def assert_kernels_equal(self, kernels):
+        if "fixation_sum" in kernels:
+            np.testing.assert_allclose(
+                kernels["fixation_sum"](self.vecs, self.vec_i_js, self.stds),
+                dorr.gaussian_sum(self.vecs, self.vec_i_js, self.stds),
+                rtol=1e-12)
+        if "velocity_sum" in kernels:
+            for method in ("gamma", "heavyside"):
+                np.testing.assert_allclose(
+                    kernels["velocity_sum"](self.velocity_vecs,
+                                            self.velocity_vec_i_js,
+                                            self.velocity_stds, method),
+                    dorr.velocity_sum(self.velocity_vecs,
+                                      self.velocity_vec_i_js,
+                                      self.velocity_stds, method),
+                    rtol=1e-10)
+
+    def test_available_backends(self):
+        self.assertIn("numpy", backends.available())
+        for name in backends.available():
+            self.assert_kernels_equal(backends.load(name))
+
+    def test_loops(self):
+        # the loops of the numba backend without compilation
+        self.assert_kernels_equal(dict(
+            fixation_sum=lambda vecs, vec_i_js, stds:
+            backends._fixation_sum_loops(*backends._normalize(
+                vecs, vec_i_js, stds)),
+            velocity_sum=lambda vecs, vec_i_js, stds, method:
+            backends._velocity_sum_loops(*backends._velocity_arguments(
+                vecs, vec_i_js, stds, method))))
+
+    def test_fixation_maps(self):
+        expected = dorr.generate_fixation_map(self.vec_i_js, self.stds)
+        for name in backends.PREFERENCE:
+            fix_map = dorr.generate_fixation_map_backend(self.vec_i_js,
+                                                         self.stds, name)
+            np.testing.assert_allclose(fix_map(self.vecs),
+                                       expected(self.vecs), rtol=1e-12)
+            self.assertAlmostEqual(fix_map(self.vecs[0]),
+                                   expected(self.vecs[0]))
+
+    def test_fallback(self):
+        backends.register("empty", lambda: dict())
+        backends.register("missing", self.raise_import_error)
+        try:
+            self.assertNotIn("missing", backends.available())
+            expected = backends.backend_of("fixation_sum")
+            for name in ("empty", "missing"):
+                self.assertEqual(backends.backend_of("fixation_sum", name),
+                                 expected)
+            # cython has no velocity kernel
+            self.assertNotEqual(backends.backend_of("velocity_sum", "cython"),
+                                "cython")
+            backends.use("numpy")
+            self.assertEqual(backends.backend_of("fixation_sum"), "numpy")
+            self.assertRaises(ValueError, backends.use, "magic")
+            self.assertRaises(ValueError, backends.kernel, "magic_sum")
+        finally:
+            for name in ("empty", "missing"):
+                backends._LOADERS.pop(name)
+                backends._LOADED.pop(name, None)
+
+    def raise_import_error(self):
+        raise ImportError("backend not installed")
+
+    def test_benchmark(self):
+        times = backends.benchmark(n_vecs=50, n_refs=20, repeat=1)
+        self.assertEqual(sorted(times), sorted(backends.KERNELS))
+        for kernel_name, kernel_times in times.items():
+            self.assertIn("numpy", kernel_times)
+            self.assertEqual(backends.backend_of(kernel_name),
+                             min(kernel_times, key=kernel_times.get))
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# test_helper.py
+
+"""
+Test the parsers and the video extraction in helper.
+
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from .. import helper
+from .. import simulate
+from .test_nss import generate_subjects
+
+
+SMI_HEADER = ("Time\tType\tTrial\tL POR X [px]\tL POR Y [px]\t" +
+              "R POR X [px]\tR POR Y [px]\n")
+
+
+def write_smi(file_name, n_samples=50, header=SMI_HEADER, seed=1):
+    """
+    Writes a SMI text export with n_samples and two videos and returns the
+    expected gaze data (x, y, t) and messages.
+
+    """
+    random_state = np.random.RandomState(seed)
+    data = list()
+    msg = list()
+    with open(file_name, "w") as smi_file:
+        smi_file.write("## [iView]\n## Sample Rate:\t500\n")
+        smi_file.write(header)
+        for i in range(n_samples):
+            t = 1000000 + 2000.0 * i
+            if i in (10, 30):
+                text = "# Message: %s" % ("duck" if i == 10 else "boat")
+                smi_file.write("%i\tMSG\t1\t%s\n" % (t - 1000, text))
+                msg.append((t - 1000, text + "\n"))
+            x, y = random_state.uniform(0, 1000, 2).round(2)
+            smi_file.write("%i\tSMP\t1\t%.2f\t%.2f\t0.00\t0.00\n" % (t, x, y))
+            data.append((x, y, t))
+    return (np.array(data), msg)
+
+
+class TestParseSMI(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_parse(self):
+        files = [os.path.join(self.folder, "vp%i.txt" % i) for i in range(3)]
+        expected = [write_smi(f, seed=i) for i, f in enumerate(files)]
+        for n_jobs in (1, 2):
+            subjects = helper.parse_smi(files, n_jobs=n_jobs)
+            for subject, f, (data, msg) in zip(subjects, files, expected):
+                self.assertEqual(subject["file_name"], f)
+                np.testing.assert_array_equal(subject["data"], data)
+                self.assertEqual(subject["msg"], msg)
+
+    def test_chunks(self):
+        f = os.path.join(self.folder, "vp.txt")
+        data, msg = write_smi(f, n_samples=200)
+        subject = helper._parse_smi_file(f, chunk_size=100)
+        np.testing.assert_array_equal(subject["data"], data)
+        self.assertEqual(subject["msg"], msg)
+
+    def test_extract_videos(self):
+        files = [os.path.join(self.folder, "vp%i.txt" % i) for i in range(2)]
+        for i, f in enumerate(files):
+            write_smi(f, seed=i)
+        subjects = helper.parse_smi(files)
+        # second repetition of duck
+        subjects[1]["msg"].append((1000000 + 2000.0 * 40 + 500,
+                                   "# Message: duck\n"))
+        videos = helper.extract_videos(subjects)
+        self.assertEqual(sorted(videos), ["boat", "duck"])
+        for video in ("boat", "duck"):
+            expected = list()
+            for subject in subjects:
+                msgs = subject["msg"]
+                for i, (start, text) in enumerate(msgs):
+                    if text.split(" ")[2].strip() != video:
+                        continue
+                    stop = msgs[i+1][0] if i + 1 < len(msgs) else np.inf
+                    data = subject["data"]
+                    tmp = data[(data[:, 2] > start) & (data[:, 2] < stop)]
+                    tmp[:, 2] -= start
+                    expected.append(tmp)
+            self.assertEqual(len(videos[video]), len(expected))
+            for gaze_data, expected_gaze_data in zip(videos[video], expected):
+                np.testing.assert_array_equal(gaze_data, expected_gaze_data)
+            for gaze_data, expected_gaze_data in zip(
+                    helper.extract_video_data(subjects, video), expected):
+                np.testing.assert_array_equal(gaze_data, expected_gaze_data)
+        self.assertEqual(len(videos["duck"]), 3)
+        views = helper.extract_videos(subjects, ["boat"], shift_time=False)
+        self.assertEqual(list(views), ["boat"])
+        self.assertTrue(np.shares_memory(views["boat"][0],
+                                         subjects[0]["data"]))
+
+    def test_wrong_header(self):
+        f = os.path.join(self.folder, "vp.txt")
+        write_smi(f, header=SMI_HEADER.replace("L POR X", "R POR X"))
+        self.assertRaises(IOError, helper.parse_smi, [f])
+        write_smi(f, header="")
+        self.assertRaises(IOError, helper.parse_smi, [f])
+
+
+class TestParseCoord(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write_coord(self, file_name, n_samples=100, seed=1):
+        random_state = np.random.RandomState(seed)
+        raw = np.empty((n_samples, 4))
+        raw[:, 0] = np.arange(n_samples) * 33333
+        raw[:, 1:3] = random_state.uniform(0, 1000, (n_samples, 2)).round(3)
+        raw[:, 3] = random_state.randint(0, 3, n_samples)
+        with open(file_name, "w") as coord_file:
+            coord_file.write("natural_movie 1280 720\n%i\n" % n_samples)
+            for row in raw:
+                coord_file.write("%i  %.3f\t%.3f %i\n" % tuple(row))
+        return raw
+
+    def test_parse(self):
+        files = [os.path.join(self.folder, "vp%i.coord" % i)
+                 for i in range(3)]
+        expected = list()
+        for i, f in enumerate(files):
+            raw = self.write_coord(f, seed=i)
+            expected.append(raw[raw[:, 3] != 0][:, (1, 2, 0)])
+        for n_jobs in (1, 2):
+            for subject, expected_subject in zip(
+                    helper.parse_coord(files, n_jobs=n_jobs), expected):
+                np.testing.assert_array_equal(subject, expected_subject)
+
+    def test_wrong_format(self):
+        f = os.path.join(self.folder, "vp.coord")
+        self.write_coord(f)
+        with open(f, "a") as coord_file:
+            coord_file.write("1 2 3\n")
+        self.assertRaises(IOError, helper.parse_coord, [f])
+
+
+def reference_velocity(gaze_data, dt_max, euclidean=False):
+    """
+    Velocity of one subject as calculated before helper.velocities.
+
+    """
+    sorted_gaze_data = gaze_data[np.argsort(gaze_data[:, 2])]
+    dt = sorted_gaze_data[1:, 2] - sorted_gaze_data[:-1, 2]
+    dx = sorted_gaze_data[1:, 0] - sorted_gaze_data[:-1, 0]
+    dy = sorted_gaze_data[1:, 1] - sorted_gaze_data[:-1, 1]
+    mask = (0 < dt) & (dt <= dt_max)
+    dt = dt[mask]
+    v_x = dx[mask] / dt
+    v_y = dy[mask] / dt
+    v_t = sorted_gaze_data[:-1, 2][mask] + dt / 2
+    if euclidean:
+        return np.array((v_x, v_y, v_t)).transpose()
+    v_r = np.sqrt(v_x ** 2 + v_y ** 2)
+    v_phi = np.empty_like(v_r)
+    v_phi[v_r != 0] = np.arctan2(v_y[v_r != 0], v_x[v_r != 0])
+    v_phi[v_r == 0] = np.NaN
+    return np.array((v_r, v_phi, v_t)).transpose()
+
+
+class TestVelocity(unittest.TestCase):
+
+    def setUp(self):
+        self.subjects = generate_subjects(n_subjects=5, n_samples=50)
+        # unsorted subject, gaps, standing still and an empty subject
+        self.subjects[0] = self.subjects[0][::-1]
+        self.subjects[2] = np.delete(self.subjects[2], (10, 11, 12), axis=0)
+        self.subjects[3][20:25, :2] = self.subjects[3][20, :2]
+        self.subjects[4] = self.subjects[4][:0]
+
+    def test_equal_to_reference(self):
+        for euclidean in (False, True):
+            values, offsets = helper.velocities(self.subjects, 30000,
+                                                euclidean)
+            self.assertEqual(len(offsets), len(self.subjects) + 1)
+            for subject, velocities in zip(self.subjects, helper.split_ragged(
+                    values, offsets)):
+                expected = reference_velocity(subject, 30000, euclidean)
+                np.testing.assert_array_equal(velocities, expected)
+                np.testing.assert_array_equal(
+                    helper.velocity(subject, 30000, euclidean), expected)
+
+    def test_prepare_subjects(self):
+        stds = (20.0, 0.5, 20000.0)
+        for method_velocity in ("clip", "heavyside"):
+            subjects, population, velocity = simulate.prepare_subjects(
+                self.subjects, None, stds, 30000, method_velocity)
+            self.assertTrue(velocity)
+            expected = [reference_velocity(subject, 30000) for subject in
+                        self.subjects]
+            if method_velocity == "heavyside":
+                expected = [subject[subject[:, 0] >= stds[0]] for subject in
+                            expected]
+            for subject, expected_subject in zip(subjects, expected):
+                np.testing.assert_array_equal(subject, expected_subject)
+                if len(subject) > 0:
+                    self.assertTrue(np.shares_memory(subject, population))
+            np.testing.assert_array_equal(population, np.concatenate(expected))
+
+if __name__ == '__main__':
+    unittest.main()
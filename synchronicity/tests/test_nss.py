@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# test_nss.py
+
+"""
+Test if the different engines in nss yield the same results.
+
+"""
+
+import unittest
+
+import numpy as np
+
+from .. import dorr
+from .. import helper
+from .. import nss
+
+
+def generate_subjects(n_subjects=6, n_samples=40, seed=1):
+    """
+    Random gaze data of n_subjects with n_samples each (x, y, t).
+
+    """
+    random_state = np.random.RandomState(seed)
+    subjects = list()
+    for i in range(n_subjects):
+        x = random_state.normal(640, 150, n_samples)
+        y = random_state.normal(360, 100, n_samples)
+        t = np.arange(n_samples) * 20000.0 + random_state.uniform(0, 5000)
+        subjects.append(np.array((x, y, t)).transpose())
+    # some invalid gaze data
+    subjects[1][3, 0] = np.nan
+    subjects[2][5:8, 1] = np.nan
+    return subjects
+
+
+class TestEngines(unittest.TestCase):
+
+    def setUp(self):
+        self.subjects = generate_subjects()
+        self.population = np.concatenate(self.subjects, axis=0)
+        self.stds = (50, 50, 20000)
+        self.dt_max = 15000
+
+    def run_engine(self, engine, method="xy-population", n_norm=200,
+                   n_reference=3, t=400000, dt=225000):
+        np.random.seed(3)
+        return nss.nss(self.subjects, t, dt, self.stds, self.dt_max,
+                       n_reference, method, n_norm, self.population,
+                       (1280, 720), engine=engine)
+
+    def assert_nss_equal(self, result, expected):
+        nss_values, quality_values = result
+        expected_nss_values, expected_quality_values = expected
+        self.assertEqual(list(quality_values), list(expected_quality_values))
+        self.assertEqual(len(nss_values), len(expected_nss_values))
+        for value, expected_value in zip(nss_values, expected_nss_values):
+            if np.isnan(expected_value):
+                self.assertTrue(np.isnan(value))
+            else:
+                self.assertAlmostEqual(value, expected_value)
+
+    def test_cutoff(self):
+        for engine in ("loop", "shared"):
+            np.random.seed(3)
+            expected = nss.nss(self.subjects, 400000, 225000, self.stds,
+                               self.dt_max, 3, "xy-population", 200,
+                               self.population, engine=engine)
+            np.random.seed(3)
+            truncated = nss.nss(self.subjects, 400000, 225000, self.stds,
+                                self.dt_max, 3, "xy-population", 200,
+                                self.population, engine=engine, cutoff=12.0)
+            self.assert_nss_equal(truncated, expected)
+
+    def test_shared_equal_to_explicit_maps(self):
+        t, dt, n_reference = 400000, 225000, 3
+        for method, n_norm in (("xy-population", 200), ("xy-grid", "12X8")):
+            shared = self.run_engine("shared", method, n_norm, n_reference,
+                                     t, dt)
+            np.random.seed(3)
+            norm_sample = nss.generate_norm_sample(
+                t, dt, method, nss.remove_invalid(self.population), n_norm,
+                (1280, 720))
+            points_subject, slices = nss.slice_subjects(self.subjects, t, dt,
+                                                        self.dt_max)
+            references = nss.reference_matrix(len(slices), n_reference)
+            for i, point_subject in enumerate(points_subject):
+                joint_slices = np.concatenate(
+                    [slices[j] for j in range(len(slices)) for _ in
+                     range(references[i, j])], axis=0)
+                fix_map = dorr.generate_fixation_map_cython(joint_slices,
+                                                            self.stds)
+                nss_map = dorr.generate_nss_map(fix_map, norm_sample)
+                self.assertAlmostEqual(shared[0][i], nss_map(point_subject))
+
+    def test_grid_equal_to_shared(self):
+        for method, n_norm in (("xy-grid", "12X8"), ("xyt-grid", "12X8X3")):
+            self.assert_nss_equal(self.run_engine("grid", method, n_norm),
+                                  self.run_engine("shared", method, n_norm))
+        self.assertRaises(ValueError, self.run_engine, "grid",
+                          "xy-population", 200)
+
+    def test_analytic_close_to_loop(self):
+        analytic = self.run_engine("analytic", "xy-estimation")
+        sampled = self.run_engine("loop", "xy-estimation", 100000)
+        np.testing.assert_allclose(analytic[0], sampled[0], atol=0.05)
+        self.assertRaises(ValueError, self.run_engine, "analytic",
+                          "xy-population")
+
+    def test_subject_out_of_range(self):
+        # at the end of the recording no subject is within dt_max
+        loop = self.run_engine("loop", t=40 * 20000 + 10000)
+        shared = self.run_engine("shared", t=40 * 20000 + 10000)
+        self.assert_nss_equal(shared, loop)
+
+    def test_unknown_engine(self):
+        self.assertRaises(ValueError, self.run_engine, "magic")
+
+    def test_norm_tol(self):
+        np.random.seed(3)
+        nss_values, quality_values, n_used = nss.nss(
+            self.subjects, 400000, 225000, self.stds, self.dt_max, 3,
+            "xy-population", 2000, self.population, (1280, 720),
+            norm_tol=0.2)
+        loop = self.run_engine("loop", n_norm=2000)
+        self.assertEqual(quality_values, loop[1])
+        np.testing.assert_allclose(nss_values, loop[0], atol=1.0)
+        self.assertTrue(all(0 < n <= 2000 for n in n_used))
+        self.assertTrue(any(n < 2000 for n in n_used))
+        self.assertRaises(ValueError, nss.nss, self.subjects, 400000, 225000,
+                          self.stds, self.dt_max, 3,
+                          population=self.population, engine="shared",
+                          norm_tol=0.2)
+        # the lattice of the grid methods is ordered along x, the blocks
+        # have to be random samples of it nevertheless
+        np.random.seed(3)
+        nss_values, quality_values, n_used = nss.nss(
+            self.subjects, 400000, 225000, self.stds, self.dt_max, 3,
+            "xy-grid", "120X72", screen_res=(1280, 720), norm_tol=0.3)
+        grid = self.run_engine("loop", "xy-grid", "120X72")
+        np.testing.assert_allclose(nss_values, grid[0], atol=0.5)
+        self.assertTrue(any(n < 120 * 72 for n in n_used))
+
+    def test_convergence_close_to_shared(self):
+        t, dt, n_reference = 400000, 225000, 3
+        shared = self.run_engine("shared", "xy-population", 2000,
+                                 n_reference, t, dt)
+        np.random.seed(3)
+        # resampling many points from the same pool recovers its moments
+        convergence = nss.nss_convergence(
+            self.subjects, t, dt, self.stds, self.dt_max, n_reference,
+            (20, 50000), 10, "xy-population", 2000, self.population,
+            (1280, 720))
+        self.assertEqual(sorted(convergence), [20, 50000])
+        self.assertEqual(convergence[20].shape, (10, len(self.subjects)))
+        np.testing.assert_allclose(
+            np.mean(convergence[50000], axis=0), shared[0], rtol=0.05)
+        # small norm samples scatter more
+        self.assertTrue(np.all(np.std(convergence[20], axis=0) >
+                               np.std(convergence[50000], axis=0)))
+        self.assertRaises(ValueError, nss.nss_convergence, self.subjects, t,
+                          dt, self.stds, self.dt_max, n_reference, (20,),
+                          method="xy-grid")
+
+
+class TestSeries(unittest.TestCase):
+
+    def setUp(self):
+        self.subjects = generate_subjects()
+        # shuffle one subject; nss_series has to sort it
+        self.subjects[0] = self.subjects[0][::-1]
+        self.population = np.concatenate(self.subjects, axis=0)
+        self.stds = (50, 50, 20000)
+
+    def test_series_equal_to_nss(self):
+        ts = np.arange(0, 45 * 20000, 30000)
+        np.random.seed(5)
+        series = list(nss.nss_series(self.subjects, ts, 60000, self.stds,
+                                     15000, 3, "xy-population", 100,
+                                     self.population, engine="loop"))
+        np.random.seed(5)
+        for t, (t_series, nss_values, quality_values) in zip(ts, series):
+            expected_nss_values, expected_quality_values = nss.nss(
+                self.subjects, t, 60000, self.stds, 15000, 3,
+                "xy-population", 100, self.population, engine="loop")
+            self.assertEqual(t, t_series)
+            self.assertEqual(quality_values, expected_quality_values)
+            np.testing.assert_allclose(nss_values, expected_nss_values)
+        self.assertEqual(len(series), len(ts))
+
+    def test_sliding_equal_to_rasters(self):
+        ts = np.arange(0, 45 * 20000, 30000)
+        for method, n_norm in (("xy-grid", "12X8"), ("xyt-grid", "12X8X3")):
+            np.random.seed(5)
+            series = list(nss.nss_series(self.subjects, ts, 60000, self.stds,
+                                         15000, 3, method, n_norm,
+                                         screen_res=(1280, 720),
+                                         engine="sliding"))
+            np.random.seed(5)
+            xs, ys, _ = nss.grid_axes(ts[0], 60000, method, n_norm,
+                                      (1280, 720))
+            subjects = [helper.sort_time(subject) for subject in self.subjects]
+            for t, (t_series, nss_values, quality_values) in zip(ts, series):
+                points_subject, slices = nss.slice_subjects(
+                    subjects, t, 60000, 15000, time_sorted=True)
+                _, _, ts_lattice = nss.grid_times(t, 60000, method, n_norm)
+                rasters = np.array([dorr.rasterize_fixation_map(
+                    slice_, self.stds, xs, ys, ts_lattice).ravel()
+                                    for slice_ in slices])
+                expected = nss.nss_rasters(points_subject, slices, self.stds,
+                                           3, rasters)
+                self.assertEqual(t, t_series)
+                self.assertEqual(quality_values,
+                                 [len(slice_) for slice_ in slices])
+                np.testing.assert_allclose(nss_values, expected)
+        self.assertRaises(ValueError, nss.nss, self.subjects, 0, 60000,
+                          self.stds, 15000, 3, "xy-grid", "12X8",
+                          engine="sliding")
+
+    def test_sliding_computes_entering_samples(self):
+        subjects = [helper.sort_time(subject) for subject in self.subjects]
+        sliding_grid = nss.SlidingGrid(subjects, self.stds,
+                                       np.linspace(0, 1280, 12),
+                                       np.linspace(0, 720, 8))
+        for t in range(0, 45 * 20000, 10000):
+            sliding_grid.rasters(t, 100000, np.array([t], dtype=float))
+        # every sample enters the window only once
+        self.assertEqual(sliding_grid.n_computed,
+                         sum(len(subject) for subject in subjects))
+
+    def test_closest_sample_sorted(self):
+        gaze_data = np.zeros((7, 3))
+        gaze_data[:, 2] = (0, 10, 10, 20, 30, 30, 50)
+        for t in (-5, 0, 4, 5, 6, 10, 15, 16, 29, 40, 41, 50, 60):
+            self.assertEqual(helper.closest_sample_sorted(gaze_data, t),
+                             np.argmin(np.abs(gaze_data[:, 2] - t)))
+
+
+class TestNormSample(unittest.TestCase):
+
+    def setUp(self):
+        self.population = nss.remove_invalid(
+            np.concatenate(generate_subjects(n_samples=200), axis=0))
+
+    def test_samplings(self):
+        for sampling in ("iid", "sobol", "halton", "stratified"):
+            for method in ("xy-population", "xy-estimation", "xy-plane"):
+                np.random.seed(4)
+                norm_sample = nss.generate_norm_sample(
+                    1000.0, 20000, method, self.population, 300, (1280, 720),
+                    sampling)
+                self.assertEqual(norm_sample.shape, (300, 3))
+                self.assertTrue(np.all(norm_sample[:, 2] == 1000.0))
+                self.assertTrue(np.all(np.isfinite(norm_sample)))
+                np.random.seed(4)
+                # reproducible with the numpy random state
+                np.testing.assert_array_equal(norm_sample,
+                                              nss.generate_norm_sample(
+                    1000.0, 20000, method, self.population, 300,
+                    (1280, 720), sampling))
+            self.assertTrue(np.all((norm_sample[:, 0] >= 0) &
+                                   (norm_sample[:, 0] <= 1280)))
+        self.assertRaises(ValueError, nss.generate_norm_sample, 0.0, 20000,
+                          "xy-population", self.population, 10,
+                          sampling="magic")
+
+    def test_population_members(self):
+        norm_sample = nss.generate_norm_sample(0.0, 20000, "xy-population",
+                                               self.population, 500,
+                                               sampling="sobol")
+        members = set(map(tuple, self.population[:, :2]))
+        self.assertTrue(all(tuple(point) in members for point in
+                            norm_sample[:, :2]))
+        order = nss.spatial_order(self.population)
+        self.assertEqual(sorted(order), list(range(len(self.population))))
+
+    def test_order_computed_once(self):
+        np.random.seed(4)
+        expected = nss.generate_norm_sample(0.0, 20000, "xy-population",
+                                            self.population, 50,
+                                            sampling="sobol")
+        np.random.seed(4)
+        order = nss.population_order(self.population, "xy-population",
+                                     "sobol")
+        np.testing.assert_array_equal(nss.generate_norm_sample(
+            0.0, 20000, "xy-population", self.population, 50,
+            sampling="sobol", order=order), expected)
+        calls = list()
+        spatial_order = nss.spatial_order
+        def counting_spatial_order(gaze_data, n_bins=16):
+            calls.append(len(gaze_data))
+            return spatial_order(gaze_data, n_bins)
+        nss.spatial_order = counting_spatial_order
+        try:
+            subjects = generate_subjects()
+            list(nss.nss_series(subjects, [200000, 300000], 60000,
+                                (50, 50, 20000), 15000, 3, "xy-population",
+                                50, np.concatenate(subjects, axis=0),
+                                engine="loop", sampling="sobol"))
+        finally:
+            nss.spatial_order = spatial_order
+        self.assertEqual(len(calls), 1)
+
+    def test_smaller_error(self):
+        # the mean of a fixation map is estimated more precisely
+        vec_i_js = self.population[:20]
+        stds = (50, 50, 20000)
+        for method in ("xy-population", "xy-estimation"):
+            np.random.seed(6)
+            estimates = dict()
+            for sampling in ("iid", "sobol", "stratified"):
+                estimates[sampling] = np.std([np.mean(dorr.gaussian_sum(
+                    nss.generate_norm_sample(
+                        self.population[10, 2], 20000, method,
+                        self.population, 256, sampling=sampling),
+                    vec_i_js, stds)) for _ in range(40)])
+            self.assertLess(estimates["sobol"], estimates["iid"])
+            self.assertLess(estimates["stratified"], estimates["iid"])
+
+
+class TestReferenceMatrix(unittest.TestCase):
+
+    def test_equal_to_slicing(self):
+        n_subjects = 5
+        subjects = list(range(n_subjects))
+        for n_reference in range(8):
+            references = nss.reference_matrix(n_subjects, n_reference)
+            for i in range(n_subjects):
+                idx_right = i + n_reference + 1
+                if idx_right > n_subjects:
+                    expected = (subjects[i+1:] +
+                                subjects[:idx_right-n_subjects])
+                else:
+                    expected = subjects[i+1:idx_right]
+                self.assertEqual(list(references[i]),
+                                 [expected.count(j) for j in subjects])
+
+if __name__ == '__main__':
+    unittest.main()
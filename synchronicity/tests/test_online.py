@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# test_online.py
+
+"""
+Test if the online nss values equal the offline ones.
+
+"""
+
+import unittest
+
+import numpy as np
+
+from .. import nss
+from .. import online
+from .test_nss import generate_subjects
+
+
+class TestWindowBuffer(unittest.TestCase):
+
+    def test_append_and_drop(self):
+        buffer = online.WindowBuffer(capacity=4)
+        samples = np.zeros((50, 3))
+        samples[:, 2] = np.arange(50)
+        for i in range(50):
+            buffer.append(samples[i])
+            buffer.drop_before(i - 9)
+            np.testing.assert_array_equal(buffer.data,
+                                          samples[max(0, i - 9):i + 1])
+        self.assertLessEqual(len(buffer._data), 32)
+        buffer.append(samples[:0])
+        self.assertEqual(buffer.latest, 49)
+
+
+class TestOnlineNSS(unittest.TestCase):
+
+    def setUp(self):
+        self.subjects = generate_subjects()
+        self.stds = (50, 50, 20000)
+
+    def run_online(self, subjects, **kwargs):
+        online_nss = online.OnlineNSS(len(subjects), 60000, self.stds, 15000,
+                                      3, "xy-grid", "12X8",
+                                      screen_res=(1280, 720),
+                                      t_start=0.0, step=30000, **kwargs)
+        np.random.seed(5)
+        return list(online_nss.stream(online.ReplaySource(subjects,
+                                                          speed=None)))
+
+    def test_equal_to_series(self):
+        values = self.run_online(self.subjects)
+        ts = [value[0] for value in values]
+        self.assertEqual(ts, list(np.arange(0, 40 * 20000, 30000.0))[:len(ts)])
+        np.random.seed(5)
+        series = nss.nss_series(self.subjects, ts, 60000, self.stds, 15000,
+                                3, "xy-grid", "12X8",
+                                screen_res=(1280, 720), engine="grid")
+        for (t, nss_values, quality_values), expected in zip(values, series):
+            self.assertEqual(t, expected[0])
+            self.assertEqual(list(quality_values), list(expected[2]))
+            np.testing.assert_allclose(nss_values, expected[1])
+
+    def test_latency(self):
+        # the last subject stops early
+        subjects = list(self.subjects)
+        subjects[-1] = subjects[-1][:10]
+        online_nss = online.OnlineNSS(len(subjects), 60000, self.stds,
+                                      15000, 3, "xy-grid", "12X8",
+                                      screen_res=(1280, 720), step=30000,
+                                      latency=50000)
+        for subject, sample in online.ReplaySource(subjects, speed=None):
+            online_nss.push(subject, sample)
+        # the values lag at most latency behind the newest sample
+        t_newest = max(subject[-1, 2] for subject in subjects)
+        t_last = online_nss.t_next - online_nss.step
+        self.assertGreaterEqual(t_last, t_newest - online_nss.horizon -
+                                50000 - online_nss.step)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# test_simulate.py
+
+"""
+Test if the parallel simulation yields the same results as the serial one and
+if the columnar format yields the same results as the pickle file.
+
+"""
+
+import concurrent.futures
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from .. import results
+from .. import simulate
+from .. import store
+from .test_nss import generate_subjects
+
+
+class TestRunSimulation(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.pickle_file = os.path.join(self.folder, "sim.pickle")
+        subjects = generate_subjects(n_subjects=5, n_samples=60)
+        self.columns_folder = os.path.join(self.folder, "sim_columns")
+        store.save_columns(self.columns_folder, subjects)
+        with open(self.pickle_file, "wb") as pfile:
+            pickle.dump((subjects, np.concatenate(subjects, axis=0)), pfile)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def run_simulation(self, n_jobs, pickle_file=None, result_folder=None,
+                       n_ts=20, n_norm=100, norm_tol=None):
+        data_file = os.path.join(self.folder, "data_%i.txt" % n_jobs)
+        if pickle_file is None:
+            pickle_file = self.pickle_file
+        simulate.run_simulation(pickle_file, data_file,
+                                ts=[x * 40000 for x in range(n_ts)],
+                                dts=(60000, 225000), n_refs=(3,),
+                                methods=("xy-population",), n_norms=(n_norm,),
+                                setup=((1280, 720), (50, 50, 20000), 15000),
+                                n_jobs=n_jobs, chunk_size=3, seed=1,
+                                result_folder=result_folder,
+                                norm_tol=norm_tol)
+        return self.read_data_file(data_file)
+
+    def read_data_file(self, data_file):
+        with open(data_file) as dfile:
+            # drop the columns gaze_file and total_time
+            rows = [line.split("\t")[1:-1] for line in dfile]
+        os.remove(data_file)
+        return rows
+
+    def test_parallel_equal_to_serial(self):
+        serial = self.run_simulation(1)
+        self.assertEqual(len(serial), 1 + 2 * 20)
+        self.assertEqual(self.run_simulation(3), serial)
+
+    def test_parallel_without_seed(self):
+        # repetitions of the same parameters in different workers have to
+        # draw different norm samples
+        data_file = os.path.join(self.folder, "data.txt")
+        simulate.run_simulation(self.pickle_file, data_file, ts=(400000,),
+                                dts=(225000,), n_refs=(3,),
+                                methods=("xy-population",), n_norms=(50,) * 4,
+                                setup=((1280, 720), (50, 50, 20000), 15000),
+                                n_jobs=2, chunk_size=1)
+        # column nss_mean
+        nss_means = [row[1] for row in self.read_data_file(data_file)[1:]]
+        self.assertEqual(len(set(nss_means)), 4)
+
+    def test_pool_failure(self):
+        # the shared memory is released if the pool cannot be created
+        descriptors = list()
+        create = simulate.subject_store.SubjectStore.create
+        def recording_create(*args, **kwargs):
+            subject_store = create(*args, **kwargs)
+            descriptors.append(subject_store.descriptor())
+            return subject_store
+        def failing_pool(*args, **kwargs):
+            raise OSError("no processes")
+        simulate.subject_store.SubjectStore.create = recording_create
+        simulate.concurrent.futures.ProcessPoolExecutor = failing_pool
+        try:
+            self.assertRaises(OSError, self.run_simulation, 2)
+        finally:
+            simulate.subject_store.SubjectStore.create = create
+            simulate.concurrent.futures.ProcessPoolExecutor = (
+                concurrent.futures.ProcessPoolExecutor)
+        self.assertEqual(len(descriptors), 1)
+        self.assertRaises(FileNotFoundError, store.SubjectStore.attach,
+                          descriptors[0])
+
+    def test_result_store(self):
+        result_folder = os.path.join(self.folder, "results")
+        expected = self.run_simulation(1, result_folder=result_folder)
+        export_file = os.path.join(self.folder, "export.txt")
+        simulate.export_results(result_folder, export_file)
+        self.assertEqual(self.read_data_file(export_file), expected)
+        # everything is stored, nothing is calculated again
+        self.assertEqual(self.run_simulation(1, result_folder=result_folder),
+                         expected[:1])
+
+    def test_resume(self):
+        result_folder = os.path.join(self.folder, "results")
+        first = self.run_simulation(1, result_folder=result_folder, n_ts=8)
+        self.assertEqual(len(first), 1 + 2 * 8)
+        second = self.run_simulation(1, result_folder=result_folder)
+        self.assertEqual(len(second), 1 + 2 * 12)
+        export_file = os.path.join(self.folder, "export.txt")
+        simulate.export_results(result_folder, export_file)
+        exported = self.read_data_file(export_file)
+        self.assertEqual(sorted(exported[1:]), sorted(first[1:] + second[1:]))
+
+    def test_resume_after_kill(self):
+        # kill the simulation within a chunk and resume it
+        result_folder = os.path.join(self.folder, "results")
+        nss_series = simulate.nss.nss_series
+        def killed_series(*args, **kwargs):
+            for i, row in enumerate(nss_series(*args, **kwargs)):
+                if i == 2:
+                    raise KeyboardInterrupt()
+                yield row
+        simulate.nss.nss_series = killed_series
+        try:
+            with self.assertRaises(KeyboardInterrupt):
+                self.run_simulation(1, result_folder=result_folder)
+        finally:
+            simulate.nss.nss_series = nss_series
+        # the rows of the first chunk were stored before the kill
+        result_store = results.ResultStore(result_folder)
+        result_store.close()
+        self.assertEqual(len(result_store), 2)
+        self.run_simulation(1, result_folder=result_folder)
+        export_file = os.path.join(self.folder, "export.txt")
+        simulate.export_results(result_folder, export_file)
+        expected = self.run_simulation(1)
+        self.assertEqual(sorted(self.read_data_file(export_file)[1:]),
+                         sorted(expected[1:]))
+
+    def test_norm_tol(self):
+        result_folder = os.path.join(self.folder, "results")
+        rows = self.run_simulation(1, result_folder=result_folder,
+                                   n_norm=2000, norm_tol=0.3)
+        # 5 columns qf%i followed by 5 columns n_used%i
+        self.assertEqual(rows[0][14:24], ["qf%i" % i for i in range(5)] +
+                         ["n_used%i" % i for i in range(5)])
+        n_used = np.array([row[19:24] for row in rows[1:]], dtype=int)
+        self.assertTrue(np.all(n_used <= 2000))
+        self.assertTrue(np.any((0 < n_used) & (n_used < 2000)))
+        export_file = os.path.join(self.folder, "export.txt")
+        simulate.export_results(result_folder, export_file)
+        self.assertEqual(self.read_data_file(export_file), rows)
+        # results with norm_tol do not replace the results without
+        self.assertEqual(len(self.run_simulation(
+            1, result_folder=result_folder, n_norm=2000)), 1 + 2 * 20)
+
+    def test_columns_equal_to_pickle(self):
+        expected = self.run_simulation(1)
+        self.assertEqual(self.run_simulation(1, self.columns_folder),
+                         expected)
+
+    def test_convergence(self):
+        data_file = os.path.join(self.folder, "convergence.txt")
+        simulate.run_convergence(self.pickle_file, data_file,
+                                 ts=(200000, 400000), dts=(225000,),
+                                 n_refs=(3,), methods=("xy-population",),
+                                 n_norms=(10, 100), n_repetitions=4,
+                                 n_pool=500,
+                                 setup=((1280, 720), (50, 50, 20000), 15000),
+                                 seed=1)
+        rows = self.read_data_file(data_file)
+        self.assertEqual(len(rows), 1 + 2 * 2 * 4)
+        # column n_norm
+        self.assertEqual([row[8] for row in rows[1:9]], ["10"] * 4 + ["100"] * 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+# test_store.py
+
+"""
+Test if the subject stores return the stored gaze data.
+
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from .. import store
+from .test_nss import generate_subjects
+
+
+class TestSubjectStore(unittest.TestCase):
+
+    def setUp(self):
+        self.subjects = generate_subjects(n_subjects=4, n_samples=30)
+        self.population = np.concatenate(self.subjects, axis=0)
+
+    def assert_subjects_equal(self, subjects, expected):
+        self.assertEqual(len(subjects), len(expected))
+        for subject, expected_subject in zip(subjects, expected):
+            np.testing.assert_array_equal(subject, expected_subject)
+
+    def test_views(self):
+        subject_store = store.SubjectStore.create(self.subjects,
+                                                  self.population,
+                                                  shared=False)
+        self.assert_subjects_equal(subject_store.subjects, self.subjects)
+        np.testing.assert_array_equal(subject_store.population,
+                                      self.population)
+        # population is the concatenation and therefore not stored twice
+        self.assertEqual(len(subject_store.data), len(self.population))
+        for subject in subject_store.subjects:
+            self.assertTrue(np.shares_memory(subject, subject_store.data))
+
+    def test_separate_population(self):
+        population = self.population[::2]
+        subject_store = store.SubjectStore.create(self.subjects, population,
+                                                  shared=False)
+        self.assert_subjects_equal(subject_store.subjects, self.subjects)
+        np.testing.assert_array_equal(subject_store.population, population)
+
+    def test_attach(self):
+        subject_store = store.SubjectStore.create(self.subjects)
+        try:
+            attached = store.SubjectStore.attach(subject_store.descriptor())
+            self.assert_subjects_equal(attached.subjects, self.subjects)
+            # both stores use the same memory
+            subject_store.data[0, 0] = -1.0
+            self.assertEqual(attached.subjects[0][0, 0], -1.0)
+            attached.close()
+        finally:
+            subject_store.close()
+            subject_store.unlink()
+        self.assertRaises(ValueError, store.SubjectStore.create(
+            self.subjects, shared=False).descriptor)
+
+
+class TestColumnStore(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.subjects = generate_subjects(n_subjects=4, n_samples=30)
+        # columns are stored sorted along time
+        self.subjects[0] = self.subjects[0][::-1]
+        self.sorted_subjects = [subject[np.argsort(subject[:, 2])]
+                                for subject in self.subjects]
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_round_trip(self):
+        store.save_columns(self.folder, self.subjects, dict(video="test"))
+        columns = store.ColumnStore(self.folder)
+        self.assertEqual(columns.metadata, dict(video="test"))
+        self.assertEqual(len(columns), len(self.subjects))
+        for subject, expected in zip(columns.subjects(),
+                                     self.sorted_subjects):
+            np.testing.assert_array_equal(subject, expected)
+        np.testing.assert_array_equal(
+            columns.population(), np.concatenate(self.sorted_subjects))
+
+    def test_time_range(self):
+        store.save_columns(self.folder, self.subjects)
+        columns = store.ColumnStore(self.folder)
+        t_start, t_stop = 200000, 400000
+        for subject, expected in zip(columns.subjects(t_start, t_stop),
+                                     self.sorted_subjects):
+            times = expected[:, 2]
+            inside = (times >= t_start) & (times <= t_stop)
+            start = max(0, np.argmax(inside) - 1)
+            stop = min(len(times), len(inside) - np.argmax(inside[::-1]) + 1)
+            np.testing.assert_array_equal(subject, expected[start:stop])
+
+    def test_float32(self):
+        store.save_columns(self.folder, self.subjects, dtype=np.float32)
+        columns = store.ColumnStore(self.folder)
+        self.assertEqual(columns.columns[0].dtype, np.float32)
+        self.assertEqual(columns.columns[2].dtype, np.float64)
+        np.testing.assert_allclose(columns.subject(1),
+                                   self.sorted_subjects[1], rtol=1e-6)
+
+    def test_version(self):
+        store.save_columns(self.folder, self.subjects)
+        meta_file = os.path.join(self.folder, "meta.json")
+        with open(meta_file) as mfile:
+            meta = json.load(mfile)
+        meta["version"] = store.FORMAT_VERSION + 1
+        with open(meta_file, "w") as mfile:
+            json.dump(meta, mfile)
+        self.assertRaises(ValueError, store.ColumnStore, self.folder)
+
+if __name__ == '__main__':
+    unittest.main()